@@ -0,0 +1,48 @@
+"""
+Compares cold runs of a file, which scan, parse, resolve and write the AST
+cache, with warm runs which load the cached tree. Both the time spent in
+runfile and the startup of a fresh pylox process are measured.
+
+Run with: python -m benchmarks.bench_cache [number of functions]
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import pylox.ast_cache as ac
+from benchmarks import common
+from pylox import lox
+
+
+def main(functions: int = 1_000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.lox")
+        with open(path, "w") as file:
+            file.write(common.generated_program(functions))
+        print(f"{functions} functions")
+
+        def cold() -> None:
+            ac.clear(path)
+            lox.runfile(path)
+
+        with common.quiet():
+            cold_seconds = common.best_time(cold)
+            lox.runfile(path)
+            warm_seconds = common.best_time(lox.runfile, path)
+        common.report("  runfile, cold", cold_seconds)
+        common.report("  runfile, warm", warm_seconds)
+
+        command = [sys.executable, "-m", "pylox", path]
+
+        def process(*options: str) -> None:
+            subprocess.run(command + list(options), stdout=subprocess.DEVNULL)
+
+        common.report("  process, --no-cache", common.best_time(process, "--no-cache"))
+        common.report("  process, warm", common.best_time(process))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
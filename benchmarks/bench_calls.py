@@ -0,0 +1,77 @@
+"""
+Runs programs dominated by function calls and variables. Locals live in
+the slots of call frames numbered by the resolver, and globals in slots
+numbered the first time their name is resolved.
+
+Run with: python -m benchmarks.bench_calls
+"""
+from __future__ import annotations
+
+from benchmarks import common
+from pylox import interpreter, lparser, resolver, scanner
+
+PROGRAMS = {
+    "recursive fib(18)": (
+        """
+        fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+        print fib(18);
+        """,
+        "calls",
+        8361,
+    ),
+    "closure counter": (
+        """
+        fun counter() { var i = 0; fun inc() { i = i + 1; return i; } return inc; }
+        fun run() { var c = counter(); for (var n = 0; n < 5000; n = n + 1) c(); }
+        run();
+        """,
+        "calls",
+        5001,
+    ),
+    "local loop": (
+        """
+        fun run() {
+          var total = 0;
+          for (var i = 0; i < 20000; i = i + 1) { var x = i * 2; total = total + x; }
+          return total;
+        }
+        print run();
+        """,
+        "iterations",
+        20000,
+    ),
+    "global loop": (
+        """
+        var total = 0;
+        var i = 0;
+        while (i < 20000) { total = total + i; i = i + 1; }
+        """,
+        "iterations",
+        20000,
+    ),
+    "method calls": (
+        """
+        class Point { init(x) { this.x = x; } get() { return this.x; } }
+        fun run() {
+          var p = Point(1);
+          var total = 0;
+          for (var i = 0; i < 5000; i = i + 1) total = total + p.get();
+        }
+        run();
+        """,
+        "calls",
+        5002,
+    ),
+}
+
+
+def main() -> None:
+    for name, (source, unit, count) in PROGRAMS.items():
+        with common.quiet():
+            tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+            seconds = common.best_time(interpreter.interpret, tree)
+        common.report(name, seconds, unit, count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Measures the --check throughput in files/sec on a directory of generated
+files, checked serially and in a pool of worker processes, without the AST
+cache.
+
+Run with: python -m benchmarks.bench_check [number of files]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+import pylox.ast_cache as ac
+from benchmarks import common
+from pylox import checker
+
+
+def main(files: int = 200) -> None:
+    ac.enabled = False
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(files):
+            with open(os.path.join(directory, f"program_{i}.lox"), "w") as file:
+                file.write(common.generated_program(20))
+        cpus = os.cpu_count() or 1
+        print(f"{files} files, {cpus} CPUs")
+        for jobs in sorted({1, 2, cpus}):
+            with common.quiet():
+                seconds = common.best_time(checker.check, [directory], jobs)
+            common.report(f"  {jobs} jobs", seconds, "files", files)
+    ac.enabled = True
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
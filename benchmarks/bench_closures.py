@@ -0,0 +1,69 @@
+"""
+Makes many closures in functions with a large local the closures don't
+use, keeping every closure alive. A closure only captures the cells of
+the locals it uses, so the large strings are freed when each call
+returns. Reports the memory still allocated after the program ran, and
+the time spent in the cyclic garbage collector while it ran.
+
+Run with: python -m benchmarks.bench_closures
+"""
+from __future__ import annotations
+
+import gc
+import time
+import tracemalloc
+import typing as tp
+
+from benchmarks import common
+from pylox import interpreter, lparser, resolver, scanner
+
+CLOSURES = 2000
+
+SOURCE = f"""
+class Node {{ init(value, next) {{ this.value = value; this.next = next; }} }}
+fun make(i) {{
+  var big = "x" * 10000;
+  var small = i;
+  fun get() {{ return small; }}
+  return get;
+}}
+fun run() {{
+  var head = nil;
+  for (var i = 0; i < {CLOSURES}; i = i + 1) head = Node(make(i), head);
+  return head;
+}}
+var kept = run();
+"""
+
+
+def main() -> None:
+    with common.quiet():
+        tree = resolver.resolve(lparser.parse(scanner.scan_buffer(SOURCE)))
+    collecting: tp.List[float] = []
+    spent = [0.0]
+
+    def time_gc(phase: str, info: tp.Dict[str, int]) -> None:
+        if phase == "start":
+            collecting.append(time.perf_counter())
+        elif collecting:
+            spent[0] += time.perf_counter() - collecting.pop()
+
+    gc.collect()
+    gc.callbacks.append(time_gc)
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        interpreter.interpret(tree)
+        seconds = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        gc.callbacks.remove(time_gc)
+    common.report("run", seconds, "closures", CLOSURES)
+    common.report("garbage collection", spent[0])
+    print(f"{'retained after the run':<40} {retained / 2 ** 20:>10.2f} MiB")
+    print(f"{'peak during the run':<40} {peak / 2 ** 20:>10.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Runs scaled down versions of the Crafting Interpreters benchmarks with
+each engine (see interpreter.ENGINES), resolving the program once and
+including the compile time of the compiling engines in their runs.
+
+Run with: python -m benchmarks.bench_engines
+"""
+from __future__ import annotations
+
+import pylox.tiers as ti
+from benchmarks import common
+from pylox import interpreter, lparser, resolver, scanner
+
+PROGRAMS = {
+    "fib": """
+        fun fib(n) { if (n < 2) return n; return fib(n - 2) + fib(n - 1); }
+        print fib(17);
+        """,
+    "equality": """
+        var i = 0;
+        var count = 0;
+        while (i < 5000) {
+          if (1 == 1) count = count + 1;
+          if ("str" == "str") count = count + 1;
+          if (nil == false) count = count + 1;
+          if (i == "i") count = count + 1;
+          i = i + 1;
+        }
+        """,
+    "invocation": """
+        fun f() {}
+        for (var i = 0; i < 5000; i = i + 1) { f(); f(); f(); f(); f(); }
+        """,
+    "method call": """
+        class Toggle {
+          init(state) { this.state = state; }
+          value() { return this.state; }
+          activate() { this.state = !this.state; return this; }
+        }
+        var toggle = Toggle(true);
+        for (var i = 0; i < 3000; i = i + 1) {
+          toggle.activate().value();
+          toggle.activate().value();
+        }
+        """,
+    "instantiation": """
+        class Foo { init() {} }
+        for (var i = 0; i < 3000; i = i + 1) { Foo(); Foo(); Foo(); }
+        """,
+    "zoo": """
+        class Zoo {
+          init() { this.aarvark = 1; this.baboon = 1; this.cat = 1; }
+          ant() { return this.aarvark; }
+          banana() { return this.baboon; }
+          tuna() { return this.cat; }
+        }
+        var zoo = Zoo();
+        var sum = 0;
+        while (sum < 10000) sum = sum + zoo.ant() + zoo.banana() + zoo.tuna();
+        """,
+    "binary trees": """
+        class Tree {
+          init(depth) {
+            this.depth = depth;
+            if (depth > 0) {
+              this.a = Tree(depth - 1);
+              this.b = Tree(depth - 1);
+            }
+          }
+          check() {
+            if (this.depth == 0) return 1;
+            return 1 + this.a.check() + this.b.check();
+          }
+        }
+        print Tree(10).check();
+        """,
+    "string equality": """
+        var a = "some string";
+        var b = "some string";
+        var count = 0;
+        for (var i = 0; i < 5000; i = i + 1) {
+          if (a == b) count = count + 1;
+          if (a != "other") count = count + 1;
+        }
+        """,
+}
+
+
+def run(tree: object, engine: str) -> None:
+    interpreter.engine = engine
+    try:
+        interpreter.interpret(tree)  # type: ignore
+    finally:
+        interpreter.engine = "tree"
+
+
+def main() -> None:
+    # The tree engine is measured evaluating every node (see bench_tiers)
+    thresholds = ti.call_threshold, ti.loop_threshold
+    ti.call_threshold = ti.loop_threshold = 0
+    try:
+        run_programs()
+    finally:
+        ti.call_threshold, ti.loop_threshold = thresholds
+
+
+def run_programs() -> None:
+    for name, source in PROGRAMS.items():
+        with common.quiet():
+            tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+        times = {}
+        for engine in interpreter.ENGINES:
+            with common.quiet():
+                times[engine] = common.best_time(run, tree, engine, repeat=5)
+            common.report(f"{name}, {engine}", times[engine])
+        for engine in [engine for engine in times if engine != "tree"]:
+            speedup = times["tree"] / times[engine]
+            print(f"{f'{name}, {engine} speedup':<40} {speedup:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Parses programs made of thousands of broken statements. Each error is
+reported and parsing resumes at the next statement the splitter found, so
+the time per statement stays flat as the errors pile up, with either
+expression parser.
+
+Run with: python -m benchmarks.bench_errors
+"""
+from __future__ import annotations
+
+import pylox.expr_parse as ep
+from benchmarks import common
+from pylox import lparser, scanner
+
+BROKEN = (
+    "print 1 +;\n",
+    "var = 3;\n",
+    "x = ;\n",
+    "fun (a) { return a; }\n",
+    "if (x { print 1; }\n",
+    "while x) print 2;\n",
+    "print 1\n",
+    "class { }\n",
+    "for (var i = 0; i < 3) print i;\n",
+    "{ print 1 + ; }\n",
+    "return return;\n",
+    "fun f(a, ) { print a; }\n",
+    "print );\n",
+    "print ((1);\n",
+    "{ print 1;\n",
+)
+
+
+def broken_program(statements: int) -> str:
+    return "".join(BROKEN[i % len(BROKEN)] for i in range(statements))
+
+
+def main() -> None:
+    for parser in ep.EXPRESSION_PARSERS:
+        ep.parser = parser
+        for statements in (1000, 2000, 4000, 8000):
+            tokens = scanner.scan_buffer(broken_program(statements))
+            with common.quiet() as output:
+                seconds = common.best_time(lparser.parse, tokens, repeat=1)
+            errors = output.getvalue().count("\n")
+            common.report(
+                f"{parser}, {statements} statements, {errors} errors",
+                seconds,
+                "statements",
+                statements,
+            )
+
+
+if __name__ == "__main__":
+    main()
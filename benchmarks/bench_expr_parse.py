@@ -0,0 +1,40 @@
+"""
+Compares the slicing, recursive expression parser with the cursor based
+Pratt parser on long and on deeply nested expressions.
+
+Run with: python -m benchmarks.bench_expr_parse
+"""
+from __future__ import annotations
+
+import itertools
+
+from benchmarks import common
+from pylox import expr_parse, scanner
+
+OPERATORS = ("+", "*", "-", "/", "<", "==", "and", "or")
+
+
+def long_expression(terms: int) -> str:
+    operators = itertools.cycle(OPERATORS)
+    return " ".join(f"x{i} {next(operators)}" for i in range(terms)) + " x"
+
+
+def nested_expression(depth: int) -> str:
+    return "(" * depth + "1 + 2" + ")" * depth
+
+
+def main() -> None:
+    cases = [(f"long, {n} terms", long_expression(n)) for n in (100, 400, 1600)]
+    cases += [(f"nested, depth {n}", nested_expression(n)) for n in (10, 40, 80)]
+    for name, source in cases:
+        tokens = tuple(scanner.scan(source))
+        print(f"{name} ({len(tokens)} tokens)")
+        for parser in expr_parse.EXPRESSION_PARSERS:
+            expr_parse.parser = parser
+            seconds = common.best_time(expr_parse.expression, tokens)
+            common.report(f"  {parser}", seconds, "tokens", len(tokens))
+    expr_parse.parser = "recursive"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Measures the time to the first statement, scanning, parsing and resolving,
+of a library style program of which only one function is called, with and
+without lazy function bodies.
+
+Run with: python -m benchmarks.bench_lazy [number of functions]
+"""
+from __future__ import annotations
+
+import sys
+
+import pylox.stmt_parse as sp
+from benchmarks import common
+from pylox import interpreter, lparser, resolver, scanner
+
+
+def front_end(source: str) -> object:
+    return resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+
+
+def run(source: str) -> None:
+    interpreter.interpret(front_end(source))
+
+
+def main(functions: int = 5_000) -> None:
+    source = common.generated_program(functions)
+    print(f"{functions} functions")
+    for lazy in (False, True):
+        sp.lazy = lazy
+        mode = "lazy" if lazy else "eager"
+        with common.quiet():
+            first = common.best_time(front_end, source)
+            total = common.best_time(run, source)
+        common.report(f"  {mode}, time to first statement", first)
+        common.report(f"  {mode}, whole run", total)
+    sp.lazy = False
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,41 @@
+"""
+Runs loops whose bodies are blocks. A block which declares nothing runs
+in the frame of the enclosing scope, so it is compared with the same loop
+declaring an unused local, which makes its block push a frame on every
+iteration.
+
+Run with: python -m benchmarks.bench_loops
+"""
+from __future__ import annotations
+
+from benchmarks import common
+from pylox import interpreter, lparser, resolver, scanner
+
+ITERATIONS = 20000
+
+LOOPS = {
+    "while": "while (i < {n}) {{ {declare}i = i + 1; }}",
+    "while with an if block": (
+        "while (i < {n}) {{ {declare}if (i > 0) {{ total = total + i; }} i = i + 1; }}"
+    ),
+    "for": "for (var j = 0; j < {n}; j = j + 1) {{ {declare}total = total + j; }}",
+}
+
+
+def program(loop: str, declare: str) -> str:
+    body = loop.format(n=ITERATIONS, declare=declare)
+    return f"fun run() {{ var i = 0; var total = 0; {body} }} run();"
+
+
+def main() -> None:
+    for name, loop in LOOPS.items():
+        for declare, label in (("", "no frame"), ("var unused; ", "a frame")):
+            with common.quiet():
+                source = program(loop, declare)
+                tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+                seconds = common.best_time(interpreter.interpret, tree, repeat=5)
+            common.report(f"{name}, {label}", seconds, "iterations", ITERATIONS)
+
+
+if __name__ == "__main__":
+    main()
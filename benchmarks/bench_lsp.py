@@ -0,0 +1,72 @@
+"""
+Measures the latency of a single edit to a 20k line document in the
+language server, reanalysing it incrementally and from scratch.
+
+Run with: python -m benchmarks.bench_lsp [number of functions]
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+import pylox.analysis as an
+from benchmarks import common
+
+EDITS = 200
+
+
+def typing_edits(document: an.Document, line: int) -> float:
+    """ Types and deletes a character in a function body, returning s/edit """
+    start = time.perf_counter()
+    for _ in range(EDITS // 2):
+        offset = document.offset(line, 20)
+        document.edit(offset, offset, "1")
+        document.diagnostics()
+        document.edit(offset, offset + 1, "")
+        document.diagnostics()
+    return (time.perf_counter() - start) / EDITS
+
+
+def newline_edits(document: an.Document, line: int) -> float:
+    """ Inserts and deletes a line, moving every declaration after it """
+    start = time.perf_counter()
+    for _ in range(EDITS // 2):
+        offset = document.offset(line, 0)
+        document.edit(offset, offset, "\n")
+        document.diagnostics()
+        document.edit(offset, offset + 1, "")
+        document.diagnostics()
+    return (time.perf_counter() - start) / EDITS
+
+
+def rename_edits(document: an.Document, line: int) -> float:
+    """ Renames a function back and forth, reresolving the code using it """
+    start = time.perf_counter()
+    for _ in range(EDITS // 2):
+        offset = document.offset(line, len("fun function_"))
+        document.edit(offset, offset, "x")
+        document.diagnostics()
+        document.edit(offset, offset + 1, "")
+        document.diagnostics()
+    return (time.perf_counter() - start) / EDITS
+
+
+def main(functions: int = 2_223) -> None:
+    source = common.generated_program(functions)
+    print(f"{source.count(chr(10)):,} lines, {functions} functions")
+    with common.quiet():
+        full = common.best_time(an.Document, source)
+        document = an.Document(source)
+        # The body of a function in the middle of the document
+        line = 9 * (functions // 2) + 1
+        typing = typing_edits(document, line)
+        newline = newline_edits(document, line)
+        rename = rename_edits(document, 0)
+    common.report("  full reanalysis", full)
+    common.report("  incremental, typing in a body", typing)
+    common.report("  incremental, inserting a line", newline)
+    common.report("  incremental, renaming a used function", rename)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""
+Parses deeply nested blocks. Error flags are computed once per node when it
+is built, so parse time per token stays flat as the nesting deepens instead
+of growing with it. Checking the parsed tree for errors is compared with the
+full subtree walk it replaced.
+
+Run with: python -m benchmarks.bench_nested_parse
+"""
+from __future__ import annotations
+
+import sys
+
+import pylox.abstract_execs as ae
+from benchmarks import common
+from pylox import lparser, scanner
+
+
+def nested_blocks(depth: int) -> str:
+    return "{ var a = 1; " * depth + "print a;" + " }" * depth
+
+
+def walk_has_error(node: ae.AbstractExec) -> bool:
+    """ The subtree walk has_error used to do """
+    return isinstance(node, ae.ErrorExec) or any(
+        walk_has_error(child) for child in node.execs
+    )
+
+
+def main() -> None:
+    sys.setrecursionlimit(20_000)
+    for depth in (25, 50, 100, 200):
+        tokens = scanner.scan_buffer(nested_blocks(depth))
+        with common.quiet():
+            seconds = common.best_time(lparser.parse, tokens)
+        common.report(f"parse, depth {depth}", seconds, "tokens", len(tokens))
+        statements = lparser.parse(tokens)
+        seconds = common.best_time(ae.has_error, statements)
+        common.report("  has_error flag", seconds)
+        seconds = common.best_time(walk_has_error, statements[0])
+        common.report("  subtree walk", seconds)
+
+
+if __name__ == "__main__":
+    main()
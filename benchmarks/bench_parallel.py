@@ -0,0 +1,39 @@
+"""
+Measures how parsing a large program scales with the number of worker
+processes, from serial parsing up to one process per CPU.
+
+Run with: python -m benchmarks.bench_parallel [number of functions]
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+import pylox.parallel_parse as pp
+import pylox.stmt_parse as sp
+from benchmarks import common
+from pylox import scanner
+
+
+def serial(tokens: object) -> None:
+    tuple(sp.from_tokens(tokens))  # type: ignore
+
+
+def parallel(tokens: object, workers: int) -> None:
+    tuple(pp.from_tokens(tokens, workers))  # type: ignore
+
+
+def main(functions: int = 2_000) -> None:
+    tokens = scanner.scan_buffer(common.generated_program(functions))
+    cpus = os.cpu_count() or 1
+    print(f"{functions} functions, {len(tokens)} tokens, {cpus} CPUs")
+    common.report("  serial", common.best_time(serial, tokens), "tokens", len(tokens))
+    workers = 1
+    while workers <= max(cpus, 2):
+        seconds = common.best_time(parallel, tokens, workers)
+        common.report(f"  {workers} workers", seconds, "tokens", len(tokens))
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""
+Runs arithmetic-heavy programs with the tree engine, with the operator nodes
+evaluated generically and specialized to their operand types (see
+expr.Binary). Tiering is off so every node is evaluated, and each run
+starts from a fresh copy of the resolved tree, whose nodes aren't
+specialized yet.
+
+Run with: python -m benchmarks.bench_quicken
+"""
+from __future__ import annotations
+
+import copy
+import typing as tp
+
+import pylox.tiers as ti
+from benchmarks import common
+from pylox import expr, interpreter, lparser, resolver, scanner
+
+REPEAT = 5
+
+PROGRAMS = {
+    "arithmetic": """
+        fun run() {
+          var total = 0;
+          for (var i = 0; i < 20000; i = i + 1) {
+            total = total + i * i - i / 2 + (i - 1) * (i + 1);
+          }
+        }
+        run();
+        """,
+    "comparisons": """
+        fun run() {
+          var count = 0;
+          for (var i = 0; i < 20000; i = i + 1) {
+            if (i >= 100 and i <= 4000 and -i < 0 and i > -1) count = count + 1;
+          }
+        }
+        run();
+        """,
+    "fib": """
+        fun fib(n) { if (n < 2) return n; return fib(n - 2) + fib(n - 1); }
+        fib(17);
+        """,
+    "strings": """
+        fun run() {
+          var text = "";
+          for (var i = 0; i < 5000; i = i + 1) { text = "a" + text + "b"; }
+        }
+        run();
+        """,
+}
+
+
+def run(trees: tp.List[object], quicken: bool) -> None:
+    expr.quicken = quicken
+    interpreter.interpret(trees.pop())  # type: ignore
+
+
+def main() -> None:
+    thresholds = ti.call_threshold, ti.loop_threshold
+    ti.call_threshold = ti.loop_threshold = 0
+    try:
+        for name, source in PROGRAMS.items():
+            with common.quiet():
+                tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+            times = {}
+            for label, quicken in (("generic", False), ("specialized", True)):
+                trees = [copy.deepcopy(tree) for _ in range(REPEAT)]
+                with common.quiet():
+                    times[label] = common.best_time(run, trees, quicken, repeat=REPEAT)
+                common.report(f"{name}, {label}", times[label])
+            speedup = times["generic"] / times["specialized"]
+            print(f"{f'{name}, speedup':<40} {speedup:>10.2f}x")
+    finally:
+        expr.quicken = True
+        ti.call_threshold, ti.loop_threshold = thresholds
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Finds how deep a recursive Lox function can call itself with each engine
+before a stack overflow, doubling the depth until it fails, then times the
+calls at a depth every engine reaches. The VM keeps its frames on its own
+stack up to --max-depth (see vm.machine.max_depth), the other engines
+recurse on Python's stack.
+
+Run with: python -m benchmarks.bench_recursion
+"""
+from __future__ import annotations
+
+import pylox.vm.machine as vm
+from benchmarks import common
+from pylox import interpreter, lparser, resolver, scanner
+
+COUNT = """
+fun count(n) {
+    if (n == 0) return 0;
+    return 1 + count(n - 1);
+}
+print count(%d);
+"""
+# The depths tried, doubling from the first to the last
+DEPTHS = [2 ** power for power in range(6, 21)]
+# The depth timed, which every engine reaches
+TIMED = 128
+REPEAT = 5
+
+
+def parse(depth: int) -> object:
+    with common.quiet():
+        return resolver.resolve(lparser.parse(scanner.scan_buffer(COUNT % depth)))
+
+
+def run(tree: object, engine: str) -> bool:
+    """ Whether the program finished without an error """
+    with common.quiet():
+        interpreter.engine = engine
+        try:
+            return not interpreter.interpret(tree).status.error()  # type: ignore
+        finally:
+            interpreter.engine = "tree"
+
+
+def deepest(engine: str) -> int:
+    reached = 0
+    for depth in DEPTHS:
+        if not run(parse(depth), engine):
+            break
+        reached = depth
+    return reached
+
+
+def main() -> None:
+    max_depth = vm.max_depth
+    try:
+        for engine in interpreter.ENGINES:
+            print(f"{f'{engine}, deepest recursion':<40} {deepest(engine):>10}")
+        vm.max_depth = DEPTHS[-1] + 1
+        print(f"{'vm, raised max depth, deepest recursion':<40} {deepest('vm'):>10}")
+        vm.max_depth = max_depth
+        tree = parse(TIMED)
+        for engine in interpreter.ENGINES:
+            seconds = common.best_time(run, tree, engine, repeat=REPEAT)
+            common.report(f"{engine}, count({TIMED})", seconds, "calls", TIMED)
+    finally:
+        vm.max_depth = max_depth
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Resolves ordinary and deeply nested programs. The resolver keeps the nodes
+still to be resolved on an explicit stack, so it is compared with a
+recursive walk taking the same steps, which can't go deeper than the
+recursion limit.
+
+Run with: python -m benchmarks.bench_resolve
+"""
+from __future__ import annotations
+
+import typing as tp
+
+import pylox.abstract_execs as ae
+import pylox.resolver as rs
+from benchmarks import common
+from pylox import lparser, scanner
+
+
+def recursive_resolve(
+    nodes: tp.Iterable[ae.AbstractExec], scopes: rs.ResolverStack
+) -> None:
+    """ The recursive walk resolve_nodes replaced """
+    for node in nodes:
+        children = node.resolve_step(scopes)
+        if children:
+            recursive_resolve(children, scopes)
+
+
+def nested_program(depth: int) -> str:
+    return (
+        "{ var a = 1; " * depth
+        + "if (a) while (false) for (;;) print a;"
+        + " }" * depth
+    )
+
+
+def main() -> None:
+    tree = lparser.parse(scanner.scan_buffer(common.generated_program(2000)))
+    nodes = 0
+    stack = list(tree)
+    while stack:
+        nodes += 1
+        stack.extend(stack.pop().execs)
+    seconds = common.best_time(recursive_resolve, tree, rs.ResolverStack(), repeat=10)
+    common.report("recursive, ordinary code", seconds, "nodes", nodes)
+    seconds = common.best_time(rs.resolve_nodes, tree, rs.ResolverStack(), repeat=10)
+    common.report("explicit stack, ordinary code", seconds, "nodes", nodes)
+    for depth in (1_000, 10_000, 100_000):
+        with common.quiet():
+            tree = lparser.parse(scanner.scan_buffer(nested_program(depth)))
+            seconds = common.best_time(rs.resolve_nodes, tree, rs.ResolverStack())
+        common.report(f"explicit stack, depth {depth:,}", seconds)
+
+
+if __name__ == "__main__":
+    main()
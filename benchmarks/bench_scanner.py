@@ -0,0 +1,28 @@
+"""
+Compares the throughput of the regex based scanner with the original
+character by character scanner.
+
+Run with: python -m benchmarks.bench_scanner [number of functions]
+"""
+from __future__ import annotations
+
+import sys
+
+from benchmarks import common
+from pylox import scanner
+
+
+def main(functions: int = 20_000) -> None:
+    source = common.generated_program(functions)
+    tokens = scanner.scan(source)
+    assert tokens == scanner.legacy_scan(source), "The scanners disagree"
+    print(f"{len(source) / 1e6:.1f} MB of source, {len(tokens):,} tokens")
+    for name, function in (
+        ("legacy_scan (char by char)", scanner.legacy_scan),
+        ("scan (master regex)", scanner.scan),
+    ):
+        common.report(name, common.best_time(function, source), "tokens", len(tokens))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
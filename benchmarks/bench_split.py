@@ -0,0 +1,36 @@
+"""
+Measures statement parsing on large and on deeply nested programs. With the
+bracket table the time per token should stay roughly constant as programs
+grow, where rescanning every nested statement made it grow with the depth.
+
+Run with: python -m benchmarks.bench_split
+"""
+from __future__ import annotations
+
+from benchmarks import common
+from pylox import scanner, stmt_parse
+
+
+def nested_program(depth: int) -> str:
+    opening = "".join(
+        f"if (a{i} < {i}) {{\n    while (b{i}) {{\n" for i in range(depth)
+    )
+    return opening + "print a;\n" + "}\n}\n" * depth
+
+
+def parse(tokens: object) -> None:
+    tuple(stmt_parse.from_tokens(tokens))  # type: ignore
+
+
+def main() -> None:
+    cases = [(f"flat, {n} functions", common.generated_program(n)) for n in (100, 400)]
+    cases += [(f"nested, depth {n}", nested_program(n)) for n in (10, 20, 40)]
+    for name, source in cases:
+        tokens = scanner.scan_buffer(source)
+        with common.quiet():
+            seconds = common.best_time(parse, tokens)
+        common.report(name, seconds, "tokens", len(tokens))
+
+
+if __name__ == "__main__":
+    main()
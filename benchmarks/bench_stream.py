@@ -0,0 +1,61 @@
+"""
+Compares the peak memory of reading and scanning a whole file with the
+memory mapped, streaming scanner.
+
+Run with: python -m benchmarks.bench_stream [number of functions]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import tracemalloc
+import typing as tp
+
+from benchmarks import common
+from pylox import lparser, scanner
+
+
+def peak_memory(func: tp.Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(functions: int = 5_000) -> None:
+    with tempfile.NamedTemporaryFile("w", suffix=".lox", delete=False) as file:
+        file.write(common.generated_program(functions))
+    try:
+        print(f"{os.path.getsize(file.name) / 1e6:.1f} MB of source")
+
+        def read() -> str:
+            with open(file.name) as source:
+                return source.read()
+
+        def stream(consumer: tp.Callable[[scanner.TokenStream], object]) -> None:
+            with open(file.name, "rb") as source:
+                consumer(scanner.TokenStream(scanner.mapped_chunks(source)))
+
+        def consume(tokens: tp.Iterable[object]) -> None:
+            for _ in tokens:
+                pass
+
+        cases = (
+            ("read + scan", lambda: scanner.scan(read())),
+            ("stream scan", lambda: stream(consume)),
+            ("read + scan + parse", lambda: lparser.parse(scanner.scan(read()))),
+            ("stream scan + parse", lambda: stream(lparser.parse)),
+        )
+        for name, func in cases:
+            peak = peak_memory(func)
+            seconds = common.best_time(func, repeat=1)
+            print(f"{name:<24} peak {peak / 1e6:>8.2f} MB {seconds * 1000:>10.1f} ms")
+    finally:
+        os.unlink(file.name)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
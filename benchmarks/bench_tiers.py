@@ -0,0 +1,49 @@
+"""
+Runs the programs of bench_engines with the tree engine, evaluating every
+node and then compiling functions and loops once they're hot (see tiers).
+Each run starts cold, from a fresh copy of the resolved tree.
+
+Run with: python -m benchmarks.bench_tiers
+"""
+from __future__ import annotations
+
+import copy
+import typing as tp
+
+import pylox.tiers as ti
+from benchmarks import common
+from benchmarks.bench_engines import PROGRAMS
+from pylox import interpreter, lparser, resolver, scanner
+
+REPEAT = 5
+
+
+def run(trees: tp.List[object], thresholds: tp.Tuple[int, int]) -> None:
+    ti.call_threshold, ti.loop_threshold = thresholds
+    interpreter.interpret(trees.pop())  # type: ignore
+
+
+def main() -> None:
+    tiered = ti.call_threshold, ti.loop_threshold
+    try:
+        for name, source in PROGRAMS.items():
+            with common.quiet():
+                tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+            times = {}
+            for label, thresholds in (("untiered", (0, 0)), ("tiered", tiered)):
+                trees = [copy.deepcopy(tree) for _ in range(REPEAT)]
+                ti.transitions.clear()
+                with common.quiet():
+                    times[label] = common.best_time(
+                        run, trees, thresholds, repeat=REPEAT
+                    )
+                common.report(f"{name}, {label}", times[label])
+            speedup = times["untiered"] / times["tiered"]
+            compiled = len(ti.transitions) // REPEAT
+            print(f"{f'{name}, speedup ({compiled} compiled)':<40} {speedup:>10.2f}x")
+    finally:
+        ti.call_threshold, ti.loop_threshold = tiered
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Compares the memory used per token by a list of Token objects and by a
+TokenBuffer, along with the time it takes to scan and parse from each.
+
+Run with: python -m benchmarks.bench_token_buffer [number of functions]
+"""
+from __future__ import annotations
+
+import sys
+import tracemalloc
+import typing as tp
+
+from benchmarks import common
+from pylox import lparser, scanner
+
+
+def retained_memory(func: tp.Callable[[], tp.Sized]) -> tp.Tuple[int, int]:
+    """ Returns the number of bytes retained by the result of func and its length """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return tracemalloc.get_traced_memory()[0] - before, len(result)
+    finally:
+        tracemalloc.stop()
+
+
+def main(functions: int = 5_000) -> None:
+    source = common.generated_program(functions)
+    for name, scan in (
+        ("list of Token", scanner.scan),
+        ("TokenBuffer", scanner.scan_buffer),
+    ):
+        size, count = retained_memory(lambda: scan(source))  # type: ignore
+        print(f"{name:<16} {size / count:>8.1f} bytes/token ({count:,} tokens)")
+        common.report(f"  scan", common.best_time(scan, source), "tokens", count)
+        common.report(
+            f"  scan + parse",
+            common.best_time(lambda: lparser.parse(scan(source)), repeat=1),
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
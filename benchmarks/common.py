@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import time
+import typing as tp
+
+T = tp.TypeVar("T")
+
+
+def best_time(func: tp.Callable[..., object], *args: object, repeat: int = 3) -> float:
+    """ Returns the fastest wall clock time of repeat calls to func(*args) """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@contextlib.contextmanager
+def quiet() -> tp.Iterator[io.StringIO]:
+    """ Swallows everything the interpreter prints while benchmarking """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        yield output
+
+
+def report(name: str, seconds: float, unit: str = "", count: float = 0) -> None:
+    rate = f"  {count / seconds:>14,.0f} {unit}/sec" if count else ""
+    print(f"{name:<40} {seconds * 1000:>10.2f} ms{rate}")
+
+
+def generated_program(functions: int) -> str:
+    """
+    Returns a library style Lox program with the given number of
+    functions, only one of which is called.
+    """
+    parts = []
+    for i in range(functions):
+        parts.append(
+            f"fun function_{i}(a, b) {{\n"
+            f"    var total = a * {i} + b;\n"
+            f"    while (total > 100) {{\n"
+            f"        total = total - 7;\n"
+            f"    }}\n"
+            f'    print "function_{i}";\n'
+            f"    return total;\n"
+            f"}}\n"
+            f"/* Generated function number {i} */\n"
+        )
+    parts.append("print function_0(1, 2);\n")
+    return "".join(parts)
@@ -8,20 +8,37 @@ import pylox.enviroment as env
 import pylox.lox_builtins as lb
 import pylox.lox_errors as le
 from pylox import results
-import pylox.misc_utils as mu
+import pylox.resolver as rs
 
 if tp.TYPE_CHECKING:
-    import pylox.resolver as rs
+    import pylox.control_flow as cf
     import pylox.lox_types as lt
     import pylox.token_classes as tc
 
 
+ResolveSteps = tp.Optional[tp.Iterable["AbstractExec"]]
+
+
 class AbstractExec(abc.ABC):
+    # Shared by every node, as the running program's frames are
     environment: tp.ClassVar[env.Environment] = env.Environment(lb.BUILTINS)
+    # Set once when a dataclass node is built, from the flags of its children
+    errored: bool = False
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "errored", has_error(self.execs))
 
     def __repr__(self) -> str:
         return f"{type(self).__name__}()"
 
+    @property
+    def kind(self) -> str:
+        """
+        The name the compilers know the node by, that of its class unless
+        it's a specialized variant of another node (see expr.Binary)
+        """
+        return type(self).__name__
+
     @abc.abstractmethod
     def __str__(self) -> str:
         pass
@@ -29,14 +46,22 @@ class AbstractExec(abc.ABC):
     @abc.abstractmethod
     def evaluate(self) -> lt.StmtLiteral:
         """
-        Evaluates the node. Returns None if it is a statement.
+        Evaluates the node. A statement returns how it finished instead
+        (see control_flow).
         If you want to execute the AST, call AbstractExec.interpret
         """
 
     def resolve(self, scopes: rs.ResolverStack) -> None:
-        """ Resolves the node."""
-        for node in self.execs:
-            node.resolve(scopes)
+        """ Resolves the node and every node in it (see resolver.resolve_nodes) """
+        rs.resolve_nodes((self,), scopes)
+
+    def resolve_step(self, scopes: rs.ResolverStack) -> ResolveSteps:
+        """
+        Resolves the node itself and returns the nodes in it to resolve next.
+        Nodes that need to act once those are resolved, e.g. to close a
+        scope, are generators yielding them instead.
+        """
+        return self.execs
 
     @property
     def execs(self) -> tp.Sequence[AbstractExec]:
@@ -47,26 +72,30 @@ class AbstractExec(abc.ABC):
 
     def has_error(self) -> bool:
         """ Returns True if the code piece has an error"""
-        return has_error(self.execs)
+        return self.errored
 
     def interpret(self) -> results.ResultNT:
         try:
             return results.ResultNT(self.evaluate())
         except le.LoxRuntimeError as lre:
+            if lre.trace:
+                lre.unwind("script")
             lre.error()
+        except RecursionError:
+            # Evaluating nested nodes recurses, however they're nested
+            le.LoxRuntimeError(message="Stack overflow.").error()
         return results.ResultNT(None, le.ErrorReturns.RUNTIME_ERROR)
 
 
 class ErrorExec(AbstractExec):
+    errored = True
+
     def __repr__(self) -> str:
         return f"{type(self).__name__}()"
 
     def __str__(self) -> str:
         return "error"
 
-    def has_error(self) -> bool:
-        return True
-
     def evaluate(self) -> tp.NoReturn:
         raise le.LoxRuntimeError(ignore=True)
 
@@ -76,8 +105,8 @@ class Stmt(AbstractExec):
         return f"{type(self).__name__} {self.execs}"
 
     @abc.abstractmethod
-    def evaluate(self) -> None:
-        pass
+    def evaluate(self) -> tp.Optional[cf.Completion]:
+        """ Runs the statement, returning how it finished (see control_flow) """
 
 
 class Expr(AbstractExec):
@@ -112,17 +141,27 @@ class BinaryExpr(Expr, abc.ABC):
 @dataclass  # type: ignore
 class VarExpr(Expr, abc.ABC):
     name: tc.Token
+    # The number of frames up from the current one the variable is in, -1
+    # if it is a global or UPVALUE if it is a local of an enclosing function,
+    # and its slot in the frame, the globals or the upvalues
     distance: int = field(init=False, default=-1)
+    slot: int = field(init=False, default=-1)
+    # Whether the local is in a cell as a nested function uses it
+    cell: bool = field(init=False, default=False)
+
+    def __setstate__(self, state: tp.Dict[str, tp.Any]) -> None:
+        self.__dict__.update(state)
+        if self.distance == -1 and self.slot >= 0:
+            # Global slots are numbered per process, so the slot of a
+            # resolved global unpickled from the AST cache is renumbered
+            self.slot = env.global_slot(self.name.lexeme)
 
     def resolve_local(self, scopes: rs.ResolverStack) -> None:
-        for i, scope in mu.reverse_enum(scopes.stack):
-            if self.name.lexeme in scope:
-                self.distance = i
-                return
+        self.distance, self.slot = scopes.lookup(self.name.lexeme, self)
 
 
 def has_error(iterable: tp.Iterable[AbstractExec]) -> bool:
-    return any(expr.has_error() for expr in iterable)
+    return any(node.errored for node in iterable)
 
 
 def parenthesize_expr(name: str, *args: object) -> str:
@@ -0,0 +1,360 @@
+"""
+Incremental analysis of a Lox document for the language server. The text is
+tiled by its top-level declarations, each of which keeps its own syntax tree
+and diagnostics. An edit only re-scans, re-parses and re-resolves the
+declarations it touches, plus the declarations using a global name that
+the changed ones defined.
+"""
+from __future__ import annotations
+
+import bisect
+import collections
+import contextlib
+import dataclasses
+import io
+import re
+import typing as tp
+
+import pylox.abstract_execs as ae
+import pylox.expr as expr
+import pylox.lox_builtins as lb
+import pylox.lox_errors as le
+import pylox.resolver as rs
+import pylox.split_tokens as sp
+import pylox.stmt as stmt
+import pylox.stmt_parse as stp
+import pylox.token_utils as tu
+from pylox import scanner
+from pylox.token_classes import TokenType as tt
+
+if tp.TYPE_CHECKING:
+    import pylox.token_buffer as tb
+
+# Severities as used by the language server protocol
+ERROR = 1
+WARNING = 2
+
+# Everything le.error prints to stderr
+ERROR_PATTERN = re.compile(r"^\[line: ([^\]]*)\] (.*)$", re.MULTILINE)
+CONDITION_TYPES = frozenset((tt.IF, tt.WHILE, tt.FOR))
+
+
+class DiagnosticNT(tp.NamedTuple):
+    line: int
+    message: str
+    severity: int = ERROR
+
+
+@dataclasses.dataclass(eq=False)
+class Declaration:
+    """
+    A top-level statement and the text after it up to the next one. Token
+    lines are relative to where it was last scanned, and shift is added to
+    them to get the line in the document.
+    """
+
+    start: int
+    shift: int
+    tree: ae.Stmt
+    diagnostics: tp.List[DiagnosticNT]
+    resolve_diagnostics: tp.List[DiagnosticNT] = dataclasses.field(default_factory=list)
+    warnings: tp.List[DiagnosticNT] = dataclasses.field(default_factory=list)
+    # Whether the statement could be extended by a bracket after it
+    open: bool = False
+    defines: tp.FrozenSet[str] = frozenset()
+    # The global names read or assigned and the line each is first used on
+    uses: tp.Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def resolve(self) -> None:
+        """ Resolves the tree on its own, as globals are not tracked """
+        if self.tree.has_error():
+            return
+        with capture() as errors:
+            self.tree.resolve(rs.ResolverStack())
+        self.resolve_diagnostics = parse_diagnostics(errors.getvalue())
+        self.defines, self.uses = global_names(self.tree)
+
+    def all_diagnostics(self) -> tp.Iterator[DiagnosticNT]:
+        for diagnostics in (self.diagnostics, self.resolve_diagnostics, self.warnings):
+            for line, message, severity in diagnostics:
+                yield DiagnosticNT(line + self.shift, message, severity)
+
+
+@contextlib.contextmanager
+def capture() -> tp.Iterator[io.StringIO]:
+    with contextlib.redirect_stderr(io.StringIO()) as errors:
+        yield errors
+
+
+def parse_diagnostics(errors: str, default_line: int = 1) -> tp.List[DiagnosticNT]:
+    diagnostics = []
+    for match in ERROR_PATTERN.finditer(errors):
+        line, message = match.groups()
+        # Some errors are reported at "end of file" or line 0 rather than a
+        # line of the statement
+        number = re.match(r"\d+", line)
+        if number is None or number.group() == "0":
+            diagnostics.append(DiagnosticNT(default_line, message))
+        else:
+            diagnostics.append(DiagnosticNT(int(number.group()), message))
+    return diagnostics
+
+
+def global_names(
+    tree: ae.AbstractExec,
+) -> tp.Tuple[tp.FrozenSet[str], tp.Dict[str, int]]:
+    """ Returns the names a top-level statement defines and the globals it uses """
+    if isinstance(tree, stmt.FunctionStmt):
+        defines = frozenset((tree.function.name,))
+    elif isinstance(tree, stmt.VarStmt):
+        defines = frozenset((tree.name.lexeme,))
+    elif isinstance(tree, stmt.ClassStmt):
+        defines = frozenset((tree.lox_class.name,))
+    else:
+        defines = frozenset()
+    uses: tp.Dict[str, int] = {}
+    stack: tp.List[ae.AbstractExec] = [tree]
+    # Super nodes point back at their class, so the tree can have cycles
+    seen: tp.Set[int] = set()
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, stmt.ClassStmt) and node.super_class_var is not None:
+            stack.append(node.super_class_var)
+        if (
+            isinstance(node, (expr.Variable, expr.Assign))
+            and node.distance == -1
+            and node.name.lexeme not in uses
+        ):
+            uses[node.name.lexeme] = node.name.line
+        stack.extend(node.execs)
+    return defines, uses
+
+
+def is_open(tokens: tu.TokenSpan, start: int, stop: int) -> bool:
+    """
+    Returns True if the statement tokens[start:stop] was split using a
+    bracket without a match, so a bracket anywhere after it could change it
+    """
+    types, match = tokens.table.types, tokens.table.match
+    for index in range(tokens.start + start, tokens.start + stop):
+        if match[index] < 0 and (
+            types[index] is tt.LEFT_BRACE
+            or types[index] is tt.LEFT_PAREN
+            and types[index - 1] in CONDITION_TYPES
+        ):
+            return True
+    return False
+
+
+def offsets(tokens: tu.TokenSpan) -> tp.Sequence[int]:
+    """ The text offset of each token of the document, scanned to a TokenBuffer """
+    return tp.cast("tb.TokenBuffer", tokens.source).starts
+
+
+def region_bounds(
+    tokens: tu.TokenSpan, end: int, final: bool
+) -> tp.Optional[tp.List[sp.StmtBoundsNT]]:
+    """
+    Returns the bounds of the statements starting before the text offset
+    end, or None if they could change with the text after end. tokens should
+    go on past end, unless final is True and end is the end of the document.
+    """
+    starts = offsets(tokens)
+    bounds = []
+    position = 0
+    while position < len(tokens) and starts[tokens.start + position] < end:
+        bounds.append(sp.statement_bounds(tokens, position))
+        position = bounds[-1].next
+    if final:
+        return bounds
+    # A string or comment which isn't closed swallows the next declaration
+    if position >= len(tokens) or starts[tokens.start + position] != end:
+        return None
+    return None if is_open(tokens, 0, position) else bounds
+
+
+def add_scan_errors(
+    declarations: tp.Sequence[Declaration],
+    errors: tp.Sequence[tp.Tuple[DiagnosticNT, int]],
+) -> None:
+    """
+    Gives each scanner error to the declaration whose text it is in. Its tree
+    is discarded, as the tokens it was parsed from were incomplete.
+    """
+    starts = [declaration.start for declaration in declarations]
+    # Inserted last first so they stay in order ahead of the parser errors
+    for diagnostic, offset in reversed(errors):
+        index = max(bisect.bisect_right(starts, offset) - 1, 0)
+        declarations[index].tree = stmt.ErrorStmt()
+        declarations[index].diagnostics.insert(0, diagnostic)
+
+
+class Document:
+    """ A Lox source file which is edited in place and analysed incrementally """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.declarations: tp.List[Declaration] = []
+        # How many declarations define each global name
+        self.definitions: tp.Counter[str] = collections.Counter()
+        self.line_starts = [0]
+        self.line_starts.extend(match.end() for match in re.finditer("\n", text))
+        self.reanalyse(0, 0)
+
+    def offset(self, line: int, character: int) -> int:
+        """
+        Converts a zero based line and UTF-16 character position, as used by
+        the language server protocol, to an index into the text
+        """
+        if line >= len(self.line_starts):
+            return len(self.text)
+        start = self.line_starts[line]
+        end = self.line_starts[line + 1] if line + 1 < len(self.line_starts) else None
+        text = self.text[start:end]
+        if text.isascii():
+            return start + min(character, len(text))
+        units = 0
+        for index, char in enumerate(text):
+            if units >= character:
+                return start + index
+            units += 2 if ord(char) > 0xFFFF else 1
+        return start + len(text)
+
+    def edit(self, start: int, end: int, new_text: str) -> None:
+        """ Replaces text[start:end] with new_text and reanalyses what changed """
+        delta = len(new_text) - (end - start)
+        line_delta = new_text.count("\n") - self.text.count("\n", start, end)
+        self.text = self.text[:start] + new_text + self.text[end:]
+        self.update_lines(start, end, new_text, delta)
+        starts = [declaration.start for declaration in self.declarations]
+        # The declaration before the edit is reanalysed too, as it can be
+        # continued by the edit, e.g. by an else
+        first = max(bisect.bisect_right(starts, start) - 2, 0)
+        for index, declaration in enumerate(self.declarations[:first]):
+            if declaration.open:
+                first = index
+                break
+        stop = bisect.bisect_right(starts, end)
+        for declaration in self.declarations[stop:]:
+            declaration.start += delta
+            declaration.shift += line_delta
+        self.reanalyse(first, stop)
+
+    def update_lines(self, start: int, end: int, new_text: str, delta: int) -> None:
+        first = bisect.bisect_right(self.line_starts, start)
+        stop = bisect.bisect_right(self.line_starts, end)
+        inserted = [start + match.end() for match in re.finditer("\n", new_text)]
+        self.line_starts[first:] = inserted + [
+            line_start + delta for line_start in self.line_starts[stop:]
+        ]
+
+    def line(self, offset: int) -> int:
+        return bisect.bisect_right(self.line_starts, offset)
+
+    def region_end(self, stop: int) -> int:
+        if stop < len(self.declarations):
+            return self.declarations[stop].start
+        return len(self.text)
+
+    def reanalyse(self, first: int, stop: int) -> None:
+        """
+        Replaces declarations[first:stop] with the declarations found in
+        their text, growing the region until it ends between two statements
+        """
+        start = self.declarations[first].start if self.declarations else 0
+        while True:
+            end = self.region_end(stop) - start
+            # The first token of the next declaration is scanned as well, to
+            # check it still starts a statement
+            text = self.text[start : self.region_end(stop + 1)]
+            with capture() as errors:
+                buffer, offsets = scanner.scan_partial(text)
+            tokens = tu.TokenSpan.of(buffer)
+            final = stop >= len(self.declarations)
+            bounds = region_bounds(tokens, end, final)
+            if bounds is not None:
+                break
+            # Grown by as many declarations as it has, as a brace which is
+            # still being typed can make it run on to the end of the document
+            stop += stop - first + 1
+        shift = self.line(start) - 1
+        new = self.parse(tokens, bounds, start, shift)
+        if offsets:
+            scanned = zip(parse_diagnostics(errors.getvalue()), offsets)
+            # Errors past end are in the next declaration, which is unchanged
+            add_scan_errors(
+                new,
+                [(error, start + offset) for error, offset in scanned if offset < end],
+            )
+        old = self.declarations[first:stop]
+        self.declarations[first:stop] = new
+        for declaration in new:
+            declaration.resolve()
+        self.update_dependents(old, new)
+
+    @staticmethod
+    def parse(
+        tokens: tu.TokenSpan,
+        bounds: tp.Iterable[sp.StmtBoundsNT],
+        start: int,
+        shift: int,
+    ) -> tp.List[Declaration]:
+        """ Parses the statements in bounds into declarations """
+        new: tp.List[Declaration] = []
+        for bound in bounds:
+            # The first declaration also owns any text before its statement
+            offset = start + offsets(tokens)[bound.start] if new else start
+            line = tokens[bound.start].line
+            with capture() as errors:
+                try:
+                    tree = stp.statement(tokens[bound.start : bound.stop])
+                except Exception as exc:
+                    # The parser can crash on some invalid code, which the
+                    # server has to survive while it is being typed
+                    tree = stmt.ErrorStmt()
+                    message = f"Internal error: {type(exc).__name__}: {exc}"
+                    le.error(line, message, le.ErrorReturns.PARSE_ERROR)
+            diagnostics = parse_diagnostics(errors.getvalue(), line)
+            declaration = Declaration(offset, shift, tree, diagnostics)
+            declaration.open = is_open(tokens, bound.start, bound.next)
+            new.append(declaration)
+        if not new:
+            # Only whitespace and comments, which still need an owner
+            new.append(Declaration(start, shift, stmt.NullStmt(), []))
+        return new
+
+    def update_dependents(
+        self, old: tp.Sequence[Declaration], new: tp.Sequence[Declaration]
+    ) -> None:
+        changed: tp.Set[str] = set()
+        for declaration in old:
+            self.definitions.subtract(declaration.defines)
+            changed.update(declaration.defines)
+        for declaration in new:
+            self.definitions.update(declaration.defines)
+            changed.update(declaration.defines)
+        new_ids = {id(declaration) for declaration in new}
+        for declaration in self.declarations:
+            if id(declaration) in new_ids:
+                self.check_globals(declaration)
+            elif not changed.isdisjoint(declaration.uses):
+                declaration.resolve()
+                self.check_globals(declaration)
+
+    def check_globals(self, declaration: Declaration) -> None:
+        declaration.warnings = [
+            DiagnosticNT(line, f'Undefined global variable "{name}"', WARNING)
+            for name, line in declaration.uses.items()
+            if self.definitions[name] <= 0 and name not in lb.BUILTINS
+        ]
+
+    def diagnostics(self) -> tp.List[DiagnosticNT]:
+        """ The diagnostics of the whole document, with lines starting at 1 """
+        return [
+            diagnostic
+            for declaration in self.declarations
+            for diagnostic in declaration.all_diagnostics()
+        ]
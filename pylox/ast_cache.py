@@ -0,0 +1,127 @@
+"""
+A cache of resolved syntax trees, similar to __pycache__. The tree of
+dir/name.lox is pickled to dir/__loxcache__/name.<parser>.pylox-<version>.loxc,
+where parser is the expression parser that built it, and is reused while the
+sha256 hash of the source is unchanged.
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import pathlib
+import pickle
+import shutil
+import tempfile
+import typing as tp
+
+import pylox
+import pylox.expr_parse as ep
+
+if tp.TYPE_CHECKING:
+    import pylox.abstract_execs as ae
+
+CACHE_DIR_NAME = "__loxcache__"
+SUFFIX = ".loxc"
+# Bumped whenever the layout of the syntax tree changes
+FORMAT = 8
+MAGIC = b"LOXC" + FORMAT.to_bytes(2, "little")
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+# Set by the command line options (see lox.main)
+enabled = True
+# Like PYTHONPYCACHEPREFIX, caches are kept in a mirror of the source tree
+# under prefix instead of next to the sources if it is set
+prefix: tp.Optional[str] = None
+
+Tree = tp.Sequence["ae.AbstractExec"]
+
+
+def source_hash(source: str) -> bytes:
+    return hashlib.sha256(source.encode("utf-8", "surrogatepass")).digest()
+
+
+def cache_dir(source_path: tp.Optional[str] = None) -> pathlib.Path:
+    """ The directory holding the caches of files in source_path's directory """
+    if source_path is None:
+        directory = pathlib.Path.cwd()
+    else:
+        directory = pathlib.Path(source_path).absolute().parent
+    if prefix is None:
+        return directory / CACHE_DIR_NAME
+    return pathlib.Path(prefix, *directory.parts[1:])
+
+
+def cache_path(source_path: str) -> pathlib.Path:
+    """
+    The cache of source_path. The expression parsers don't accept exactly the
+    same programs, so each has its own cache.
+    """
+    stem = pathlib.Path(source_path).stem
+    name = f"{stem}.{ep.parser}.pylox-{pylox.__version__}{SUFFIX}"
+    return cache_dir(source_path) / name
+
+
+def cacheable(source_path: str) -> bool:
+    """ Pipes and devices (e.g /dev/stdin) have no directory to cache in """
+    return enabled and os.path.isfile(source_path)
+
+
+def load(source_path: str, digest: bytes) -> tp.Optional[Tree]:
+    """ Returns the cached tree or None if it is missing, stale or invalid """
+    if not cacheable(source_path):
+        return None
+    try:
+        with open(cache_path(source_path), "rb") as file:
+            header = file.read(len(MAGIC) + DIGEST_SIZE)
+            if header != MAGIC + digest:
+                return None
+            return pickle.load(file)
+    except Exception:
+        # A corrupt or unreadable cache is rebuilt, as with __pycache__
+        return None
+
+
+def dump(source_path: str, digest: bytes, tree: Tree) -> None:
+    """ Caches tree, silently giving up if it can't be written """
+    if not cacheable(source_path):
+        return
+    path = cache_path(source_path)
+    try:
+        payload = pickle.dumps(tuple(tree), pickle.HIGHEST_PROTOCOL)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first so readers never see half a cache
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=SUFFIX)
+    except (OSError, pickle.PicklingError, RecursionError, TypeError):
+        return
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(MAGIC + digest + payload)
+        os.replace(temp_path, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+
+
+def clear(source_path: tp.Optional[str] = None) -> None:
+    """
+    Deletes the cache directory used for source_path, or for the working
+    directory if it is None. The prefix can be any directory, so with one
+    only the caches under it are deleted, with the directories left empty.
+    """
+    if prefix is None:
+        shutil.rmtree(cache_dir(source_path), ignore_errors=True)
+        return
+    root = pathlib.Path(prefix)
+    directories = set()
+    for path in root.rglob(f"*{SUFFIX}"):
+        with contextlib.suppress(OSError):
+            path.unlink()
+            directories.add(path.parent)
+    for directory in directories:
+        while directory != root.parent:
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+            directory = directory.parent
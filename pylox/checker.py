@@ -0,0 +1,118 @@
+"""
+Checks files for scanner, parser and resolver errors without running them,
+in a pool of worker processes (see lox --check). Files with a valid AST
+cache already passed. Checking doesn't write to the checked trees, so files
+which pass are only cached if the caches are kept elsewhere (--cache-dir).
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import time
+import typing as tp
+
+import pylox.ast_cache as ac
+import pylox.expr_parse as ep
+import pylox.lox_errors as le
+import pylox.stmt_parse as stp
+from pylox import lparser, resolver, results, scanner
+
+SUFFIX = ".lox"
+
+
+class CheckedNT(tp.NamedTuple):
+    path: str
+    status: le.ErrorReturns
+    diagnostics: str
+
+
+def lox_files(paths: tp.Iterable[str]) -> tp.Iterator[str]:
+    """ Yields the paths, replacing directories with the .lox files in them """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, dirs, files in os.walk(path):
+            dirs[:] = sorted(name for name in dirs if name != ac.CACHE_DIR_NAME)
+            for name in sorted(files):
+                if name.endswith(SUFFIX):
+                    yield os.path.join(directory, name)
+
+
+def configure(
+    expr_parser: str, cache_enabled: bool, cache_prefix: tp.Optional[str]
+) -> None:
+    """ Copies the options of the main process into a worker """
+    ep.parser = expr_parser
+    # Every function body is checked
+    stp.lazy = False
+    ac.enabled = cache_enabled
+    ac.prefix = cache_prefix
+
+
+def check_file(path: str) -> CheckedNT:
+    """ Scans, parses and resolves the file, never interpreting it """
+    try:
+        with open(path) as file:
+            source = file.read()
+    except (OSError, UnicodeDecodeError) as exc:
+        message = f"{exc.strerror if isinstance(exc, OSError) else exc}\n"
+        return CheckedNT(path, le.ErrorReturns.FILE_ERROR, message)
+    digest = ac.source_hash(source)
+    if ac.load(path, digest) is not None:
+        return CheckedNT(path, le.ErrorReturns.SUCCESS, "")
+    with contextlib.redirect_stderr(io.StringIO()) as errors:
+        try:
+            tree = resolver.resolve(lparser.parse(scanner.scan(source)))
+        except Exception as exc:
+            # One file crashing the front end shouldn't stop the others
+            # from being checked
+            message = f"Internal error: {type(exc).__name__}: {exc}\n"
+            return CheckedNT(path, le.ErrorReturns.ERROR, errors.getvalue() + message)
+    if isinstance(tree, results.ReturnList):
+        return CheckedNT(path, tree.status, errors.getvalue())
+    if isinstance(tree, le.ErrorReturns):
+        return CheckedNT(path, tree, errors.getvalue())
+    if ac.prefix is not None:
+        ac.dump(path, digest, tree)
+    return CheckedNT(path, le.ErrorReturns.SUCCESS, errors.getvalue())
+
+
+def check_files(paths: tp.Sequence[str], jobs: int) -> tp.Iterator[CheckedNT]:
+    """ Checks the files in order, with jobs worker processes if it's over 1 """
+    if jobs <= 1 or len(paths) <= 1:
+        configure(ep.parser, ac.enabled, ac.prefix)
+        yield from map(check_file, paths)
+        return
+    with concurrent.futures.ProcessPoolExecutor(
+        jobs, initializer=configure, initargs=(ep.parser, ac.enabled, ac.prefix)
+    ) as executor:
+        yield from executor.map(check_file, paths, chunksize=4)
+
+
+def check(paths: tp.Iterable[str], jobs: tp.Optional[int] = None) -> le.ErrorReturns:
+    """
+    Checks the files and directories, printing their diagnostics and a
+    summary. Returns the status of the worst error found.
+    """
+    files = list(lox_files(paths))
+    start = time.perf_counter()
+    status = le.ErrorReturns.SUCCESS
+    failed = 0
+    for checked in check_files(files, jobs or os.cpu_count() or 1):
+        for line in checked.diagnostics.splitlines():
+            print(f"{checked.path}: {line}", file=sys.stderr)
+        if checked.status.error():
+            failed += 1
+            if checked.status.value.code > status.value.code:
+                status = checked.status
+    seconds = time.perf_counter() - start
+    rate = len(files) / seconds if seconds else 0.0
+    print(
+        f"Checked {len(files)} files in {seconds:.2f}s ({rate:,.0f} files/sec), "
+        f"{failed} with errors"
+    )
+    return status
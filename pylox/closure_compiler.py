@@ -0,0 +1,524 @@
+"""
+An engine compiling each node of a resolved tree once into a Python closure
+(see interpreter.engine). The operator, slot, frame depth and constant of a
+node are looked at when it is compiled, so running it only does the work
+left for that particular node. The closures behave exactly like the
+evaluate methods of the nodes they were compiled from, errors included.
+"""
+from __future__ import annotations
+
+import contextlib
+import typing as tp
+
+import pylox.abstract_execs as ae
+import pylox.control_flow as cf
+import pylox.enviroment as env
+import pylox.functions as fn
+import pylox.lox_class as lc
+import pylox.lox_errors as le
+import pylox.lox_ops as lo
+import pylox.lox_types as lt
+import pylox.lox_utils as lu
+from pylox import expr, results, stmt
+from pylox.token_classes import TokenType as tt
+
+Code = tp.Callable[[], tp.Any]
+
+
+def compile_tree(tree: tp.Iterable[ae.AbstractExec]) -> tp.Iterator[CompiledStmt]:
+    """ Compiles the top-level statements, each one just before it is run """
+    compiler = Compiler(ae.AbstractExec.environment)
+    for node in tree:
+        try:
+            code = compiler.compile(node)
+        except RecursionError:
+            raise le.LoxRuntimeError(message=le.TOO_DEEP) from None
+        yield CompiledStmt(code)
+
+
+class CompiledStmt:
+    """ A compiled top-level statement, run like AbstractExec.interpret """
+
+    __slots__ = ("code",)
+
+    def __init__(self, code: Code) -> None:
+        self.code = code
+
+    def interpret(self) -> results.ResultNT:
+        try:
+            return results.ResultNT(self.code())
+        except le.LoxRuntimeError as lre:
+            if lre.trace:
+                lre.unwind("script")
+            lre.error()
+        except RecursionError:
+            # The closures of nested nodes call each other
+            le.LoxRuntimeError(message="Stack overflow.").error()
+        return results.ResultNT(None, le.ErrorReturns.RUNTIME_ERROR)
+
+
+class Compiler:
+    """
+    Compiles nodes to closures running in environment. cells are the slots
+    of the current frame holding cells, which locals are defined through.
+    """
+
+    def __init__(self, environment: env.Environment) -> None:
+        self.environment = environment
+        self.cells: tp.AbstractSet[int] = frozenset()
+
+    def compile(self, node: ae.AbstractExec) -> Code:
+        return getattr(self, f"compile_{node.kind}")(node)
+
+    @contextlib.contextmanager
+    def frame(self, cells: tp.Iterable[int]) -> tp.Iterator[None]:
+        """ Compiles the nodes in the block run in a frame with the given cells """
+        enclosing, self.cells = self.cells, frozenset(cells)
+        try:
+            yield
+        finally:
+            self.cells = enclosing
+
+    def global_slot(self, name: str) -> int:
+        """ The slot of a global, made in advance so it can be indexed directly """
+        slot = env.global_slot(name)
+        lox_globals = self.environment.globals
+        if slot >= len(lox_globals):
+            lox_globals.extend([env.UNDEFINED] * (slot + 1 - len(lox_globals)))
+        return slot
+
+    def define(
+        self, name: str, slot: tp.Optional[int]
+    ) -> tp.Callable[[lt.LoxLiteral], None]:
+        """ A function defining the local in slot, or the global if it's None """
+        environment = self.environment
+        if slot is None:
+            lox_globals = environment.globals
+            slot = self.global_slot(name)
+
+            def define_global(value: lt.LoxLiteral) -> None:
+                lox_globals[slot] = value  # type: ignore
+
+            return define_global
+        if slot in self.cells:
+
+            def define_cell(value: lt.LoxLiteral) -> None:
+                environment.frame.slots[slot].value = value  # type: ignore
+
+            return define_cell
+
+        def define_local(value: lt.LoxLiteral) -> None:
+            environment.frame.slots[slot] = value  # type: ignore
+
+        return define_local
+
+    # Expressions
+
+    def compile_Literal(self, node: expr.Literal) -> Code:
+        value = node.value
+        return lambda: value
+
+    def compile_Grouping(self, node: expr.Grouping) -> Code:
+        return self.compile(node.expression)
+
+    def compile_Variable(self, node: ae.VarExpr) -> Code:
+        environment = self.environment
+        name, distance, slot = node.name, node.distance, node.slot
+        if distance == -1:
+            lox_globals = environment.globals
+            slot = self.global_slot(name.lexeme)
+
+            def get_global() -> lt.LoxLiteral:
+                value = lox_globals[slot]
+                if value is env.UNDEFINED:
+                    environment.__missing__(name)
+                return value
+
+            return get_global
+        if distance == env.UPVALUE:
+            return lambda: environment.cells[slot].value
+        if distance == 0:
+            if node.cell:
+                return lambda: environment.frame.slots[slot].value  # type: ignore
+            return lambda: environment.frame.slots[slot]  # type: ignore
+        if distance == 1 and not node.cell:
+            return lambda: environment.frame.parent.slots[slot]  # type: ignore
+        return lambda: environment.index_get(name, distance, slot, node.cell)
+
+    def compile_Assign(self, node: expr.Assign) -> Code:
+        environment = self.environment
+        name, distance, slot = node.name, node.distance, node.slot
+        value_code = self.compile(node.value)
+        if distance == -1:
+            lox_globals = environment.globals
+            slot = self.global_slot(name.lexeme)
+
+            def assign_global() -> lt.LoxLiteral:
+                value = value_code()
+                if lox_globals[slot] is env.UNDEFINED:
+                    environment.__missing__(name)
+                lox_globals[slot] = value
+                return value
+
+            return assign_global
+        if distance == 0 and not node.cell:
+
+            def assign_local() -> lt.LoxLiteral:
+                value = environment.frame.slots[slot] = value_code()  # type: ignore
+                return value
+
+            return assign_local
+        cell = node.cell
+        return lambda: environment.index_assign(
+            name, value_code(), distance, slot, cell
+        )
+
+    def compile_Binary(self, node: expr.Binary) -> Code:
+        operate = lo.BINARY_FUNCTIONS[node.operator.type]
+        left_code = self.compile(node.left)
+        # Comparing with or adding a constant is common enough to be worth
+        # not calling a closure for the constant
+        if isinstance(node.right, expr.Literal):
+            right = node.right.value
+
+            def binary_constant() -> lt.LoxLiteral:
+                left = left_code()
+                try:
+                    return operate(left, right)
+                except (TypeError, ZeroDivisionError):
+                    # Reports the error, or retries the way the tree does
+                    return node.operate(left, right)
+
+            return binary_constant
+        right_code = self.compile(node.right)
+
+        def binary() -> lt.LoxLiteral:
+            left = left_code()
+            right = right_code()
+            try:
+                return operate(left, right)
+            except (TypeError, ZeroDivisionError):
+                return node.operate(left, right)
+
+        return binary
+
+    def compile_Unary(self, node: expr.Unary) -> Code:
+        right_code = self.compile(node.right)
+        operate = lo.UNARY_FUNCTIONS[node.operator.type]
+
+        def unary() -> lt.LoxLiteral:
+            right = right_code()
+            try:
+                return operate(right)
+            except TypeError:
+                return node.operate(right)
+
+        return unary
+
+    def compile_Logical(self, node: expr.Logical) -> Code:
+        left_code, right_code = self.compile(node.left), self.compile(node.right)
+        lox_true = lu.lox_true
+        if node.operator.type is tt.OR:
+
+            def logical_or() -> lt.LoxLiteral:
+                left = left_code()
+                if lox_true(left):
+                    return left
+                return right_code()
+
+            return logical_or
+
+        def logical_and() -> lt.LoxLiteral:
+            left = left_code()
+            if not lox_true(left):
+                return left
+            return right_code()
+
+        return logical_and
+
+    def compile_Call(self, node: expr.Call) -> Code:
+        callee_code = self.compile(node.callee)
+        argument_codes = tuple(self.compile(arg) for arg in node.arguments)
+        count, line, tail = len(argument_codes), node.paren.line, node.tail
+        environment, LoxFunction = self.environment, fn.LoxFunction
+
+        def call() -> lt.LoxLiteral:
+            callee = callee_code()
+            if type(callee) is not LoxFunction and not isinstance(
+                callee, lt.LoxCallable
+            ):
+                message = f"{lu.lox_str(callee, repl=True)} is not callable."
+                raise le.LoxRuntimeError(line, message)
+            arguments = [code() for code in argument_codes]
+            if callee.arity != count:
+                message = f"Expected {callee.arity} arguments but got {count}."
+                raise le.LoxRuntimeError(line, message)
+            if tail and type(callee) is LoxFunction:
+                environment.tail_call = callee, arguments
+                return cf.TAIL_CALL  # type: ignore
+            try:
+                return callee.lox_call(arguments)
+            except le.LoxRuntimeError as lre:
+                if lre.line == "unknown":
+                    lre.line = line
+                lre.call_line = line
+                raise lre
+            except RecursionError:
+                raise le.LoxRuntimeError(line, "Stack overflow.") from None
+
+        return call
+
+    def compile_Get(self, node: expr.Get) -> Code:
+        object_code, name = self.compile(node.object), node.name
+        lexeme = name.lexeme
+
+        def get() -> lt.LoxLiteral:
+            parent = object_code()
+            if isinstance(parent, lc.LoxInstance):
+                # LoxInstance.__getitem__ with the name's lexeme looked up once
+                value = parent.fields.get(lexeme)
+                if value is not None:
+                    return value
+                return parent.lox_class.method_get(name, parent)
+            raise le.LoxRuntimeError(name.line, "Only instances have properties")
+
+        return get
+
+    def compile_Set(self, node: expr.Set) -> Code:
+        object_code, name = self.compile(node.assignee.object), node.assignee.name
+        value_code, lexeme = self.compile(node.value), name.lexeme
+
+        def set_field() -> lt.LoxLiteral:
+            target = object_code()
+            if not isinstance(target, lc.LoxInstance):
+                raise le.LoxRuntimeError(name.line, "Only instances have fields.")
+            value = target.fields[lexeme] = value_code()
+            return value
+
+        return set_field
+
+    def compile_Super(self, node: expr.Super) -> Code:
+        if node.this is None:
+            return self.compile_error(node)
+        super_code, this_code = self.compile_Variable(node), self.compile(node.this)
+        method = node.method
+        return lambda: super_code().method_get(method, this_code())
+
+    def compile_error(self, node: ae.AbstractExec) -> Code:
+        def error() -> tp.NoReturn:
+            raise le.LoxRuntimeError(ignore=True)
+
+        return error
+
+    compile_ErrorExpr = compile_ErrorStmt = compile_error
+
+    # Statements
+
+    def compile_ExprStmt(self, node: stmt.ExprStmt) -> Code:
+        expression_code = self.compile(node.expression)
+
+        def expression() -> None:
+            expression_code()
+
+        return expression
+
+    def compile_PrintStmt(self, node: stmt.PrintStmt) -> Code:
+        expression_code, lox_str = self.compile(node.expression), lu.lox_str
+
+        def print_stmt() -> None:
+            print(lox_str(expression_code()))
+
+        return print_stmt
+
+    def compile_VarStmt(self, node: stmt.VarStmt) -> Code:
+        define = self.define(node.name.lexeme, node.slot)
+        if node.initializer is None:
+            return lambda: define(lt.nil)
+        initializer_code = self.compile(node.initializer)
+        return lambda: define(initializer_code())
+
+    def compile_BraceStmt(self, node: stmt.BraceStmt) -> Code:
+        if not node.new_frame:
+            return self.sequence(node.stmts)
+        with self.frame(node.cells):
+            codes = tuple(self.compile(stmt) for stmt in node.stmts)
+        environment, frame_size, cells = self.environment, node.frame_size, node.cells
+
+        def block() -> tp.Optional[cf.Completion]:
+            enclosing = environment.frame
+            frame = environment.frame = env.Frame(frame_size, enclosing)
+            if cells:
+                frame.make_cells(cells)
+            try:
+                for code in codes:
+                    completion = code()
+                    if completion is not None:
+                        return completion
+            finally:
+                environment.frame = enclosing
+            return None
+
+        return block
+
+    def sequence(self, nodes: tp.Iterable[ae.AbstractExec]) -> Code:
+        codes = tuple(self.compile(node) for node in nodes)
+        if len(codes) == 1:
+            return codes[0]
+
+        def run() -> tp.Optional[cf.Completion]:
+            for code in codes:
+                completion = code()
+                if completion is not None:
+                    return completion
+            return None
+
+        return run
+
+    def compile_LazyBody(self, node: stmt.LazyBody) -> Code:
+        environment, cells = self.environment, self.cells
+        compiled: tp.List[Code] = []
+
+        def lazy_body() -> tp.Optional[cf.Completion]:
+            if not compiled:
+                body = node.force()
+                with self.frame(cells | set(node.cells)):
+                    compiled.append(self.compile(body))
+            # The function's frame was made before its body's locals were known
+            frame = environment.frame
+            slots = frame.slots  # type: ignore
+            if len(slots) < node.frame_size:
+                slots.extend([lt.nil] * (node.frame_size - len(slots)))
+            if node.cells:
+                frame.make_cells(node.cells)  # type: ignore
+            return compiled[0]()
+
+        return lazy_body
+
+    def compile_IfStmt(self, node: stmt.IfStmt) -> Code:
+        condition_code = self.compile(node.condition)
+        then_code = self.compile(node.then_branch)
+        lox_true = lu.lox_true
+        if node.else_branch is None:
+
+            def if_stmt() -> tp.Optional[cf.Completion]:
+                if lox_true(condition_code()):
+                    return then_code()
+                return None
+
+            return if_stmt
+        else_code = self.compile(node.else_branch)
+
+        def if_else() -> tp.Optional[cf.Completion]:
+            if lox_true(condition_code()):
+                return then_code()
+            return else_code()
+
+        return if_else
+
+    def compile_WhileStmt(self, node: stmt.WhileStmt) -> Code:
+        condition_code = self.compile(node.condition)
+        body_code = self.compile(node.body)
+        lox_true, BREAK = lu.lox_true, cf.BREAK
+        if node.increment is None:
+
+            def while_stmt() -> tp.Optional[cf.Completion]:
+                while lox_true(condition_code()):
+                    completion = body_code()
+                    if completion is not None:
+                        if completion is BREAK:
+                            break
+                        return completion
+                return None
+
+            return while_stmt
+        increment_code = self.compile(node.increment)
+
+        def for_stmt() -> tp.Optional[cf.Completion]:
+            while lox_true(condition_code()):
+                completion = body_code()
+                if completion is not None:
+                    if completion is BREAK:
+                        break
+                    return completion
+                increment_code()
+            return None
+
+        return for_stmt
+
+    def compile_NullStmt(self, node: stmt.NullStmt) -> Code:
+        return lambda: None
+
+    def compile_BreakStmt(self, node: stmt.BreakStmt) -> Code:
+        return lambda: cf.BREAK
+
+    def compile_ReturnStmt(self, node: stmt.ReturnStmt) -> Code:
+        value_code, environment = self.compile(node.value), self.environment
+        RETURN, TAIL_CALL = cf.RETURN, cf.TAIL_CALL
+        if getattr(node.value, "tail", False):
+
+            def return_call() -> cf.Completion:
+                value = value_code()
+                if value is TAIL_CALL:
+                    return TAIL_CALL
+                environment.returned = value
+                return RETURN
+
+            return return_call
+
+        def return_stmt() -> cf.Completion:
+            environment.returned = value_code()
+            return RETURN
+
+        return return_stmt
+
+    def compile_function(self, function: fn.LoxFunction) -> fn.LoxFunction:
+        """
+        A copy of the resolved function running its compiled body, which
+        its tier holds from the start
+        """
+        compiled = fn.LoxFunction(
+            function.params,
+            function.body,
+            function.name,
+            function.is_initializer,
+            function.is_property,
+        )
+        compiled.frame_size = function.frame_size
+        compiled.cells = function.cells
+        compiled.upvalues = function.upvalues
+        with self.frame(function.cells):
+            compiled.tier.code = self.compile(function.body)
+        return compiled
+
+    def compile_FunctionStmt(self, node: stmt.FunctionStmt) -> Code:
+        template = self.compile_function(node.function)
+        environment = self.environment
+        define = self.define(template.name, node.slot)
+        return lambda: define(template.with_closure(environment))
+
+    def compile_ClassStmt(self, node: stmt.ClassStmt) -> Code:
+        declared = node.lox_class
+        template = lc.LoxClass(
+            declared.name,
+            None,
+            {name: self.compile_function(m) for name, m in declared.methods.items()},
+            {
+                name: self.compile_function(value)
+                for name, value in declared.static_methods.items()
+            },
+            {name: self.compile_function(g) for name, g in declared.getters.items()},
+        )
+        environment = self.environment
+        define = self.define(template.name, node.slot)
+        if node.super_class_var is None:
+            return lambda: define(template.instantiate(None, environment))
+        super_code = self.compile(node.super_class_var)
+        line = node.super_class_var.name.line
+
+        def class_stmt() -> None:
+            super_class = super_code()
+            if not isinstance(super_class, lc.LoxClass):
+                raise le.LoxRuntimeError(line, "Superclass must be a class")
+            define(template.instantiate(super_class, environment))
+
+        return class_stmt
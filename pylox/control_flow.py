@@ -0,0 +1,24 @@
+"""
+How a statement finished, returned by its evaluate method: None if it ran
+to its end, BREAK or RETURN if a break or return statement in it ran.
+Blocks and ifs pass BREAK and RETURN on, loops stop at BREAK, and a function
+stops at RETURN and takes the value returned from Environment.returned.
+TAIL_CALL is a return of a call to a Lox function, which the function
+returning runs in its place from Environment.tail_call, so calls in tail
+position don't nest (see LoxFunction.lox_call).
+"""
+from __future__ import annotations
+
+import enum
+import typing as tp
+
+
+class Completion(enum.Enum):
+    BREAK = enum.auto()
+    RETURN = enum.auto()
+    TAIL_CALL = enum.auto()
+
+
+BREAK: tp.Final = Completion.BREAK
+RETURN: tp.Final = Completion.RETURN
+TAIL_CALL: tp.Final = Completion.TAIL_CALL
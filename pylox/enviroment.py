@@ -1,18 +1,14 @@
 from __future__ import annotations
 
-import collections
-import contextlib
 import typing as tp
 
 import pylox.lox_errors as le
+import pylox.lox_types as lt
 
 if tp.TYPE_CHECKING:
     import pylox.token_classes as tc
-    import pylox.lox_types as lt
 
     EnvKey = tp.Union[tc.Token, str]
-    EnvMapping = tp.MutableMapping[str, lt.LoxLiteral]
-    EnvDict = tp.Union[tp.Dict[str, lt.LoxLiteral], tp.ChainMap[str, lt.LoxLiteral]]
 
 
 def get_str(key: EnvKey) -> str:
@@ -23,49 +19,172 @@ def get_line(key: tp.Union[EnvKey, int]) -> le.ErrorLine:
     return getattr(key, "line", key if isinstance(key, int) else "unknown")
 
 
-class Environment(collections.ChainMap):
-    # TODO: Consider replacing the list in self.maps with a deque?
-    __slots__ = ("maps",)
-    maps: tp.List[EnvDict]  # type: ignore
-
-    def __contains__(self, key: tp.Any) -> bool:
-        return super().__contains__(get_str(key))
-
-    def __getitem__(self, token: EnvKey) -> lt.LoxLiteral:
-        return super().__getitem__(get_str(token))
-
-    def __setitem__(self, token: EnvKey, value: lt.LoxLiteral) -> None:
-        super().__setitem__(get_str(token), value)
-
-    def __delitem__(self, key: EnvKey) -> None:
-        super().__delitem__(get_str(key))
+class Cell:
+    """
+    A local used by a nested function, shared by its frame and the
+    closures of the functions using it
+    """
+
+    __slots__ = ("value",)
+    value: lt.LoxLiteral
+
+    def __init__(self, value: lt.LoxLiteral) -> None:
+        self.value = value
+
+
+class UpvalueNT(tp.NamedTuple):
+    """
+    Where a closure gets the cell of one of its upvalues when it is made:
+    the slot of a local depth frames up if is_local, otherwise the upvalue
+    in that slot of the function it's made in.
+    """
+
+    is_local: bool
+    depth: int
+    slot: int
+
+
+class Frame:
+    """
+    The locals of one run of a block or function, in the slots the resolver
+    numbered them with. parent is the frame of the enclosing scope in the
+    same function, so a local resolved (depth, slot) away is parent
+    followed depth times.
+    """
+
+    __slots__ = ("slots", "parent")
+    slots: tp.List[tp.Union[lt.LoxLiteral, Cell]]
+    parent: tp.Optional[Frame]
+
+    def __init__(self, size: int, parent: tp.Optional[Frame]) -> None:
+        self.slots = [lt.nil] * size
+        self.parent = parent
+
+    def ancestor(self, depth: int) -> Frame:
+        frame = self
+        for _ in range(depth):
+            frame = frame.parent  # type: ignore
+        return frame
+
+    def make_cells(self, cells: tp.Iterable[int]) -> None:
+        """ Moves the values in the slots into cells """
+        slots = self.slots
+        for slot in cells:
+            slots[slot] = Cell(slots[slot])  # type: ignore
+
+
+# The distance of an upvalue, whose slot is its index in Environment.cells
+UPVALUE: tp.Final = -2
+# The value of a global slot whose name hasn't been defined yet
+UNDEFINED: tp.Final = object()
+# Every global name used in the process, numbered in the order they were
+# resolved. Global variables are read and assigned through these slots.
+global_slots: tp.Dict[str, int] = {}
+
+
+def global_slot(name: str) -> int:
+    """ The slot of the global name, numbering it if it is new """
+    slot = global_slots.get(name)
+    if slot is None:
+        slot = global_slots[name] = len(global_slots)
+    return slot
+
+
+class Environment:
+    """
+    The state of a running program: its globals, in the slots numbered by
+    global_slot, the frame of the innermost scope being run (None at the
+    top level) and the upvalues of the function being run. The builtins are
+    copied into the globals, so defining a global of the same name shadows
+    them without changing them. returned is the value of the last return
+    statement run, which the function it returned from takes, and tail_call
+    the function and arguments of the last call made in tail position.
+    """
+
+    __slots__ = ("globals", "frame", "cells", "returned", "tail_call")
+    globals: tp.List[tp.Any]
+    frame: tp.Optional[Frame]
+    cells: tp.Tuple[Cell, ...]
+    returned: lt.LoxLiteral
+    tail_call: tp.Tuple[tp.Any, tp.Sequence[lt.LoxLiteral]]
+
+    def __init__(self, builtins: tp.Mapping[str, lt.LoxLiteral]) -> None:
+        self.globals = []
+        self.frame = None
+        self.cells = ()
+        self.returned = lt.nil
+        self.tail_call = (None, ())
+        for name, value in builtins.items():
+            self.define(name, value, None)
 
     def __missing__(self, key: EnvKey, message: tp.Optional[str] = None) -> tp.NoReturn:
         if message is None:
             message = f'Undefined variable "{get_str(key)}"'
         raise le.KeyLoxRuntimeError(get_line(key), message)
 
-    @contextlib.contextmanager
-    def scope(self, lox_locals: EnvDict = None) -> tp.Iterator[EnvDict]:
-        if lox_locals is None:
-            lox_locals = {}
-        self.maps.insert(0, lox_locals)
-        try:
-            yield lox_locals
-        finally:
-            del self.maps[0]
-
-    def index_get(self, key: EnvKey, index: int) -> lt.LoxLiteral:
-        try:
-            return self.maps[index][get_str(key)]
-        except KeyError:
-            pass
+    def define(
+        self, name: EnvKey, value: lt.LoxLiteral, slot: tp.Optional[int]
+    ) -> None:
+        """ Defines a local in the current frame, or a global if slot is None """
+        if slot is not None:
+            slots = self.frame.slots  # type: ignore
+            if type(slots[slot]) is Cell:
+                slots[slot].value = value  # type: ignore
+            else:
+                slots[slot] = value
+            return
+        slot = global_slot(get_str(name))
+        lox_globals = self.globals
+        if slot >= len(lox_globals):
+            lox_globals.extend([UNDEFINED] * (slot + 1 - len(lox_globals)))
+        lox_globals[slot] = value
+
+    def index_get(
+        self, key: EnvKey, depth: int, slot: int, cell: bool = False
+    ) -> lt.LoxLiteral:
+        """
+        Gets the local depth frames up, the upvalue if depth is UPVALUE or
+        the global if depth is -1. cell is whether the local is in a cell.
+        """
+        if depth >= 0:
+            value = self.frame.ancestor(depth).slots[slot]  # type: ignore
+            return value.value if cell else value  # type: ignore
+        if depth == UPVALUE:
+            return self.cells[slot].value
+        if slot < len(self.globals):
+            value = self.globals[slot]
+            if value is not UNDEFINED:
+                return value
         return self.__missing__(key)
 
     def index_assign(
-        self, name: EnvKey, value: lt.LoxLiteral, index: int
+        self,
+        name: EnvKey,
+        value: lt.LoxLiteral,
+        depth: int,
+        slot: int,
+        cell: bool = False,
     ) -> lt.LoxLiteral:
-        if get_str(name) in self.maps[index]:
-            self.maps[index][get_str(name)] = value
+        if depth >= 0:
+            slots = self.frame.ancestor(depth).slots  # type: ignore
+            if cell:
+                slots[slot].value = value  # type: ignore
+            else:
+                slots[slot] = value
+            return value
+        if depth == UPVALUE:
+            self.cells[slot].value = value
+            return value
+        if slot < len(self.globals) and self.globals[slot] is not UNDEFINED:
+            self.globals[slot] = value
             return value
         return self.__missing__(name)
+
+    def capture(self, upvalues: tp.Iterable[UpvalueNT]) -> tp.Tuple[Cell, ...]:
+        """ The cells of the upvalues of a function made in the current scope """
+        return tuple(
+            self.frame.ancestor(depth).slots[index]  # type: ignore
+            if is_local
+            else self.cells[index]
+            for is_local, depth, index in upvalues
+        )
@@ -54,11 +54,14 @@ def lox_keyboard_interrupt(
 
 
 ReturnCallable = tp.Callable[..., results.ReturnList]
+# A function decorated by lox_error_handling also takes the ReturnList or
+# ErrorReturns of a failed earlier step, which it returns as a ReturnList
+ErrorHandling = tp.Callable[[Callable], tp.Callable[..., tp.Any]]
 
 
 def lox_error_handling(
     error_type: le.ErrorReturns, line: tp.Optional[int] = None
-) -> ReturnListCallable:
+) -> ErrorHandling:
     # TODO: Fix type: ignore
     return lox_keyboard_interrupt(error_type, line)(propogate_lox_error)  # type: ignore
 
@@ -1,38 +1,174 @@
 from __future__ import annotations
 
 import typing as tp
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import pylox.abstract_execs as ae
+import pylox.control_flow as cf
+import pylox.enviroment as env
+import pylox.functions as fn
 import pylox.lox_class as lc
 import pylox.lox_errors as le
 import pylox.lox_eval as lev
 import pylox.lox_types as lt
 import pylox.lox_utils as lu
-import pylox.misc_utils as mu
+import pylox.token_classes as tc
 from pylox.token_classes import TokenType as tt
 
 if tp.TYPE_CHECKING:
     from pylox import stmt
-    import pylox.token_classes as tc
     import pylox.resolver as rs
 
 
+# Set by the command line options (see lox.main). Whether operator nodes
+# specialize themselves to the types of their operands
+quicken = True
+
+
 class Binary(ae.BinaryExpr):
+    """
+    Rewrites itself when first evaluated into the variant of its operator
+    for the operand types, e.g. NumberAdd for two numbers. The variants
+    check the types, and rewrite themselves into GenericBinary once they're
+    different.
+    """
+
+    kind = "Binary"  # type: ignore
+
     def evaluate(self) -> lt.LoxLiteral:
-        lox_type = self.operator.type
-        left = self.left.evaluate()
-        right = self.right.evaluate()
-        try:
-            return lev.evaluate_lox_binary(lox_type, left, right)
-        except TypeError:
-            message = (
-                f'Infix Operator "{self.operator.lexeme}" is not supported for the'
-                f' types "{lu.lox_type(left)}" and "{lu.lox_type(right)}"'
-            )
-        except ZeroDivisionError:
-            message = "Division by zero"
-        raise le.LoxRuntimeError(self.operator.line, message)
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if quicken:
+            self.rewrite(binary_variant(self.operator.type, left, right))
+        else:
+            self.rewrite(GenericBinary)
+        return self.operate(left, right)
+
+    def operate(self, left: lt.LoxLiteral, right: lt.LoxLiteral) -> lt.LoxLiteral:
+        """ Applies the operator to the evaluated operands """
+        return lev.operate_binary(self.operator, left, right)
+
+    def rewrite(self, variant: tp.Type[ae.Expr]) -> None:
+        object.__setattr__(self, "__class__", variant)
+
+    def generalize(self, left: lt.LoxLiteral, right: lt.LoxLiteral) -> lt.LoxLiteral:
+        """ Applies the operator after the types checked were different """
+        self.rewrite(GenericBinary)
+        return self.operate(left, right)
+
+
+class GenericBinary(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        return self.operate(self.left.evaluate(), self.right.evaluate())
+
+
+class NumberAdd(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left + right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberSubtract(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left - right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberMultiply(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left * right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberDivide(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        # Division by zero is reported by the generic path
+        if type(left) is float and type(right) is float and right:
+            return left / right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberLess(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left < right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberLessEqual(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left <= right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberGreater(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left > right  # type: ignore
+        return self.generalize(left, right)
+
+
+class NumberGreaterEqual(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is float and type(right) is float:
+            return left >= right  # type: ignore
+        return self.generalize(left, right)
+
+
+class StringAdd(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if type(left) is str and type(right) is str:
+            return left + right  # type: ignore
+        return self.generalize(left, right)
+
+
+# Equality never fails, so its variants check no types
+class Equal(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        return self.left.evaluate() == self.right.evaluate()
+
+
+class NotEqual(Binary):
+    def evaluate(self) -> lt.LoxLiteral:
+        return self.left.evaluate() != self.right.evaluate()
+
+
+# The variants of Binary by operator and the type of both operands, None
+# for any operands
+BINARY_VARIANTS: tp.Final[tp.Dict[tp.Tuple[tt, tp.Optional[type]], tp.Type[Binary]]] = {
+    (tt.PLUS, float): NumberAdd,
+    (tt.MINUS, float): NumberSubtract,
+    (tt.STAR, float): NumberMultiply,
+    (tt.SLASH, float): NumberDivide,
+    (tt.LESS, float): NumberLess,
+    (tt.LESS_EQUAL, float): NumberLessEqual,
+    (tt.GREATER, float): NumberGreater,
+    (tt.GREATER_EQUAL, float): NumberGreaterEqual,
+    (tt.PLUS, str): StringAdd,
+    (tt.EQUAL_EQUAL, None): Equal,
+    (tt.BANG_EQUAL, None): NotEqual,
+}
+
+
+def binary_variant(
+    operator: tt, left: lt.LoxLiteral, right: lt.LoxLiteral
+) -> tp.Type[Binary]:
+    variant = BINARY_VARIANTS.get((operator, None))
+    if variant is None and type(left) is type(right):
+        variant = BINARY_VARIANTS.get((operator, type(left)))
+    return variant or GenericBinary
 
 
 class Grouping(ae.ExprExecMixin, ae.Expr):
@@ -56,8 +192,11 @@ class Literal(ae.Expr):
 
 @dataclass(frozen=True)
 class Unary(ae.Expr):
+    """ Specializes itself like Binary """
+
     operator: tc.Token
     right: ae.Expr
+    kind = "Unary"  # type: ignore
 
     def __str__(self) -> str:
         return ae.parenthesize_expr(self.operator.lexeme, self.right)
@@ -68,14 +207,40 @@ class Unary(ae.Expr):
 
     def evaluate(self) -> lt.LoxLiteral:
         right = self.right.evaluate()
-        try:
-            return lev.evaluate_lox_unary(self.operator.type, right)
-        except TypeError as exc:
-            message = (
-                f"Unary Operator {self.operator.lexeme} is not"
-                f' supported for the type "{lu.lox_type(right)}"'
-            )
-            raise le.LoxRuntimeError(self.operator.line, message) from exc
+        variant = UNARY_VARIANTS.get((self.operator.type, None))
+        if variant is None:
+            variant = UNARY_VARIANTS.get((self.operator.type, type(right)))
+        object.__setattr__(self, "__class__", (quicken and variant) or GenericUnary)
+        return self.operate(right)
+
+    def operate(self, right: lt.LoxLiteral) -> lt.LoxLiteral:
+        """ Applies the operator to the evaluated operand """
+        return lev.operate_unary(self.operator, right)
+
+
+class GenericUnary(Unary):
+    def evaluate(self) -> lt.LoxLiteral:
+        return self.operate(self.right.evaluate())
+
+
+class NumberNegate(Unary):
+    def evaluate(self) -> lt.LoxLiteral:
+        right = self.right.evaluate()
+        if type(right) is float:
+            return -right  # type: ignore
+        object.__setattr__(self, "__class__", GenericUnary)
+        return self.operate(right)
+
+
+class Not(Unary):
+    def evaluate(self) -> lt.LoxLiteral:
+        return not lu.lox_true(self.right.evaluate())
+
+
+UNARY_VARIANTS: tp.Final[tp.Dict[tp.Tuple[tt, tp.Optional[type]], tp.Type[Unary]]] = {
+    (tt.MINUS, float): NumberNegate,
+    (tt.BANG, None): Not,
+}
 
 
 class Variable(ae.VarExpr):
@@ -83,13 +248,23 @@ class Variable(ae.VarExpr):
         return self.name.lexeme
 
     def evaluate(self) -> lt.LoxLiteral:
-        return self.environment.index_get(self.name, self.distance)
-
-    def resolve(self, scopes: rs.ResolverStack) -> None:
-        if mu.get(scopes.stack, -1, {}).get(self.name.lexeme) is False:
+        distance = self.distance
+        if distance == 0 and not self.cell:
+            return self.environment.frame.slots[self.slot]  # type: ignore
+        if distance == -1:
+            lox_globals = self.environment.globals
+            if self.slot < len(lox_globals):
+                value = lox_globals[self.slot]
+                if value is not env.UNDEFINED:
+                    return value
+        return self.environment.index_get(self.name, distance, self.slot, self.cell)
+
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        if scopes.stack and self.name.lexeme in scopes.stack[-1].pending:
             message = "Cannot read local variable in its own initializer."
             scopes.error(self.name.line, message)
         self.resolve_local(scopes)
+        return None
 
 
 @dataclass
@@ -101,15 +276,15 @@ class Assign(ae.VarExpr):
 
     def evaluate(self) -> lt.LoxLiteral:
         return self.environment.index_assign(
-            self.name, self.value.evaluate(), self.distance
+            self.name, self.value.evaluate(), self.distance, self.slot, self.cell
         )
 
     @property
     def execs(self) -> tp.Tuple[ae.Expr]:
         return (self.value,)
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
-        self.value.resolve(scopes)
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        yield self.value
         self.resolve_local(scopes)
 
 
@@ -134,6 +309,8 @@ class Call(ae.Expr):
     callee: ae.Expr
     paren: tc.Token
     arguments: tp.Sequence[ae.Expr]
+    # Whether the call is the value of a return statement, set by the resolver
+    tail: bool = field(init=False, default=False, compare=False)
 
     def evaluate(self) -> lt.LoxLiteral:
         callee = self.callee.evaluate()
@@ -144,12 +321,20 @@ class Call(ae.Expr):
         if callee.arity != len(arguments):
             message = f"Expected {callee.arity} arguments but got {len(arguments)}."
             raise le.LoxRuntimeError(self.paren.line, message)
+        if self.tail and type(callee) is fn.LoxFunction:
+            # Made by the function returning instead (see control_flow)
+            self.environment.tail_call = callee, arguments
+            return cf.TAIL_CALL  # type: ignore
         try:
             return callee.lox_call(arguments)
         except le.LoxRuntimeError as lre:
             if lre.line == "unknown":
                 lre.line = self.paren.line
+            lre.call_line = self.paren.line
             raise lre
+        except RecursionError:
+            # The calls nest Python frames, of which there can only be so many
+            raise le.LoxRuntimeError(self.paren.line, "Stack overflow.") from None
 
     def __str__(self) -> str:
         return ae.parenthesize_expr(str(self.callee), *self.arguments)
@@ -209,22 +394,32 @@ class Set(ae.Expr):
 class Super(ae.VarExpr):
     method: tc.Token
     lox_class: tp.Optional[stmt.ClassStmt] = None
+    # The instance the method is bound to
+    this: tp.Optional[Variable] = field(init=False, default=None)
 
     def __str__(self):
         return f"{{{self.lox_class}}} super.{self.method.lexeme}"
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        # The class isn't resolved again through execs
         if scopes.lox_class is None:
             scopes.error(self.name, "Super used outside of a class")
-        elif scopes.lox_class.super_class is None:
+        elif scopes.lox_class.super_class_var is None:
             scopes.error(self.name, "Super used in a class without a superclass")
         else:
             self.lox_class = scopes.lox_class
+            self.resolve_local(scopes)
+            self.this = Variable(tc.Token(tt.IDENTIFIER, "this", None, self.name.line))
+            self.this.resolve_local(scopes)
+        return None
 
     def evaluate(self) -> lt.LoxLiteral:
-        if self.lox_class is None or self.lox_class.super_class is None:
+        if self.this is None:
             raise le.LoxRuntimeError(self.name.line, "Super used without a superclass")
-        return self.lox_class.super_class.method_get(self.method)
+        super_class = self.environment.index_get(
+            self.name, self.distance, self.slot, self.cell
+        )
+        return super_class.method_get(self.method, self.this.evaluate())  # type: ignore
 
     @property
     def execs(self) -> tp.Union[tp.Tuple[stmt.ClassStmt], tp.Tuple[()]]:
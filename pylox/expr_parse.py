@@ -10,6 +10,7 @@ import pylox.lox_errors as le
 import pylox.lox_ops as lo
 import pylox.lox_utils as lu
 import pylox.misc_utils as mu
+import pylox.pratt_parse as pp
 import pylox.token_classes as tc
 import pylox.token_utils as tu
 from pylox import expr
@@ -68,37 +69,47 @@ def function_def_args(
         yield None
 
 
-def function_call_args(tokens: tp.Iterable[tc.Token],) -> tp.Iterator[ae.Expr]:
-    return (
-        expression(tuple(arg)) for arg in tu.specified_token_split(tokens, tt.COMMA)
-    )
-
-
-CallIncrements: tp.Dict[tt, int] = {tt.DOT: 3, tt.RIGHT_PAREN: 2, tt.LEFT_PAREN: 1}
+def function_call_args(tokens: tc.TokenSeq) -> tp.Iterator[ae.Expr]:
+    """ Parses the arguments, splitting at the commas outside any parentheses """
+    start, level = 0, 0
+    for i, token in enumerate(tokens):
+        if token.type is tt.LEFT_PAREN:
+            level += 1
+        elif token.type is tt.RIGHT_PAREN:
+            level -= 1
+        elif token.type is tt.COMMA and level == 0:
+            yield expression(tuple(tokens[start:i]))
+            start = i + 1
+    if start < len(tokens):
+        yield expression(tuple(tokens[start:]))
 
 
 def call(tokens: tc.TokenSeq) -> ae.Expr:
-    last_paren = next(tu.token_find_index(tokens, {tt.LEFT_PAREN, tt.DOT}), len(tokens))
-    if last_paren == 0:
+    position = next(tu.token_find_index(tokens, {tt.LEFT_PAREN, tt.DOT}), len(tokens))
+    if position == 0 or position == len(tokens):
         return primary(tokens)
-    if tokens[last_paren - 1].type is tt.SUPER:
-        lox_function = primary(tokens[: last_paren + 2])
-    else:
-        lox_function = primary(tokens[:last_paren])
-    for paren_index in tu.token_find_index(tokens, {tt.RIGHT_PAREN, tt.DOT}):
-        if tokens[paren_index].type is tt.RIGHT_PAREN:
-            args = tuple(
-                function_call_args(
-                    tokens[
-                        last_paren
-                        + CallIncrements[tokens[last_paren].type] : paren_index
-                    ],
-                )
-            )
-            lox_function = expr.Call(lox_function, tokens[paren_index], args)
-        elif tokens[paren_index - 1].type is not tt.SUPER:
-            lox_function = expr.Get(lox_function, tokens[paren_index + 1])
-        last_paren = paren_index
+    if tokens[position - 1].type is tt.SUPER:
+        position += 2
+    lox_function = primary(tokens[:position])
+    # Calls and property accesses are applied left to right, skipping over
+    # the parentheses nested in the arguments
+    while position < len(tokens):
+        if tokens[position].type is tt.DOT:
+            lox_function = expr.Get(lox_function, tokens[position + 1])
+            position += 2
+            continue
+        start, level = position, 0
+        for position in range(start, len(tokens)):
+            token_type = tokens[position].type
+            if token_type is tt.LEFT_PAREN:
+                level += 1
+            elif token_type is tt.RIGHT_PAREN:
+                level -= 1
+                if level == 0:
+                    break
+        args = tuple(function_call_args(tokens[start + 1 : position]))
+        lox_function = expr.Call(lox_function, tokens[position], args)
+        position += 1
     return lox_function
 
 
@@ -136,7 +147,7 @@ def binary_expr(
                 operator = tokens[0]
             except IndexError:
                 return expr.ErrorExpr()
-            if operator.type in types:
+            if operator.type in types and operator.type not in lo.UNARY_FUNCTIONS:
                 error(operator.line, f"{operator} is not allowed as a prefix")
             return next_func(tokens)
         current_expr = next_func(tokens[:index])
@@ -179,7 +190,20 @@ comparison = binary_expr(
 equality = binary_expr({tt.BANG_EQUAL, tt.EQUAL_EQUAL}, comparison)
 logic_and = binary_expr({tt.AND}, equality, expr.Logical)
 logic_or = binary_expr({tt.OR}, logic_and, expr.Logical)
-expression = assignment
+
+EXPRESSION_PARSERS: tp.Dict[str, BinaryExprFunc] = {
+    "recursive": assignment,
+    "pratt": pp.expression,
+}
+# The key of the parser in EXPRESSION_PARSERS used by expression()
+parser = "recursive"
+
+
+def expression(tokens: tc.TokenSeq) -> ae.Expr:
+    if isinstance(tokens, tu.TokenSpan):
+        # Expressions are short and sliced often, where tuples are fastest
+        tokens = tokens.tuple()
+    return EXPRESSION_PARSERS[parser](tokens)
 
 
 def conditional(tokens: tc.TokenSeq) -> ae.Expr:
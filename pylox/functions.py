@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-import collections
+import copy
 import dataclasses
 import enum
 import typing as tp
 import itertools
-import pylox.control_exc as ce
+import pylox.control_flow as cf
+import pylox.enviroment as env
+import pylox.lox_errors as le
 import pylox.lox_types as lt
+import pylox.tiers as ti
 
 if tp.TYPE_CHECKING:
     import pylox.abstract_execs as ae
-    import pylox.enviroment as env
     import pylox.token_classes as tc
     import pylox.resolver as rs
 
@@ -29,32 +31,88 @@ class LoxFunction(lt.LoxCallable):
     name: str
     is_initializer: bool = False
     is_property: bool = False
-    closure: env.EnvMapping = dataclasses.field(init=False, default_factory=dict)
+    # The cells of the upvalues, only the enclosing locals the function uses
+    closure: tp.Tuple[env.Cell, ...] = dataclasses.field(init=False, default=())
+    # Values put in the slots after the parameters, "this" and "super" for
+    # methods
+    bound: tp.Tuple[lt.LoxLiteral, ...] = dataclasses.field(init=False, default=())
+    # The number of locals in the function's frame, including the parameters,
+    # the slots of the ones nested functions use and where the closure's
+    # cells come from
+    frame_size: int = dataclasses.field(init=False, default=0)
+    cells: tp.Tuple[int, ...] = dataclasses.field(init=False, default=())
+    upvalues: tp.Tuple[env.UpvalueNT, ...] = dataclasses.field(init=False, default=())
+    # The calls counted and the compiled body once the function is hot
+    tier: ti.Tier = dataclasses.field(
+        init=False, default_factory=ti.Tier, compare=False, repr=False
+    )
 
-    @ce.function_break
     def lox_call(self, arguments: tp.Sequence[lt.LoxLiteral]) -> lt.LoxLiteral:
         assert len(arguments) == self.arity, "Wrong number of arguments passed"
-        arg_dict = {name.lexeme: arg for name, arg in zip(self.params, arguments)}
-        with self.body.environment.scope(collections.ChainMap(arg_dict, self.closure)):
+        environment = self.body.environment
+        enclosing = environment.frame, environment.cells
+        function = self
+        while True:
+            tier = function.tier
+            if tier.code is None:
+                tier.count += 1
+                if tier.count == ti.call_threshold:
+                    ti.tier_up_function(function)
+            frame = env.Frame(function.frame_size, None)
+            slots = frame.slots
+            slots[: len(arguments)] = arguments
+            if function.bound:
+                start = len(arguments)
+                slots[start : start + len(function.bound)] = function.bound
+            if function.cells:
+                frame.make_cells(function.cells)
+            environment.frame, environment.cells = frame, function.closure
             try:
-                self.body.evaluate()
-            except ce.LoxReturnError:
-                if not self.is_initializer:
-                    raise
-                return self.body.environment.index_get("this", 0)
+                completion = (tier.code or function.body.evaluate)()
+            except le.LoxRuntimeError as lre:
+                lre.unwind(function.name)
+                raise
+            finally:
+                environment.frame, environment.cells = enclosing
+            if completion is not cf.TAIL_CALL:
+                break
+            # Runs the call the function returned in place of this one, so
+            # the Python stack doesn't grow
+            function, arguments = environment.tail_call
+        if function.is_initializer:
+            return function.bound[0]
+        if completion is cf.RETURN:
+            return environment.returned
         return lt.nil
 
+    def with_closure(self, environment: env.Environment) -> LoxFunction:
+        """ A copy of the declared function capturing its upvalues """
+        function = copy.copy(self)
+        if self.upvalues:
+            function.closure = environment.capture(self.upvalues)
+        return function
+
+    def bind(self, *bound: lt.LoxLiteral) -> LoxFunction:
+        """ A copy of the function with "this" (and "super") bound """
+        function = copy.copy(self)
+        function.bound = bound
+        return function
+
     def __str__(self) -> str:
         params = ", ".join(x.lexeme for x in self.params)
         return f"<fn {self.name}({params})>"
 
-    def resolve(
+    def resolve_steps(
         self, scopes: rs.ResolverStack, func_type: FunctionType, *params: env.EnvKey
-    ) -> None:
-        with scopes.function(func_type), scopes.scope():
+    ) -> tp.Iterator[ae.AbstractExec]:
+        """ Resolves the function, yielding its body (see AbstractExec.resolve_step) """
+        with scopes.function(func_type) as function, scopes.scope() as scope:
             for param in itertools.chain(self.params, params):
                 scopes.define(param)
-            self.body.resolve(scopes)
+            yield self.body
+            self.frame_size = len(scope)
+            self.cells = scope.close()
+            self.upvalues = tuple(function.upvalues)
 
     @property
     def arity(self) -> int:
@@ -9,14 +9,65 @@ from pylox import results
 if tp.TYPE_CHECKING:
     import pylox.abstract_execs as ae
 
+    class Runnable(tp.Protocol):
+        def interpret(self) -> results.ResultNT:
+            ...
+
+    Engine = tp.Callable[[tp.Iterable[ae.AbstractExec]], tp.Iterable[Runnable]]
+
+
+# The compiling engines are imported when they're first used, so running
+# with one doesn't load the others
+
+
+def compile_closures(ast: tp.Iterable[ae.AbstractExec]) -> tp.Iterable[Runnable]:
+    """ Compiles each node to a Python closure first (see closure_compiler) """
+    import pylox.closure_compiler as cc
+
+    return cc.compile_tree(ast)
+
+
+def compile_bytecode(ast: tp.Iterable[ae.AbstractExec]) -> tp.Iterable[Runnable]:
+    """ Compiles each function to bytecode run by a virtual machine (see pylox.vm) """
+    import pylox.vm.compiler as vc
+
+    return vc.compile_tree(ast)
+
+
+def translate(ast: tp.Iterable[ae.AbstractExec]) -> tp.Iterable[Runnable]:
+    """
+    Translates each function to Python source compiled by CPython (see
+    pylox.transpiler)
+    """
+    import pylox.transpiler.generator as tg
+
+    return tg.compile_tree(ast)
+
+
+# The ways of running a tree, each returning the statements to run
+ENGINES: tp.Dict[str, Engine] = {
+    # Evaluates the nodes of the tree themselves
+    "tree": lambda ast: ast,
+    "closure": compile_closures,
+    "vm": compile_bytecode,
+    "python": translate,
+}
+# Set by the command line options (see lox.main)
+engine = "tree"
+
 
 @ed.lox_error_handling(le.ErrorReturns.RUNTIME_ERROR)
 def interpret(ast: tp.Iterable[ae.AbstractExec]) -> results.ReturnList:
     results_list = results.ReturnList()
-    for node in ast:
-        result = node.interpret()
-        if result.status.error():
-            results_list.status = result.status
-            return results_list
-        results_list.append(result)
+    try:
+        for node in ENGINES[engine](ast):
+            result = node.interpret()
+            if result.status.error():
+                results_list.status = result.status
+                return results_list
+            results_list.append(result)
+    except le.LoxRuntimeError as lre:
+        # Raised by the engine when a statement can't be compiled
+        lre.error()
+        results_list.status = le.ErrorReturns.RUNTIME_ERROR
     return results_list
@@ -1,17 +1,57 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
+import os
 import sys
 import typing as tp
 
+import pylox.ast_cache as ac
 import pylox.error_dec as ed
+import pylox.expr_parse as ep
 import pylox.lox_errors as le
-from pylox import interpreter, lparser, resolver, results, scanner
+import pylox.parallel_parse as pp
+import pylox.stmt_parse as sp
+import pylox.tiers as ti
+import pylox.token_classes as tc
+from pylox import expr, interpreter, lparser, resolver, results, scanner
+
+
+def scan(source: str) -> tp.Union[tc.TokenSeq, le.ErrorReturns]:
+    """
+    Scans the source into Token objects, or with --lazy into a TokenBuffer.
+    The buffer only creates the tokens which are parsed, which is quicker
+    when the bodies of functions are skipped, but slower when every token is.
+    """
+    return scanner.scan_buffer(source) if sp.lazy else scanner.scan(source)
+
+
+@ed.lox_keyboard_interrupt(le.ErrorReturns.RUNTIME_ERROR, 1)
+def run(source: str, path: tp.Optional[str] = None) -> results.ReturnList:
+    """
+    Runs the source. If the path of the source file is given, its resolved
+    tree is loaded from and saved to the AST cache (see ast_cache).
+    """
+    if path is None:
+        return interpreter.interpret(resolver.resolve(lparser.parse(scan(source))))
+    digest = ac.source_hash(source)
+    tree = ac.load(path, digest)
+    if tree is None:
+        tree = resolver.resolve(lparser.parse(scan(source)))
+        # Trees with unparsed function bodies aren't worth caching
+        failed = isinstance(tree, (le.ErrorReturns, results.ReturnList))
+        if not failed and not sp.lazy:
+            ac.dump(path, digest, tree)
+    return interpreter.interpret(tree)
 
 
 @ed.lox_keyboard_interrupt(le.ErrorReturns.RUNTIME_ERROR, 1)
-def run(source: str) -> results.ReturnList:
-    return interpreter.interpret(resolver.resolve(lparser.parse(scanner.scan(source))))
+def run_stream(tokens: scanner.TokenStream) -> results.ReturnList:
+    """ Same as run() except the tokens are scanned while they are parsed """
+    tree = lparser.parse(tokens)
+    if tokens.errored:
+        return results.ReturnList(status=le.ErrorReturns.SCAN_ERROR)
+    return interpreter.interpret(resolver.resolve(tree))
 
 
 def repl() -> None:
@@ -35,25 +75,197 @@ def repl() -> None:
     print()
 
 
-def runfile(path: str) -> results.ReturnList:
-    """ Same as run() except a file path is provided """
+def runfile(path: str, stream: bool = False) -> results.ReturnList:
+    """
+    Same as run() except a file path is provided. If stream is True, the file
+    is memory mapped and scanned lazily instead of being read into memory,
+    bypassing the AST cache.
+    """
     try:
+        if stream:
+            with open(path, "rb") as binary:
+                chunks = scanner.mapped_chunks(binary)
+                return run_stream(scanner.TokenStream(chunks))
         with open(path) as file:
             program = file.read()
     except FileNotFoundError:
         print("File not found")
         return results.ReturnList(status=le.ErrorReturns.FILE_ERROR)
-    return run(program)
+    return run(program, path)
+
+
+def arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="pylox", description="An interpreter for the Lox programming language."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        metavar="file_path",
+        help="the file to run, or with --check the files and directories to "
+        "check. Runs the REPL if omitted",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only scan, parse and resolve the files, in --jobs processes. "
+        "Files which pass are only cached with --cache-dir",
+    )
+    parser.add_argument(
+        "--lsp",
+        action="store_true",
+        help="run a language server over stdin and stdout, publishing diagnostics",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="memory map the file and scan it while it is parsed",
+    )
+    parser.add_argument(
+        "--expr-parser",
+        choices=tuple(ep.EXPRESSION_PARSERS),
+        default=ep.parser,
+        help="the expression parser to use (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=tuple(interpreter.ENGINES),
+        default=interpreter.engine,
+        help="how the resolved tree is run: evaluated node by node, compiled "
+        "to Python closures first, compiled to bytecode for a virtual machine, "
+        "or translated to Python source (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--disassemble",
+        action="store_true",
+        help="with --engine=vm, print the bytecode of each function to stderr "
+        "when it is compiled",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        metavar="N",
+        help="with --engine=vm, the deepest calls can nest before a stack "
+        "overflow (default: 65536). The other engines run calls on Python's "
+        "stack, so they overflow at its recursion limit",
+    )
+    parser.add_argument(
+        "--no-quicken",
+        action="store_false",
+        dest="quicken",
+        help="with --engine=tree, don't specialize operators to the types of "
+        "their operands",
+    )
+    parser.add_argument(
+        "--call-threshold",
+        type=int,
+        default=ti.call_threshold,
+        metavar="N",
+        help="with --engine=tree, compile a function to closures once it has been "
+        "called N times, 0 to never compile it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--loop-threshold",
+        type=int,
+        default=ti.loop_threshold,
+        metavar="N",
+        help="with --engine=tree, compile a loop to closures once it has gone "
+        "round N times, 0 to never compile it (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--tier-stats",
+        action="store_true",
+        help="print the functions and loops compiled by --engine=tree to stderr "
+        "before exiting",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="parse top-level statements in N processes, or check N files at "
+        "once, 0 for one per CPU (default: 1, or one per CPU with --check)",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="parse and resolve function bodies when they are first called",
+    )
+    parser.add_argument(
+        "--full-check",
+        action="store_true",
+        help="with --lazy, still parse and resolve every function body before "
+        "running to report their errors",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_false",
+        dest="cache",
+        help=f"don't read or write the {ac.SUFFIX} AST cache",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="delete the AST cache of the file's directory before running",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help=f"keep AST caches under DIR instead of in {ac.CACHE_DIR_NAME} "
+        "directories next to the sources",
+    )
+    return parser
 
 
 def main(args: tp.Sequence[str]) -> int:
-    if len(args) > 2:
-        print("Usage: pylox [file_path]")
-        return 64
-    if len(args) == 2:
-        return runfile(args[1]).status.value.code
-    repl()
-    return 0
+    parser = arg_parser()
+    try:
+        options = parser.parse_args(args[1:])
+        if len(options.paths) > 1 and not options.check:
+            parser.error("only one file can be run without --check")
+        if options.max_depth is not None and options.engine != "vm":
+            parser.error("--max-depth only applies to --engine=vm")
+    except SystemExit as exc:
+        return 64 if exc.code else 0
+    ep.parser = options.expr_parser
+    interpreter.engine = options.engine
+    if options.engine == "vm":
+        import pylox.vm.compiler as vc
+        import pylox.vm.machine as vm
+
+        vc.disassemble = options.disassemble
+        if options.max_depth is not None:
+            vm.max_depth = options.max_depth
+    expr.quicken = options.quicken
+    ti.call_threshold = options.call_threshold
+    ti.loop_threshold = options.loop_threshold
+    sp.lazy = options.lazy
+    sp.full_check = options.full_check
+    if options.jobs is not None:
+        pp.jobs = options.jobs or os.cpu_count() or 1
+    ac.enabled = options.cache
+    ac.prefix = options.cache_dir
+    file_path = options.paths[0] if options.paths else None
+    if options.clear_cache:
+        ac.clear(file_path)
+        if file_path is None:
+            return 0
+    if options.lsp:
+        from pylox import lsp_server
+
+        return lsp_server.serve()
+    if options.check:
+        from pylox import checker
+
+        return checker.check(options.paths, options.jobs).value.code
+    if file_path is not None:
+        code = runfile(file_path, options.stream).status.value.code
+    else:
+        repl()
+        code = 0
+    if options.tier_stats:
+        print(ti.report(), end="", file=sys.stderr)
+    return code
 
 
 def cli() -> tp.NoReturn:
@@ -3,9 +3,9 @@ from __future__ import annotations
 import dataclasses
 import inspect
 import time
+import types
 import typing as tp
 
-import pylox.control_exc as ce
 import pylox.lox_errors as le
 import pylox.lox_types as lt
 import pylox.misc_utils as mu
@@ -22,7 +22,6 @@ class LoxNativeFunction(lt.LoxCallable):
     function: tp.Callable  # Should be tp.Callable[<*args: lt.LoxLiteral>, lt.LoxLiter]
     name: str
 
-    @ce.function_break
     def lox_call(self, arguments: tp.Sequence[lt.LoxLiteral]) -> lt.LoxLiteral:
         return self.function(*arguments)
 
@@ -34,12 +33,14 @@ class LoxNativeFunction(lt.LoxCallable):
         return len(inspect.signature(self.function).parameters)
 
 
-BUILTINS: tp.Dict[str, LoxNativeFunction] = {}
+_builtins: tp.Dict[str, LoxNativeFunction] = {}
+# Copied into the globals of each environment, never changed by programs
+BUILTINS: tp.Mapping[str, LoxNativeFunction] = types.MappingProxyType(_builtins)
 
 
 def lox_native_function(wrapped: TC) -> TC:
     lox_name = mu.removeprefix(wrapped.__name__, "lox_")
-    BUILTINS[lox_name] = LoxNativeFunction(wrapped, lox_name)
+    _builtins[lox_name] = LoxNativeFunction(wrapped, lox_name)
     return wrapped
 
 
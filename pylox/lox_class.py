@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import collections
 import dataclasses
 import typing as tp
 import enum
@@ -8,11 +7,11 @@ import pylox.enviroment as env
 import pylox.functions as fn
 import pylox.lox_errors as le
 import pylox.lox_types as lt
-import pylox.misc_utils as mu
 import itertools
 
 if tp.TYPE_CHECKING:
     from pylox import stmt
+    import pylox.abstract_execs as ae
     import pylox.resolver as rs
 
 
@@ -25,20 +24,19 @@ class LoxInstance:
     )
 
     def __post_init__(self, arguments: tp.Sequence[lt.LoxLiteral]) -> None:
-        try:
-            function = self.lox_class.method_get("init")
-        except KeyError:
-            pass
-        else:
+        function = self.lox_class.find_method("init", self)
+        if function is not None:
             function.lox_call(arguments)
 
     def __str__(self) -> str:
         return f"{self.lox_class.name} instance"
 
     def __getitem__(self, name: env.EnvKey) -> lt.LoxLiteral:
-        return mu.exc_chain(
-            KeyError, (self.property_get, self.lox_class.method_get), name
-        )
+        """ Looks the name up in the fields, then the methods and getters """
+        value = self.fields.get(env.get_str(name))
+        if value is not None:
+            return value
+        return self.lox_class.method_get(name, self)
 
     def __setitem__(self, key: env.EnvKey, value: lt.LoxLiteral) -> None:
         self.fields[env.get_str(key)] = value
@@ -46,18 +44,6 @@ class LoxInstance:
     def __delitem__(self, key: env.EnvKey) -> None:
         del self.fields[env.get_str(key)]
 
-    def property_get(self, name: env.EnvKey) -> lt.LoxLiteral:
-        str_name = env.get_str(name)
-        value = self.fields.get(str_name)
-        if value is None:
-            raise le.KeyLoxRuntimeError(
-                env.get_line(name), f'Undefined property, "{name}".'
-            )
-        if isinstance(value, fn.LoxFunction) and value.is_property:
-            value.closure = collections.ChainMap({"this": self}, value.closure)
-            return value.lox_call(())
-        return value
-
 
 @dataclasses.dataclass
 class LoxClass(lt.LoxCallable, LoxInstance):
@@ -87,8 +73,11 @@ class LoxClass(lt.LoxCallable, LoxInstance):
 
     @property
     def arity(self) -> int:
-        if "init" in self.methods:
-            return self.methods["init"].arity
+        lox_class: tp.Optional[LoxClass] = self
+        while lox_class is not None:
+            if "init" in lox_class.methods:
+                return lox_class.methods["init"].arity
+            lox_class = lox_class.super_class
         return 0
 
     def __str__(self) -> str:
@@ -97,15 +86,25 @@ class LoxClass(lt.LoxCallable, LoxInstance):
     def lox_call(self, arguments: tp.Sequence[lt.LoxLiteral]) -> LoxInstance:
         return LoxInstance(self, arguments)
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
-        if self.super_class is not None:
-            if self.super_class.name == self.name:
-                scopes.error(
-                    f"Start of class {self.name}",
-                    "A class cannot inherit from itself.",
-                    raw_line=True,
-                )
-            self.super_class.resolve(scopes)
+    def __reduce_ex__(self, protocol: tp.SupportsIndex) -> tp.Any:
+        # The metaclass is a singleton, so it is pickled by name
+        if self is lox_type:
+            return "lox_type"
+        return super().__reduce_ex__(protocol)
+
+    def resolve_steps(
+        self, scopes: rs.ResolverStack, super_name: tp.Optional[str]
+    ) -> tp.Iterator[ae.AbstractExec]:
+        """
+        Resolves the methods, yielding their bodies. super_name is the name
+        of the superclass the class statement names, if any.
+        """
+        if super_name == self.name:
+            scopes.error(
+                f"Start of class {self.name}",
+                "A class cannot inherit from itself.",
+                raw_line=True,
+            )
         for method in self.functions:
             if method.name == "init":
                 func_type = fn.FunctionType.INITIALIZER
@@ -113,32 +112,80 @@ class LoxClass(lt.LoxCallable, LoxInstance):
             else:
                 func_type = fn.FunctionType.METHOD
                 method.is_initializer = False
-            if self.super_class is not None:
-                method.resolve(scopes, func_type, "this", "super")
+            if super_name is not None:
+                yield from method.resolve_steps(scopes, func_type, "this", "super")
             else:
-                method.resolve(scopes, func_type, "this")
+                yield from method.resolve_steps(scopes, func_type, "this")
 
     @property
     def functions(self) -> tp.Iterable[fn.LoxFunction]:
         return itertools.chain(
-            self.methods.values(),
-            self.getters.values(),
-            (x for x in self.fields.values() if isinstance(x, fn.LoxFunction)),
+            self.methods.values(), self.getters.values(), self.static_methods.values()
         )
 
-    def method_get(self, name: env.EnvKey) -> fn.LoxFunction:
-        method = self.methods.get(env.get_str(name))
+    @property
+    def static_methods(self) -> tp.Dict[str, fn.LoxFunction]:
+        """ The functions in the fields, which are all of them as declared """
+        fields = self.fields.items()
+        return {name: x for name, x in fields if isinstance(x, fn.LoxFunction)}
+
+    def instantiate(
+        self, super_class: tp.Optional[LoxClass], environment: env.Environment
+    ) -> LoxClass:
+        """
+        A class with the declared methods capturing their upvalues where the
+        class statement ran, so each run of the statement makes a new class.
+        """
+        methods, getters = self.methods.items(), self.getters.items()
+        lox_class = LoxClass(
+            self.name,
+            super_class,
+            {name: method.with_closure(environment) for name, method in methods},
+            {},
+            {name: getter.with_closure(environment) for name, getter in getters},
+        )
+        for name, value in self.fields.items():
+            if isinstance(value, fn.LoxFunction):
+                # Static methods are bound to the class
+                value = value.with_closure(environment)
+                value = value.bind(*lox_class.receiver(lox_class))
+            lox_class.fields[name] = value
+        return lox_class
+
+    def receiver(self, instance: LoxInstance) -> tp.Tuple[lt.LoxLiteral, ...]:
+        """ The values bound after the parameters of this class's methods """
+        if self.super_class is not None:
+            return (instance, self.super_class)
+        return (instance,)
+
+    def find_method(
+        self, name: env.EnvKey, instance: LoxInstance
+    ) -> tp.Optional[fn.LoxFunction]:
+        """ The method bound to instance, or None if no class in the chain has it """
+        str_name = env.get_str(name)
+        lox_class: tp.Optional[LoxClass] = self
+        while lox_class is not None:
+            method = lox_class.methods.get(str_name)
+            if method is not None:
+                return method.bind(*lox_class.receiver(instance))
+            lox_class = lox_class.super_class
+        return None
+
+    def method_get(self, name: env.EnvKey, instance: LoxInstance) -> lt.LoxLiteral:
+        """ The bound method, or the value of the getter, called name """
+        method = self.find_method(name, instance)
         if method is not None:
-            if self.super_class is not None:
-                method.closure = collections.ChainMap(
-                    {"this": self, "super": self.super_class}, method.closure
-                )
-            else:
-                method.closure = collections.ChainMap({"this": self}, method.closure)
             return method
-        if self.super_class is not None:
-            return self.super_class.method_get(name)
-        raise le.KeyLoxRuntimeError(env.get_line(name), f'Undefined method, "{name}".')
+        str_name = env.get_str(name)
+        lox_class: tp.Optional[LoxClass] = self
+        while lox_class is not None:
+            getter = lox_class.getters.get(str_name)
+            if getter is not None:
+                return getter.bind(*lox_class.receiver(instance)).lox_call(())
+            lox_class = lox_class.super_class
+        raise le.KeyLoxRuntimeError(
+            env.get_line(name), f'Undefined property, "{str_name}".'
+        )
 
 
 class MethodType(str, enum.Enum):
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import enum
 import inspect
+import itertools
 import sys
 import typing as tp
 
@@ -9,6 +10,8 @@ import pylox.misc_utils as mu
 import pylox.token_classes as tc
 
 DEFAULT_ERROR = "Something very wrong has happened"
+# The compilers recurse for each level of nesting, however it's evaluated
+TOO_DEEP = "Statement nested too deeply to compile."
 
 ErrorLine = tp.Union[int, str]
 
@@ -33,6 +36,9 @@ class ErrorReturns(ReturnsNT, enum.Enum):
 # This is meant to incremented when a line goes past when dealing with
 # multiple pieces of source code (e.g in the REPL)
 line_inc = 0
+# The number of errors reported, so a parser can tell whether the failure
+# it returns was already explained
+reported = 0
 
 
 def error(
@@ -42,6 +48,8 @@ def error(
     *,
     raw_line: bool = False,
 ) -> None:
+    global reported
+    reported += 1
     if isinstance(line, int):
         line += line_inc
     elif not raw_line:
@@ -78,12 +86,21 @@ def keyboard_interrupt_error(
     error(line, "Keyboard Interrupt", error_type, raw_line=raw_line)
 
 
+class TraceNT(tp.NamedTuple):
+    name: str
+    line: ErrorLine
+
+
 class LoxRuntimeError(Exception):
     """ Always caught """
 
     line: ErrorLine
     message: str
     ignore: bool
+    # The Lox functions the error left, innermost first, each with the line
+    # it was running, and the line of the call it was last raised through
+    trace: tp.List[TraceNT]
+    call_line: tp.Optional[ErrorLine]
 
     def __init__(
         self,
@@ -94,10 +111,36 @@ class LoxRuntimeError(Exception):
         self.line = line or "unknown"
         self.message = message
         self.ignore = ignore
+        self.trace = []
+        self.call_line = None
+
+    def unwind(self, name: str, line: tp.Optional[ErrorLine] = None) -> None:
+        """
+        Adds the function the error is leaving to the trace, running line,
+        by default that of the call the error came from or else of the error
+        """
+        if line is None:
+            line = self.line if self.call_line is None else self.call_line
+        self.trace.append(TraceNT(name, line))
 
     def error(self) -> None:
-        if not self.ignore:
-            error(self.line, self.message, ErrorReturns.RUNTIME_ERROR)
+        if self.ignore:
+            return
+        error(self.line, self.message, ErrorReturns.RUNTIME_ERROR)
+        # The top-level statement alone isn't worth a trace
+        if len(self.trace) > 1:
+            print(self.traceback(), end="", file=sys.stderr)
+
+    def traceback(self) -> str:
+        """ The trace, with recursion repeating a line shown once """
+        lines = []
+        for (name, line), group in itertools.groupby(self.trace):
+            if isinstance(line, int):
+                line += line_inc
+            count = len(list(group))
+            repeated = f" (repeated {count} times)" if count > 1 else ""
+            lines.append(f"    [line: {line}] in {name}{repeated}\n")
+        return "".join(lines)
 
 
 class KeyLoxRuntimeError(LoxRuntimeError, KeyError):
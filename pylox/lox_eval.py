@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import typing as tp
 
+import pylox.lox_errors as le
 import pylox.lox_ops as lo
 import pylox.lox_utils as lu
 
@@ -45,3 +46,31 @@ def evaluate_lox_unary(lox_type: tc.TokenType, left: lt.LoxLiteral) -> lt.LoxLit
         text = f"The operator {lox_type} does not support lox type {lu.lox_type(left)}"
         new_exc = exc
     raise TypeError(text) from new_exc
+
+
+def operate_binary(
+    operator: tc.Token, left: lt.LoxLiteral, right: lt.LoxLiteral
+) -> lt.LoxLiteral:
+    """ Applies the infix operator, raising a LoxRuntimeError if it can't """
+    try:
+        return evaluate_lox_binary(operator.type, left, right)
+    except TypeError:
+        message = (
+            f'Infix Operator "{operator.lexeme}" is not supported for the'
+            f' types "{lu.lox_type(left)}" and "{lu.lox_type(right)}"'
+        )
+    except ZeroDivisionError:
+        message = "Division by zero"
+    raise le.LoxRuntimeError(operator.line, message)
+
+
+def operate_unary(operator: tc.Token, right: lt.LoxLiteral) -> lt.LoxLiteral:
+    """ Applies the prefix operator, raising a LoxRuntimeError if it can't """
+    try:
+        return evaluate_lox_unary(operator.type, right)
+    except TypeError as exc:
+        message = (
+            f"Unary Operator {operator.lexeme} is not"
+            f' supported for the type "{lu.lox_type(right)}"'
+        )
+        raise le.LoxRuntimeError(operator.line, message) from exc
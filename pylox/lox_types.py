@@ -21,6 +21,10 @@ class NilType(metaclass=_Singleton):
     def __repr__(self) -> str:
         return "nil"
 
+    def __reduce__(self) -> str:
+        # Unpickles to the module level singleton
+        return "nil"
+
 
 nil = NilType()
 
@@ -50,9 +54,11 @@ class LoxCallable(abc.ABC):
 
 
 if tp.TYPE_CHECKING:
+    import pylox.control_flow as cf
     import pylox.lox_class as lc
 
     LoxLiteral = tp.Union[
         bool, float, str, NilType, LoxCallable, lc.LoxInstance, lc.LoxClass
     ]
-    StmtLiteral = tp.Optional[LoxLiteral]
+    # A statement evaluates to how it finished (see control_flow)
+    StmtLiteral = tp.Optional[tp.Union[LoxLiteral, cf.Completion]]
@@ -44,8 +44,16 @@ def is_lox_identifier(literal: str) -> bool:
     )
 
 
+# The values that are false, with the numbers equal to False
+FALSE_VALUES: tp.Final = frozenset((False, lt.nil))
+
+
 def lox_true(value: lt.LoxLiteral) -> bool:
-    return value not in {False, lt.nil}
+    try:
+        return value not in FALSE_VALUES
+    except TypeError:
+        # Instances can't be hashed, and are true
+        return True
 
 
 def lox_type(value: lt.LoxLiteral) -> str:
@@ -5,6 +5,7 @@ import typing as tp
 import pylox.abstract_execs as ae
 import pylox.error_dec as ed
 import pylox.lox_errors as le
+import pylox.parallel_parse as pp
 import pylox.stmt_parse as sp
 import pylox.token_classes as tc
 
@@ -14,7 +15,12 @@ def parse(
     tokens: tp.Sequence[tc.Token],
 ) -> tp.Union[tp.Tuple[ae.Stmt, ...], le.ErrorReturns]:
     """ Parses the tokens. Also could be named program() """
-    statements = tuple(sp.from_tokens(tokens))
+    if pp.jobs > 1 and isinstance(tokens, tp.Sequence):
+        statements = tuple(pp.from_tokens(tokens, pp.jobs))
+    else:
+        statements = tuple(sp.from_tokens(tokens))
     if ae.has_error(statements):
         return le.ErrorReturns.PARSE_ERROR
+    if sp.lazy and sp.full_check and not sp.check_lazy(statements):
+        return le.ErrorReturns.PARSE_ERROR
     return statements
@@ -0,0 +1,157 @@
+"""
+A language server speaking the language server protocol over stdio (see
+lox --lsp). Open documents are kept as analysis.Document objects, so edits
+are applied incrementally and only the declarations they touch are
+reanalysed before the diagnostics are published.
+"""
+from __future__ import annotations
+
+import json
+import sys
+import typing as tp
+
+import pylox
+import pylox.analysis as an
+import pylox.stmt_parse as stp
+
+Message = tp.Dict[str, tp.Any]
+
+# textDocumentSync kind for sending only the changed ranges
+INCREMENTAL = 2
+METHOD_NOT_FOUND = -32601
+
+
+def read_message(stream: tp.BinaryIO) -> tp.Optional[Message]:
+    """ Reads a message with its Content-Length header, or None at EOF """
+    length = None
+    while True:
+        header = stream.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if not header:
+            break
+        name, _, value = header.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return None
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
+def write_message(stream: tp.BinaryIO, message: Message) -> None:
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+def lsp_diagnostic(diagnostic: an.DiagnosticNT) -> Message:
+    """ Lox errors only know their line, so the whole line is marked """
+    line = diagnostic.line - 1
+    return {
+        "range": {
+            "start": {"line": line, "character": 0},
+            "end": {"line": line + 1, "character": 0},
+        },
+        "severity": diagnostic.severity,
+        "source": "pylox",
+        "message": diagnostic.message,
+    }
+
+
+class Server:
+    def __init__(self, output: tp.BinaryIO) -> None:
+        self.output = output
+        self.documents: tp.Dict[str, an.Document] = {}
+        self.shutdown = False
+        self.running = True
+
+    def handle(self, message: Message) -> None:
+        method = message.get("method")
+        params = message.get("params") or {}
+        handler = getattr(self, "on_" + str(method).replace("/", "_"), None)
+        if handler is None:
+            # Notifications which aren't supported are ignored
+            if "id" in message:
+                error = {"code": METHOD_NOT_FOUND, "message": f"{method} not found"}
+                self.send({"jsonrpc": "2.0", "id": message["id"], "error": error})
+            return
+        result = handler(params)
+        if "id" in message:
+            self.send({"jsonrpc": "2.0", "id": message["id"], "result": result})
+
+    def send(self, message: Message) -> None:
+        write_message(self.output, message)
+
+    def publish(self, uri: str) -> None:
+        document = self.documents.get(uri)
+        diagnostics = document.diagnostics() if document is not None else []
+        self.send(
+            {
+                "jsonrpc": "2.0",
+                "method": "textDocument/publishDiagnostics",
+                "params": {
+                    "uri": uri,
+                    "diagnostics": [lsp_diagnostic(diag) for diag in diagnostics],
+                },
+            }
+        )
+
+    def on_initialize(self, params: Message) -> Message:
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": INCREMENTAL}
+            },
+            "serverInfo": {"name": "pylox", "version": pylox.__version__},
+        }
+
+    def on_initialized(self, params: Message) -> None:
+        pass
+
+    def on_shutdown(self, params: Message) -> None:
+        self.shutdown = True
+
+    def on_exit(self, params: Message) -> None:
+        self.running = False
+
+    def on_textDocument_didOpen(self, params: Message) -> None:
+        document = params["textDocument"]
+        self.documents[document["uri"]] = an.Document(document["text"])
+        self.publish(document["uri"])
+
+    def on_textDocument_didChange(self, params: Message) -> None:
+        uri = params["textDocument"]["uri"]
+        document = self.documents[uri]
+        for change in params["contentChanges"]:
+            if "range" not in change:
+                document = self.documents[uri] = an.Document(change["text"])
+                continue
+            start, end = change["range"]["start"], change["range"]["end"]
+            document.edit(
+                document.offset(start["line"], start["character"]),
+                document.offset(end["line"], end["character"]),
+                change["text"],
+            )
+        self.publish(uri)
+
+    def on_textDocument_didClose(self, params: Message) -> None:
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        self.publish(uri)
+
+
+def serve(
+    input_stream: tp.Optional[tp.BinaryIO] = None,
+    output_stream: tp.Optional[tp.BinaryIO] = None,
+) -> int:
+    """ Serves until the client sends exit, returning the exit code """
+    input_stream = input_stream or sys.stdin.buffer
+    server = Server(output_stream or sys.stdout.buffer)
+    # Every function body is analysed as soon as it changes
+    stp.lazy = False
+    while server.running:
+        message = read_message(input_stream)
+        if message is None:
+            break
+        server.handle(message)
+    return 0 if server.shutdown else 1
@@ -0,0 +1,83 @@
+"""
+Parses the top-level statements of a program in a pool of worker processes.
+Each worker parses whole statements as split by split_tokens, and the
+statements are merged back in order, along with the errors printed while
+they were parsed, so the output is the same as parsing serially.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import io
+import sys
+import typing as tp
+
+import pylox.expr_parse as ep
+import pylox.split_tokens as sp
+import pylox.stmt_parse as stp
+import pylox.token_classes as tc
+import pylox.token_utils as tu
+
+if tp.TYPE_CHECKING:
+    import pylox.abstract_execs as ae
+
+# Set by the command line options (see lox.main). 1 parses serially.
+jobs = 1
+# Each worker gets about this many batches of statements, to balance the
+# load without paying the cost of sending each statement separately
+BATCHES_PER_JOB = 4
+
+# Each statement is sent with the token following it, as the parser checks
+# that it is a semicolon, and the number of tokens in the statement
+Batch = tp.List[tp.Tuple[tp.Tuple[tc.Token, ...], int]]
+ParsedNT = tp.Tuple["ae.Stmt", str]
+
+
+def configure(expr_parser: str, lazy: bool) -> None:
+    """ Copies the parsing options of the main process into a worker """
+    ep.parser = expr_parser
+    stp.lazy = lazy
+
+
+def parse_batch(batch: Batch) -> tp.List[ParsedNT]:
+    """ Parses statements, returning each with the errors it printed """
+    parsed = []
+    for tokens, length in batch:
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            result = stp.statement(tu.TokenSpan.of(tokens)[:length])
+        parsed.append((result, errors.getvalue()))
+    return parsed
+
+
+def batches(tokens: tc.TokenSeq, count: int) -> tp.Iterator[Batch]:
+    """ Splits the statements of tokens into about count batches """
+    spans = list(sp.split_tokens(tokens))
+    size = max(1, sum(map(len, spans)) // count)
+    batch: Batch = []
+    batch_size = 0
+    for span in spans:
+        batch.append((span.with_next().tuple(), len(span)))
+        batch_size += len(span)
+        if batch_size >= size:
+            yield batch
+            batch, batch_size = [], 0
+    if batch:
+        yield batch
+
+
+def from_tokens(tokens: tc.TokenSeq, workers: int) -> tp.Iterator[ae.Stmt]:
+    """ Same as stmt_parse.from_tokens, but parses in worker processes """
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=configure, initargs=(ep.parser, stp.lazy)
+    ) as executor:
+        all_batches = list(batches(tokens, workers * BATCHES_PER_JOB))
+        futures = [executor.submit(parse_batch, batch) for batch in all_batches]
+        for batch, future in zip(all_batches, futures):
+            try:
+                parsed = future.result()
+            except RecursionError:
+                # A statement nested too deeply to be pickled is parsed here
+                parsed = parse_batch(batch)
+            for result, errors in parsed:
+                sys.stderr.write(errors)
+                yield result
@@ -0,0 +1,211 @@
+"""
+Single pass, cursor based (Pratt) expression parser.
+
+Unlike the parser in expr_parse, which finds operators by rescanning and
+slicing the token sequence at every precedence level, this walks the tokens
+once with a shared cursor and builds the same expr nodes.
+"""
+from __future__ import annotations
+
+import enum
+import functools
+import typing as tp
+
+import pylox.lox_errors as le
+import pylox.token_classes as tc
+from pylox import expr
+from pylox.token_classes import TokenType as tt
+
+if tp.TYPE_CHECKING:
+    import pylox.abstract_execs as ae
+
+error = functools.partial(le.error, error_type=le.ErrorReturns.PARSE_ERROR)
+
+
+class Precedence(enum.IntEnum):
+    NONE = 0
+    ASSIGNMENT = 1
+    OR = 2
+    AND = 3
+    EQUALITY = 4
+    COMPARISON = 5
+    TERM = 6
+    FACTOR = 7
+    UNARY = 8
+    CALL = 9
+
+
+class ParseError(Exception):
+    """ Raised after an error is printed to unwind to expression() """
+
+
+class Cursor:
+    __slots__ = ("tokens", "position")
+
+    def __init__(self, tokens: tc.TokenSeq) -> None:
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> tp.Optional[tc.Token]:
+        try:
+            return self.tokens[self.position]
+        except IndexError:
+            return None
+
+    def advance(self) -> tc.Token:
+        token = self.peek()
+        if token is None:
+            raise self.error("Expect expression.")
+        self.position += 1
+        return token
+
+    def match(self, token_type: tc.TokenType) -> bool:
+        token = self.peek()
+        if token is not None and token.type is token_type:
+            self.position += 1
+            return True
+        return False
+
+    def consume(self, token_type: tc.TokenType, message: str) -> tc.Token:
+        token = self.peek()
+        if token is None or token.type is not token_type:
+            raise self.error(message, token)
+        self.position += 1
+        return token
+
+    def error(self, message: str, token: tp.Optional[tc.Token] = None) -> ParseError:
+        if token is None:
+            token = self.tokens[-1]
+        error(token.line, message)
+        return ParseError()
+
+
+PrefixFunc = tp.Callable[[Cursor, tc.Token], "ae.Expr"]
+InfixFunc = tp.Callable[[Cursor, "ae.Expr", tc.Token], "ae.Expr"]
+
+
+def literal(cursor: Cursor, token: tc.Token) -> ae.Expr:
+    return expr.from_token(token)
+
+
+def grouping(cursor: Cursor, token: tc.Token) -> ae.Expr:
+    inner = assignment(cursor)
+    cursor.consume(tt.RIGHT_PAREN, 'Expect ")" after expression.')
+    return expr.Grouping(inner)
+
+
+def unary(cursor: Cursor, token: tc.Token) -> ae.Expr:
+    return expr.Unary(token, parse_precedence(cursor, Precedence.UNARY))
+
+
+def super_expr(cursor: Cursor, token: tc.Token) -> ae.Expr:
+    cursor.consume(tt.DOT, 'Expect "." after "super".')
+    method = cursor.consume(tt.IDENTIFIER, "Expect superclass method name.")
+    return expr.Super(token, method)
+
+
+def binary(cursor: Cursor, left: ae.Expr, operator: tc.Token) -> ae.Expr:
+    precedence = INFIX_RULES[operator.type][0]
+    right = parse_precedence(cursor, Precedence(precedence + 1))
+    return expr.Binary(left, operator, right)
+
+
+def logical(cursor: Cursor, left: ae.Expr, operator: tc.Token) -> ae.Expr:
+    precedence = INFIX_RULES[operator.type][0]
+    right = parse_precedence(cursor, Precedence(precedence + 1))
+    return expr.Logical(left, operator, right)
+
+
+def call(cursor: Cursor, callee: ae.Expr, paren: tc.Token) -> ae.Expr:
+    arguments: tp.List[ae.Expr] = []
+    if not cursor.match(tt.RIGHT_PAREN):
+        arguments.append(assignment(cursor))
+        while cursor.match(tt.COMMA):
+            if len(arguments) >= 255:
+                raise cursor.error("Cannot have more than 255 arguments.", paren)
+            arguments.append(assignment(cursor))
+        cursor.consume(tt.RIGHT_PAREN, 'Expect ")" after arguments.')
+    return expr.Call(callee, cursor.tokens[cursor.position - 1], tuple(arguments))
+
+
+def get(cursor: Cursor, lox_object: ae.Expr, dot: tc.Token) -> ae.Expr:
+    name = cursor.consume(tt.IDENTIFIER, 'Expect property name after ".".')
+    return expr.Get(lox_object, name)
+
+
+PREFIX_RULES: tp.Dict[tc.TokenType, PrefixFunc] = {
+    tt.NUMBER: literal,
+    tt.STRING: literal,
+    tt.TRUE: literal,
+    tt.FALSE: literal,
+    tt.NIL: literal,
+    tt.IDENTIFIER: literal,
+    tt.LEFT_PAREN: grouping,
+    tt.MINUS: unary,
+    tt.BANG: unary,
+    tt.SUPER: super_expr,
+}
+
+INFIX_RULES: tp.Dict[tc.TokenType, tp.Tuple[Precedence, InfixFunc]] = {
+    tt.OR: (Precedence.OR, logical),
+    tt.AND: (Precedence.AND, logical),
+    tt.BANG_EQUAL: (Precedence.EQUALITY, binary),
+    tt.EQUAL_EQUAL: (Precedence.EQUALITY, binary),
+    tt.GREATER: (Precedence.COMPARISON, binary),
+    tt.GREATER_EQUAL: (Precedence.COMPARISON, binary),
+    tt.LESS: (Precedence.COMPARISON, binary),
+    tt.LESS_EQUAL: (Precedence.COMPARISON, binary),
+    tt.MINUS: (Precedence.TERM, binary),
+    tt.PLUS: (Precedence.TERM, binary),
+    tt.SLASH: (Precedence.FACTOR, binary),
+    tt.STAR: (Precedence.FACTOR, binary),
+    tt.LEFT_PAREN: (Precedence.CALL, call),
+    tt.DOT: (Precedence.CALL, get),
+}
+
+NO_RULE = (Precedence.NONE, None)
+
+
+def parse_precedence(cursor: Cursor, precedence: Precedence) -> ae.Expr:
+    token = cursor.advance()
+    prefix = PREFIX_RULES.get(token.type)
+    if prefix is None:
+        raise cursor.error("Expect expression.", token)
+    left = prefix(cursor, token)
+    while True:
+        operator = cursor.peek()
+        if operator is None:
+            return left
+        token_precedence, infix = INFIX_RULES.get(operator.type, NO_RULE)
+        if token_precedence < precedence or infix is None:
+            return left
+        cursor.position += 1
+        left = infix(cursor, left, operator)
+
+
+def assignment(cursor: Cursor) -> ae.Expr:
+    target = parse_precedence(cursor, Precedence.OR)
+    equals = cursor.peek()
+    if equals is None or equals.type is not tt.EQUAL:
+        return target
+    cursor.position += 1
+    value = assignment(cursor)
+    if isinstance(target, expr.Variable):
+        return expr.Assign(target.name, value)
+    if isinstance(target, expr.Get):
+        return expr.Set(target, value)
+    raise cursor.error("Invalid assignment target.", equals)
+
+
+def expression(tokens: tc.TokenSeq) -> ae.Expr:
+    if not tokens:
+        return expr.ErrorExpr()
+    cursor = Cursor(tokens)
+    try:
+        result = assignment(cursor)
+        extra = cursor.peek()
+        if extra is not None:
+            raise cursor.error(f'Unexpected "{extra.lexeme}" after expression.', extra)
+    except ParseError:
+        return expr.ErrorExpr()
+    return result
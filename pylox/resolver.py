@@ -8,7 +8,6 @@ import pylox.enviroment as env
 import pylox.error_dec as ed
 import pylox.functions as fn
 import pylox.lox_errors as le
-import pylox.misc_utils as mu
 
 if tp.TYPE_CHECKING:
     from pylox import stmt
@@ -21,61 +20,209 @@ if tp.TYPE_CHECKING:
 @ed.lox_error_handling(le.ErrorReturns.RESOLVER_ERROR)
 def resolve(tree: tp.Sequence[TAE]) -> tp.Union[tp.Sequence[TAE], le.ErrorReturns]:
     scopes = ResolverStack()
-    for node in tree:
-        node.resolve(scopes)
+    resolve_nodes(tree, scopes)
     return tree if not scopes.errored else le.ErrorReturns.RESOLVER_ERROR
 
 
+def resolve_nodes(nodes: tp.Iterable[ae.AbstractExec], scopes: ResolverStack) -> None:
+    """
+    Resolves the nodes and every node in them, depth first and in order.
+    The nodes still to be resolved are kept on an explicit stack of
+    iterators instead of the Python stack, so the nesting depth is only
+    bounded by memory (see AbstractExec.resolve_step).
+    """
+    stack = [iter(nodes)]
+    push, pop = stack.append, stack.pop
+    while stack:
+        for node in stack[-1]:
+            children = node.resolve_step(scopes)
+            if children:
+                push(iter(children))
+                break
+        else:
+            pop()
+
+
+class Scope(tp.Dict[str, int]):
+    """
+    The slot of each local of a block or function, numbered in the order
+    they are declared. The slots are the size of its frame at runtime (see
+    enviroment.Frame). pending holds the locals which are declared but not
+    yet initialized, and captured the locals a nested function uses.
+    """
+
+    __slots__ = ("pending", "captured", "references")
+    pending: tp.Set[str]
+    captured: tp.Set[str]
+    # The variables in the same function resolved to each local
+    references: tp.Dict[str, tp.List[ae.VarExpr]]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pending = set()
+        self.captured = set()
+        self.references = {}
+
+    def copy(self) -> Scope:
+        scope = Scope()
+        scope.update(self)
+        scope.pending = set(self.pending)
+        scope.captured = set(self.captured)
+        return scope
+
+    def close(self) -> tp.Tuple[int, ...]:
+        """
+        Marks the variables using a captured local as reading it through
+        its cell, returning the slots holding cells (see enviroment.Cell)
+        """
+        for name in self.captured:
+            for node in self.references.get(name, ()):
+                node.cell = True
+        self.references = {}
+        return tuple(sorted(self[name] for name in self.captured))
+
+
+class FunctionScope:
+    """
+    The upvalues of a function being resolved: the locals of enclosing
+    functions and blocks it uses, numbered in the order they are first
+    used. base is the index of the function's scope in the stack.
+    """
+
+    __slots__ = ("base", "indexes", "upvalues")
+    base: int
+    # The index of each upvalue by the scope its local is in and its name
+    indexes: tp.Dict[tp.Tuple[int, str], int]
+    upvalues: tp.List[env.UpvalueNT]
+
+    def __init__(self, base: int) -> None:
+        self.base = base
+        self.indexes = {}
+        self.upvalues = []
+
+    def copy(self) -> FunctionScope:
+        function = FunctionScope(self.base)
+        function.indexes = dict(self.indexes)
+        function.upvalues = list(self.upvalues)
+        return function
+
+
 @dataclasses.dataclass
 class ResolverStack:
     errored: bool = False
     current_function: fn.FunctionType = fn.FunctionType.NONE
-    enclosing_function: fn.FunctionType = fn.FunctionType.NONE
     in_loop: bool = False
     lox_class: tp.Optional[stmt.ClassStmt] = None
-    stack: tp.List[tp.Dict[str, bool]] = dataclasses.field(default_factory=list)
+    stack: tp.List[Scope] = dataclasses.field(default_factory=list)
+    functions: tp.List[FunctionScope] = dataclasses.field(default_factory=list)
 
-    def __getitem__(self, index: int) -> tp.Dict[str, bool]:
+    def __getitem__(self, index: int) -> Scope:
         return self.stack[index]
 
-    @contextlib.contextmanager
-    def declare(self, token: env.EnvKey) -> tp.Iterator[None]:
+    def snapshot(self) -> ResolverStack:
+        """ A copy of the current state for resolving a lazy body later """
+        stack = [scope.copy() for scope in self.stack]
+        functions = [function.copy() for function in self.functions]
+        return dataclasses.replace(
+            self, errored=False, stack=stack, functions=functions
+        )
+
+    def lookup(
+        self, name: str, node: tp.Optional[ae.VarExpr] = None
+    ) -> tp.Tuple[int, int]:
+        """
+        Returns the distance and slot of the variable called name, as in
+        VarExpr. A local of an enclosing function is an upvalue of this one,
+        with the index of the upvalue as its slot.
+        """
+        stack = self.stack
+        base = self.functions[-1].base if self.functions else 0
+        for i in range(len(stack) - 1, -1, -1):
+            scope = stack[i]
+            slot = scope.get(name)
+            if slot is None:
+                continue
+            if i < base:
+                return env.UPVALUE, self.upvalue(i, name)
+            if node is not None:
+                scope.references.setdefault(name, []).append(node)
+            return len(stack) - 1 - i, slot
+        return -1, env.global_slot(name)
+
+    def upvalue(self, index: int, name: str) -> int:
+        """
+        Returns the index of the upvalue of the innermost function for the
+        local in the scope at index, adding it to every function between
+        the local and the innermost one.
         """
-        This declares the token at the start of the context manager and
-        defines it at the end.
+        functions = self.functions
+        owner = len(functions) - 1
+        while owner > 0 and functions[owner - 1].base > index:
+            owner -= 1
+        key = (index, name)
+        upvalue = 0
+        for function in functions[owner:]:
+            existing = function.indexes.get(key)
+            if existing is None:
+                if function is functions[owner]:
+                    # The local is in the enclosing function's frames
+                    self.stack[index].captured.add(name)
+                    depth = function.base - 1 - index
+                    new = env.UpvalueNT(True, depth, self.stack[index][name])
+                else:
+                    new = env.UpvalueNT(False, 0, upvalue)
+                existing = function.indexes[key] = len(function.upvalues)
+                function.upvalues.append(new)
+            upvalue = existing
+        return upvalue
+
+    def declare(self, token: env.EnvKey) -> tp.Optional[int]:
         """
+        Declares the token in the innermost scope, returning its slot. It
+        can't be read until it is initialized. Globals aren't tracked and
+        have no slot.
+        """
+        if not self.stack:
+            return None
         str_token = env.get_str(token)
-        scope: tp.Dict[str, bool] = mu.get(self.stack, -1, {})
+        scope = self.stack[-1]
         if str_token in scope:
             self.error(
                 token, f'Variable "{str_token}" name already declared in this scope.'
             )
-        scope[str_token] = False
-        try:
-            yield
-        finally:
-            scope[str_token] = True
+        else:
+            scope[str_token] = len(scope)
+        scope.pending.add(str_token)
+        return scope[str_token]
+
+    def initialize(self, token: env.EnvKey) -> None:
+        if self.stack:
+            self.stack[-1].pending.discard(env.get_str(token))
 
     @contextlib.contextmanager
-    def function(self, func_type: fn.FunctionType) -> tp.Iterator[None]:
-        self.enclosing_function = self.current_function
-        self.current_function = func_type
+    def function(self, func_type: fn.FunctionType) -> tp.Iterator[FunctionScope]:
+        # A loop outside of the function can't be broken out of in it
+        enclosing = self.current_function, self.in_loop
+        self.current_function, self.in_loop = func_type, False
+        function = FunctionScope(len(self.stack))
+        self.functions.append(function)
         try:
-            yield
+            yield function
         finally:
-            self.current_function = self.enclosing_function
+            self.functions.pop()
+            self.current_function, self.in_loop = enclosing
 
     @contextlib.contextmanager
     def loop(self) -> tp.Iterator[None]:
-        self.in_loop = True
+        enclosing, self.in_loop = self.in_loop, True
         try:
             yield
         finally:
-            self.in_loop = False
+            self.in_loop = enclosing
 
     @contextlib.contextmanager
-    def scope(self) -> tp.Iterator[tp.Dict[str, bool]]:
-        new_scope: tp.Dict[str, bool] = {}
+    def scope(self) -> tp.Iterator[Scope]:
+        new_scope = Scope()
         self.stack.append(new_scope)
         try:
             yield new_scope
@@ -90,15 +237,11 @@ class ResolverStack:
         finally:
             self.lox_class = name
 
-    def define(self, token: env.EnvKey) -> None:
-        """
-        Declares and defines the token. Equivalent to running:
-
-        with self.declare(token):
-            pass
-        """
-        with self.declare(token):
-            pass
+    def define(self, token: env.EnvKey) -> tp.Optional[int]:
+        """ Declares and initializes the token, returning its slot """
+        slot = self.declare(token)
+        self.initialize(token)
+        return slot
 
     def error(
         self, token: tp.Union[env.EnvKey, int], message: str, *, raw_line=False
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import codecs
 import functools
+import mmap
+import re
 import typing as tp
 
 import pylox.error_dec as ed
 import pylox.lox_errors as le
 import pylox.lox_utils as lu
+import pylox.token_buffer as tb
 import pylox.token_classes as tc
 from pylox import const
 from pylox.token_classes import TokenType as tt
@@ -31,11 +35,12 @@ def to_token_type(string: str, line: int) -> tp.Optional[tc.TokenType]:
     return None
 
 
-# TODO: Refactor.
-
-
 @ed.lox_error_handling(le.ErrorReturns.SCAN_ERROR)
-def scan(source: str,) -> tp.Union[tp.List[tc.Token], le.ErrorReturns]:
+def legacy_scan(source: str,) -> tp.Union[tp.List[tc.Token], le.ErrorReturns]:
+    """
+    The original character by character scanner. Kept as a reference for
+    scan() and for benchmarking.
+    """
     current = 0
     line = 1
     tokens: tp.List[tc.Token] = []
@@ -104,3 +109,209 @@ def scan(source: str,) -> tp.Union[tp.List[tc.Token], le.ErrorReturns]:
             tokens.append(tc.Token(token_type, char, literal, line))
 
     return le.ErrorReturns.SCAN_ERROR if errored else tokens
+
+
+# Each alternative is a named group and the name of the matched group is used to
+# dispatch on the lexeme, so the whole source is scanned in one linear pass.
+# The order of the alternatives matters: comments have to be tried before the
+# slash operator and the two character operators before the one character ones.
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<newline>\n)
+    |(?P<space>[ \r\t]+)
+    |(?P<line_comment>//[^\n]*\n?)
+    |(?P<block_comment>/\*/|/\*.*?\*/|/\*.*)
+    |(?P<number>\d[\d.]*)
+    |(?P<word>[^\W\d]\w*)
+    |(?P<string>"[^"]*")
+    |(?P<unterminated>")
+    |(?P<operator>[!=<>]=?|[(){},.\-+;*/])
+    |(?P<unexpected>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class ScannedChunk(tp.NamedTuple):
+    tokens: tp.List[tc.Token]
+    end: int
+    line: int
+    errored: bool
+
+
+class ScanEndNT(tp.NamedTuple):
+    end: int
+    line: int
+    # The offset of each error
+    errors: tp.List[int]
+
+
+STR_TOKEN_CODES: tp.Dict[str, int] = {
+    lexeme: tb.TYPE_CODES[token_type] for lexeme, token_type in const.STR_TOKENS.items()
+}
+
+
+def scan_into(buffer: tb.TokenBuffer, line: int = 1, final: bool = True) -> ScanEndNT:
+    """
+    Scans the buffer's source starting at the given line, adding the tokens
+    to the buffer. Unexpected characters and invalid numbers are left out of
+    the buffer and scanning stops at an unterminated string, so the tokens
+    before an error are still usable. If final is False, the source is
+    assumed to be followed by more source code, so scanning stops before a
+    lexeme which touches its end (it could be continued by the next chunk)
+    and end is set to where that lexeme starts.
+    """
+    source = buffer.source
+    add_type = buffer.types.append
+    add_start = buffer.starts.append
+    add_end = buffer.ends.append
+    add_line = buffer.lines.append
+    str_codes = STR_TOKEN_CODES
+    identifier = tb.TYPE_CODES[tt.IDENTIFIER]
+    number = tb.TYPE_CODES[tt.NUMBER]
+    string = tb.TYPE_CODES[tt.STRING]
+    size = len(source)
+    end = size
+    newlines = 0
+    errors: tp.List[int] = []
+    for match in TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        if not final and (match.end() == size or kind == "unterminated"):
+            end = match.start()
+            break
+        if kind == "space":
+            continue
+        if kind == "word":
+            code = str_codes.get(match.group(), identifier)
+        elif kind == "operator":
+            code = str_codes[match.group()]
+        elif kind == "newline":
+            line += 1
+            continue
+        elif kind == "number":
+            try:
+                float(match.group())
+            except ValueError:
+                error(line, f"Invalid number {match.group()}")
+                errors.append(match.start())
+                continue
+            code = number
+        elif kind == "string":
+            code = string
+            # Strings can span lines, and are on the line they start on
+            newlines = match.group().count("\n")
+        elif kind == "line_comment":
+            if match.group()[-1] == "\n":
+                line += 1
+            continue
+        elif kind == "block_comment":
+            line += match.group().count("\n")
+            continue
+        elif kind == "unterminated":
+            error(line, "Unterminated string literal")
+            errors.append(match.start())
+            break
+        else:
+            error(line, f"Unexpected Character {match.group()}")
+            errors.append(match.start())
+            continue
+        add_type(code)
+        add_start(match.start())
+        add_end(match.end())
+        add_line(line)
+        if newlines:
+            line += newlines
+            newlines = 0
+    return ScanEndNT(end, line, errors)
+
+
+def scan_chunk(text: str, line: int = 1, final: bool = True) -> ScannedChunk:
+    """ Scans text like scan_into, creating the tokens up front """
+    buffer = tb.TokenBuffer(text)
+    end, line, errors = scan_into(buffer, line, final)
+    return ScannedChunk(list(buffer), end, line, bool(errors))
+
+
+@ed.lox_error_handling(le.ErrorReturns.SCAN_ERROR)
+def scan(source: str) -> tp.Union[tp.List[tc.Token], le.ErrorReturns]:
+    scanned = scan_chunk(source)
+    return le.ErrorReturns.SCAN_ERROR if scanned.errored else scanned.tokens
+
+
+@ed.lox_error_handling(le.ErrorReturns.SCAN_ERROR)
+def scan_buffer(source: str) -> tp.Union[tb.TokenBuffer, le.ErrorReturns]:
+    """
+    Same as scan(), except the tokens are stored in a TokenBuffer instead of
+    being created up front.
+    """
+    buffer, errors = scan_partial(source)
+    return le.ErrorReturns.SCAN_ERROR if errors else buffer
+
+
+def scan_partial(source: str) -> tp.Tuple[tb.TokenBuffer, tp.List[int]]:
+    """ Scans source into a TokenBuffer, also returning the offset of each error """
+    buffer = tb.TokenBuffer(source)
+    return buffer, scan_into(buffer).errors
+
+
+class TokenStream(tp.Iterator[tc.Token]):
+    """
+    Scans an iterable of source code chunks lazily, so only the tokens which
+    have been scanned but not consumed yet are kept in memory. Lexemes which
+    straddle the boundary between two chunks are carried over to the next one.
+    As errors are only found while iterating, errored should be checked after
+    the stream is exhausted.
+    """
+
+    errored: bool
+
+    def __init__(self, chunks: tp.Iterable[str]) -> None:
+        self.errored = False
+        self._tokens = self._scan(iter(chunks))
+
+    def __iter__(self) -> TokenStream:
+        return self
+
+    def __next__(self) -> tc.Token:
+        return next(self._tokens)
+
+    def _scan(self, chunks: tp.Iterator[str]) -> tp.Iterator[tc.Token]:
+        line = 1
+        pending = ""
+        for chunk in chunks:
+            # Long lexemes (e.g large comments) are rescanned with every
+            # chunk, so the text is grown to at least twice the carried over
+            # part to keep scanning linear.
+            parts = [pending, chunk]
+            size = len(pending) + len(chunk)
+            while size < 2 * len(pending):
+                chunk = next(chunks, "")
+                if not chunk:
+                    break
+                parts.append(chunk)
+                size += len(chunk)
+            text = "".join(parts)
+            scanned = scan_chunk(text, line, final=False)
+            self.errored |= scanned.errored
+            yield from scanned.tokens
+            pending = text[scanned.end :]
+            line = scanned.line
+        scanned = scan_chunk(pending, line)
+        self.errored |= scanned.errored
+        yield from scanned.tokens
+
+
+def mapped_chunks(
+    file: tp.BinaryIO, chunk_size: int = 1 << 16, encoding: str = "utf-8"
+) -> tp.Iterator[str]:
+    """ Memory maps the file and decodes it lazily in chunks of chunk_size """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    fileno = file.fileno()
+    try:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except ValueError:  # Empty files cannot be mapped
+        return
+    with mapped:
+        for start in range(0, len(mapped), chunk_size):
+            yield decoder.decode(mapped[start : start + chunk_size])
+        yield decoder.decode(b"", final=True)
@@ -4,81 +4,171 @@ import itertools
 import typing as tp
 from collections import defaultdict
 
-from more_itertools import peekable
-
-import pylox.misc_utils as mu
 import pylox.token_classes as tc
+import pylox.token_utils as tu
+from pylox import const
 from pylox.token_classes import TokenType as tt
 
 
-def null_split(tokens: tp.Iterator[tc.Token]) -> tp.Tuple[()]:
-    next(tokens)
-    return ()
-
-
-def matched_braces(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[tc.Token]:
-    level = 0
-    found_brace = False
-    for token in tokens:
-        yield token
-        if token.type is tt.LEFT_BRACE:
-            level += 1
-            found_brace = True
-        elif token.type is tt.RIGHT_BRACE:
-            level -= 1
-        if found_brace and level == 0:
-            return
-
-
-def a_match_braces(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[peekable[tc.Token]]:
-    tokens = peekable(tokens)
-    while tokens:
-        yield peekable(matched_braces(tokens))
+class StmtBoundsNT(tp.NamedTuple):
+    """
+    The statement is tokens[start:stop] and the next one starts at next.
+    stop and next differ when a terminating semicolon is dropped.
+    """
 
+    start: int
+    stop: int
+    next: int
 
-def parens(iterable: tp.Iterable[tc.Token]) -> tp.Iterator[tc.Token]:
-    return mu.inclusive_takewhile(lambda x: x.type is tt.RIGHT_PAREN, iterable)
 
+def null_bounds(tokens: tu.TokenSpan, start: int) -> StmtBoundsNT:
+    return StmtBoundsNT(start, start, start + 1)
 
-def if_stmt(tokens: peekable[tc.Token]) -> tp.Iterator[tc.Token]:
-    yield from cond_stmt(tokens)
-    if tokens.peek(tc.sentinel_token).type is tt.ELSE:
-        yield next(tokens)
-        yield from split_stmt(tokens)
 
+def brace_bounds(tokens: tu.TokenSpan, start: int) -> StmtBoundsNT:
+    """
+    Up to and including the brace matching the first left brace. If it has no
+    match, only up to the left brace, so the statements after it are still
+    parsed (and checked) on their own instead of as its body.
+    """
+    brace = tokens.find(tt.LEFT_BRACE, start)
+    if brace >= len(tokens):
+        return StmtBoundsNT(start, len(tokens), len(tokens))
+    match = tokens.match(brace)
+    stop = match + 1 if match >= 0 else brace + 1
+    return StmtBoundsNT(start, stop, stop)
 
-def cond_stmt(tokens: peekable[tc.Token]) -> tp.Iterator[tc.Token]:
-    yield from parens(iterable=tokens)
-    yield from split_stmt(tokens)
 
+def expr_bounds(tokens: tu.TokenSpan, start: int) -> StmtBoundsNT:
+    """
+    Up to the next semicolon or, as a statement can't contain one, up to the
+    next keyword starting a statement, so a missing semicolon only costs the
+    statement it is missing from (panic mode recovery).
+    """
+    semicolon = tokens.find(tt.SEMICOLON, start)
+    keyword = tokens.find_any(const.SYNC_TOKENS, start + 1, semicolon)
+    if keyword < semicolon:
+        return StmtBoundsNT(start, keyword, keyword)
+    return StmtBoundsNT(start, semicolon, min(semicolon + 1, len(tokens)))
 
-def split_stmt(tokens: peekable[tc.Token]) -> tp.Iterable[tc.Token]:
-    return SPLIT_TOKENS_FUNCS[getattr(tokens.peek(None), "type", None)](tokens)
 
+BoundsFunc = tp.Callable[[tu.TokenSpan, int], StmtBoundsNT]
 
-def expr_split(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[tc.Token]:
-    return itertools.takewhile(lambda x: x.type is not tt.SEMICOLON, tokens)
 
-
-SplitFunc = tp.Callable[[peekable], tp.Iterable[tc.Token]]
-
-
-SPLIT_TOKENS_FUNCS: tp.DefaultDict[tp.Optional[tc.TokenType], SplitFunc] = defaultdict(
-    lambda: expr_split,
+STMT_BOUNDS_FUNCS: tp.DefaultDict[tc.TokenType, BoundsFunc] = defaultdict(
+    lambda: expr_bounds,
     {
-        tt.SEMICOLON: null_split,
-        tt.LEFT_BRACE: matched_braces,
-        tt.CLASS: matched_braces,
-        tt.WHILE: cond_stmt,
-        tt.FOR: cond_stmt,
-        tt.FUN: matched_braces,
-        tt.IF: if_stmt,
-        None: lambda _: (),
+        tt.SEMICOLON: null_bounds,
+        tt.LEFT_BRACE: brace_bounds,
+        tt.CLASS: brace_bounds,
+        tt.FUN: brace_bounds,
     },
 )
-
-
-def split_tokens(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[tp.Iterable[tc.Token]]:
-    p_tokens = peekable(tokens)
-    while p_tokens:
-        yield split_stmt(p_tokens)
+# Statements ending where the statement after their condition ends
+CONDITIONAL_TYPES = frozenset((tt.IF, tt.WHILE, tt.FOR))
+
+
+def statement_bounds(tokens: tu.TokenSpan, start: int) -> StmtBoundsNT:
+    """
+    Returns the bounds of the statement starting at start. Bounds which do
+    not depend on where the span ends are cached in its BracketTable, so each
+    statement is only measured once however deeply it is nested.
+    """
+    # The conditional statements whose body (or else branch, if the flag is
+    # set) is being measured, so nested ones don't recurse
+    pending: tp.List[tp.Tuple[int, bool]] = []
+    position = start
+    while True:
+        bounds = cached_bounds(tokens, position)
+        if bounds is None:
+            if tokens.type(position) in CONDITIONAL_TYPES:
+                pending.append((position, False))
+                position = tu.closing_paren(tokens, position + 1) + 1
+                continue
+            bounds = STMT_BOUNDS_FUNCS[tokens.type(position)](tokens, position)
+            cache_bounds(tokens, bounds)
+        while pending:
+            header, in_else = pending.pop()
+            if (
+                not in_else
+                and tokens.type(header) is tt.IF
+                and bounds.next < len(tokens)
+                and tokens.type(bounds.next) is tt.ELSE
+            ):
+                pending.append((header, True))
+                position = bounds.next + 1
+                break
+            bounds = StmtBoundsNT(header, bounds.stop, bounds.next)
+            cache_bounds(tokens, bounds)
+        else:
+            return bounds
+
+
+def cached_bounds(tokens: tu.TokenSpan, start: int) -> tp.Optional[StmtBoundsNT]:
+    if start >= len(tokens):
+        return StmtBoundsNT(len(tokens), len(tokens), len(tokens))
+    offset = tokens.start
+    cached = tokens.table.statements.get(offset + start)
+    if cached is None:
+        return None
+    cached_start, stop, next_start, limit = cached
+    # Bounds reaching the end of the span they were measured in could go
+    # further in a longer span
+    if next_start < tokens.stop or limit == tokens.stop:
+        return StmtBoundsNT(cached_start - offset, stop - offset, next_start - offset)
+    return None
+
+
+def cache_bounds(tokens: tu.TokenSpan, bounds: StmtBoundsNT) -> None:
+    offset = tokens.start
+    tokens.table.statements[offset + bounds.start] = (
+        bounds.start + offset,
+        bounds.stop + offset,
+        bounds.next + offset,
+        tokens.stop,
+    )
+
+
+def split_span(tokens: tu.TokenSpan) -> tp.Iterator[tu.TokenSpan]:
+    position = 0
+    while position < len(tokens):
+        start, stop, position = statement_bounds(tokens, position)
+        yield tokens[start:stop]
+
+
+def split_stream(
+    tokens: tp.Iterable[tc.Token], chunk_size: int = 256
+) -> tp.Iterator[tu.TokenSpan]:
+    """
+    Splits tokens which are produced lazily, only keeping about as many
+    tokens in memory as the longest statement.
+    """
+    iter_tokens = iter(tokens)
+    pending: tp.List[tc.Token] = []
+    exhausted = False
+    while not exhausted:
+        wanted = max(chunk_size, 2 * len(pending))
+        chunk = list(itertools.islice(iter_tokens, wanted - len(pending)))
+        exhausted = len(pending) + len(chunk) < wanted
+        span = tu.TokenSpan.of(pending + chunk)
+        position = 0
+        while position < len(span):
+            start, stop, next_position = statement_bounds(span, position)
+            # The statement could continue in the next chunk, as could the
+            # body of a brace which is unmatched so far
+            unmatched = (
+                stop > start
+                and span[stop - 1].type is tt.LEFT_BRACE
+                and span.match(stop - 1) < 0
+            )
+            if (next_position >= len(span) or unmatched) and not exhausted:
+                break
+            yield span[start:stop]
+            position = next_position
+        pending = list(span[position:])
+
+
+def split_tokens(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[tu.TokenSpan]:
+    if isinstance(tokens, tp.Sequence):
+        return split_span(tu.TokenSpan.of(tokens))
+    return split_stream(tokens)
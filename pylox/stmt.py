@@ -1,21 +1,22 @@
 from __future__ import annotations
 
-import contextlib
 import typing as tp
-from dataclasses import dataclass
-import functools
+from dataclasses import dataclass, field
 import pylox.abstract_execs as ae
-import pylox.control_exc as ce
+import pylox.control_flow as cf
+import pylox.enviroment as env
 import pylox.functions as fn
 import pylox.lox_class as lc
 import pylox.lox_types as lt
 import pylox.lox_utils as lu
 import pylox.lox_errors as le
+import pylox.tiers as ti
+from pylox import expr
+from pylox.token_classes import TokenType as tt
 
 if tp.TYPE_CHECKING:
     import pylox.resolver as rs
     import pylox.token_classes as tc
-    from pylox import expr
 
 
 class ExprStmt(ae.ExprExecMixin, ae.Stmt):
@@ -28,14 +29,18 @@ class PrintStmt(ae.ExprExecMixin, ae.Stmt):
         lu.lox_print(self.expression.evaluate())
 
 
-@dataclass(frozen=True)
+@dataclass
 class VarStmt(ae.Stmt):
     name: tc.Token
     initializer: tp.Optional[ae.Expr]
+    # The slot of the variable in its frame, None for a global
+    slot: tp.Optional[int] = field(init=False, default=None)
 
     def evaluate(self) -> None:
-        self.environment[self.name] = (
-            self.initializer.evaluate() if self.initializer is not None else lt.nil
+        self.environment.define(
+            self.name,
+            self.initializer.evaluate() if self.initializer is not None else lt.nil,
+            self.slot,
         )
 
     @property
@@ -44,10 +49,11 @@ class VarStmt(ae.Stmt):
             return ()
         return (self.initializer,)
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
-        with scopes.declare(self.name):
-            if self.initializer is not None:
-                self.initializer.resolve(scopes)
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        self.slot = scopes.declare(self.name)
+        if self.initializer is not None:
+            yield self.initializer
+        scopes.initialize(self.name)
 
 
 class ErrorStmt(ae.ErrorExec, ae.Stmt):
@@ -58,26 +64,136 @@ class ErrorStmt(ae.ErrorExec, ae.Stmt):
 class BraceStmt(ae.Stmt):
     stmts: tp.Sequence[ae.Stmt]
     function_scope: bool = False
-
-    def evaluate(self) -> None:
-        manager: tp.Any = (
-            self.environment.scope
-            if not self.function_scope
-            else contextlib.nullcontext
-        )
-        with manager():
+    # The number of locals declared directly in the block, and the slots of
+    # the ones nested functions use
+    frame_size: int = field(init=False, default=0)
+    cells: tp.Tuple[int, ...] = field(init=False, default=())
+    # Whether the block runs in a frame of its own, which it only needs if
+    # it declares anything
+    new_frame: bool = field(init=False, default=True)
+
+    def evaluate(self) -> tp.Optional[cf.Completion]:
+        if not self.new_frame:
+            for stmt in self.stmts:
+                completion = stmt.evaluate()
+                if completion is not None:
+                    return completion
+            return None
+        environment = self.environment
+        enclosing = environment.frame
+        frame = environment.frame = env.Frame(self.frame_size, enclosing)
+        if self.cells:
+            frame.make_cells(self.cells)
+        try:
             for stmt in self.stmts:
-                stmt.evaluate()
+                completion = stmt.evaluate()
+                if completion is not None:
+                    return completion
+        finally:
+            environment.frame = enclosing
+        return None
 
     @property
     def execs(self) -> tp.Sequence[ae.Stmt]:
         return self.stmts
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
-        manager: tp.Any = scopes.scope if not self.function_scope else contextlib.nullcontext
-        with manager():
-            for node in self.stmts:
-                node.resolve(scopes)
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        self.new_frame = not self.function_scope and any(
+            isinstance(stmt, DECLARATIONS) for stmt in self.stmts
+        )
+        if not self.new_frame:
+            return self.stmts
+        return self.scoped_steps(scopes)
+
+    def scoped_steps(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        with scopes.scope() as scope:
+            yield from self.stmts
+            self.frame_size = len(scope)
+            self.cells = scope.close()
+
+
+@dataclass
+class LazyBody(ae.Stmt):
+    """
+    A function body which is parsed and resolved when the function is first
+    called (see stmt_parse.lazy). The resolver state at the function's
+    definition is saved so the body resolves as if it was resolved in place.
+    """
+
+    tokens: tc.TokenSeq
+    body: tp.Optional[ae.Stmt] = field(default=None, init=False)
+    scopes: tp.Optional[rs.ResolverStack] = field(default=None, init=False)
+    resolved: bool = field(default=False, init=False)
+    # The size of the function's frame once the body's locals are resolved,
+    # and the slots of the ones nested functions use
+    frame_size: int = field(default=0, init=False)
+    cells: tp.Tuple[int, ...] = field(default=(), init=False)
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__} ({len(self.tokens)} tokens)"
+
+    @property
+    def execs(self) -> tp.Sequence[ae.Stmt]:
+        return (self.body,) if self.body is not None else ()
+
+    def parse(self) -> ae.Stmt:
+        """ Parses the body without resolving it, printing any syntax errors """
+        if self.body is None:
+            import pylox.stmt_parse as sp
+
+            self.body = sp.to_meta_dec(self.tokens)
+            if isinstance(self.body, BraceStmt):
+                self.body.function_scope = True
+        return self.body
+
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        if len(scopes.stack) > 1:
+            # Any name in the body could be a local of an enclosing scope
+            # used by the function, which has to be captured before the body
+            # is resolved. The locals of the function itself are captured
+            # once it is.
+            for token in self.tokens:
+                if token.type is tt.IDENTIFIER or token.type is tt.SUPER:
+                    scopes.lookup(token.lexeme)
+        self.scopes = scopes.snapshot()
+        import pylox.stmt_parse as sp
+
+        if sp.full_check:
+            # Report the body's resolver errors up front, the syntax errors
+            # were already reported by stmt_parse.check_lazy
+            try:
+                self.force()
+            except le.LoxRuntimeError:
+                scopes.errored = True
+        return None
+
+    def force(self) -> ae.Stmt:
+        """ Parses and resolves the body if it wasn't already """
+        body = self.parse()
+        if not self.resolved:
+            if body.has_error():
+                raise le.LoxRuntimeError(ignore=True)
+            assert self.scopes is not None, "The function was never resolved"
+            body.resolve(self.scopes)
+            if self.scopes.errored:
+                self.body = ErrorStmt()
+                raise le.LoxRuntimeError(ignore=True)
+            self.resolved = True
+            self.frame_size = len(self.scopes.stack[-1])
+            self.cells = self.scopes.stack[-1].close()
+            self.scopes = None
+        return body
+
+    def evaluate(self) -> tp.Optional[cf.Completion]:
+        body = self.force()
+        # The function's frame was made before its body's locals were known
+        frame = self.environment.frame
+        slots = frame.slots  # type: ignore
+        if len(slots) < self.frame_size:
+            slots.extend([lt.nil] * (self.frame_size - len(slots)))
+        if self.cells:
+            frame.make_cells(self.cells)  # type: ignore
+        return body.evaluate()
 
 
 @dataclass(frozen=True)
@@ -94,11 +210,12 @@ class IfStmt(ae.Stmt):
             return (self.condition, self.then_branch)
         return (self.condition, self.then_branch, self.else_branch)
 
-    def evaluate(self) -> None:
+    def evaluate(self) -> tp.Optional[cf.Completion]:
         if lu.lox_true(self.condition.evaluate()):
-            self.then_branch.evaluate()
-        elif self.else_branch is not None:
-            self.else_branch.evaluate()
+            return self.then_branch.evaluate()
+        if self.else_branch is not None:
+            return self.else_branch.evaluate()
+        return None
 
     def __str__(self) -> str:
         cls = type(self).__name__
@@ -109,25 +226,42 @@ class IfStmt(ae.Stmt):
 class WhileStmt(ae.Stmt):
     condition: ae.Expr
     body: ae.Stmt
+    # Evaluated after the body, for for loops
+    increment: tp.Optional[ae.Expr] = None
+    # The iterations counted and the compiled loop once it's hot
+    tier: ti.Tier = field(default_factory=ti.Tier, compare=False, repr=False)
 
     def __str__(self) -> str:
-        return f"{type(self).__name__} {self.condition} [{self.body}]"
+        increment = f", {self.increment}" if self.increment is not None else ""
+        return f"{type(self).__name__} {self.condition} [{self.body}{increment}]"
 
     @property
-    def execs(self) -> tp.Tuple[ae.AbstractExec, ae.AbstractExec]:
-        return (self.condition, self.body)
-
-    def evaluate(self) -> None:
+    def execs(self) -> tp.Tuple[ae.AbstractExec, ...]:
+        if self.increment is None:
+            return (self.condition, self.body)
+        return (self.condition, self.body, self.increment)
+
+    def evaluate(self) -> tp.Optional[cf.Completion]:
+        tier = self.tier
+        if tier.code is not None:
+            return tier.code()
         while lu.lox_true(self.condition.evaluate()):
-            try:
-                self.body.evaluate()
-            except ce.LoxBreakError:
-                break
-
-    def resolve(self, scopes: rs.ResolverStack) -> None:
+            completion = self.body.evaluate()
+            if completion is not None:
+                if completion is cf.BREAK:
+                    break
+                return completion
+            if self.increment is not None:
+                self.increment.evaluate()
+            tier.count += 1
+            if tier.count == ti.loop_threshold:
+                # Runs the rest of the iterations compiled
+                return ti.tier_up_loop(self)()
+        return None
+
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
         with scopes.loop():
-            self.condition.resolve(scopes)
-            self.body.resolve(scopes)
+            yield from self.execs
 
 
 class NullStmt(ae.Stmt):
@@ -139,12 +273,13 @@ class NullStmt(ae.Stmt):
 class BreakStmt(ae.Stmt):
     token: tc.Token
 
-    def evaluate(self) -> tp.NoReturn:
-        raise ce.LoxBreakError(self.token.line)
+    def evaluate(self) -> cf.Completion:
+        return cf.BREAK
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
         if not scopes.in_loop:
             scopes.error(self.token.line, "Break statement outside of a loop")
+        return None
 
 
 @dataclass(frozen=True)
@@ -152,35 +287,43 @@ class ReturnStmt(ae.Stmt):
     keyword: tc.Token
     value: ae.Expr
 
-    def evaluate(self) -> tp.NoReturn:
-        raise ce.LoxReturnError(self.value.evaluate(), self.keyword.line)
+    def evaluate(self) -> cf.Completion:
+        value = self.value.evaluate()
+        if value is cf.TAIL_CALL:
+            return cf.TAIL_CALL
+        self.environment.returned = value
+        return cf.RETURN
 
     @property
     def execs(self) -> tp.Tuple[ae.Expr]:
         return (self.value,)
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
         if scopes.current_function is fn.FunctionType.NONE:
             scopes.error(self.keyword.line, "Cannot return from top-level code.")
-        if getattr(self.value, "value", None) is not lt.nil:
-            if scopes.current_function is fn.FunctionType.INITIALIZER:
-                scopes.error(
-                    self.keyword.line, "Cannot return a value from an initializer."
-                )
-            self.value.resolve(scopes)
+        if getattr(self.value, "value", None) is lt.nil:
+            return None
+        if scopes.current_function is fn.FunctionType.INITIALIZER:
+            message = "Cannot return a value from an initializer."
+            scopes.error(self.keyword.line, message)
+        if isinstance(self.value, expr.Call):
+            object.__setattr__(self.value, "tail", True)
+        return self.execs
 
 
 # TODO: Consider changing the function and class statements to an expression returning
 # the function or class and having a side effect of defining the object in scope?
 # Anonymous functions could be written by not providing a name,
 # e.g "fun (x, y) {...}"
-@dataclass(frozen=True)
+@dataclass
 class FunctionStmt(ae.Stmt):
     function: fn.LoxFunction
+    slot: tp.Optional[int] = field(init=False, default=None)
 
     def evaluate(self) -> None:
-        self.function.closure = self.environment.maps[0]
-        self.environment[self.function.name] = self.function
+        environment = self.environment
+        function = self.function.with_closure(environment)
+        environment.define(function.name, function, self.slot)
 
     @classmethod
     def from_params(
@@ -192,26 +335,31 @@ class FunctionStmt(ae.Stmt):
     def execs(self) -> tp.Tuple[ae.Stmt]:
         return (self.function.body,)
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
-        scopes.define(self.function.name)
-        self.function.resolve(scopes, fn.FunctionType.FUNCTION)
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
+        self.slot = scopes.define(self.function.name)
+        return self.function.resolve_steps(scopes, fn.FunctionType.FUNCTION)
 
 
-@dataclass(frozen=True)
+@dataclass
 class ClassStmt(ae.Stmt):
+    # The class as it was declared, copied each time the statement is run
     lox_class: lc.LoxClass
     super_class_var: tp.Optional[expr.Variable]
+    slot: tp.Optional[int] = field(init=False, default=None)
 
-    def resolve(self, scopes: rs.ResolverStack) -> None:
+    def resolve_step(self, scopes: rs.ResolverStack) -> ae.ResolveSteps:
         with scopes.new_class(self):
-            scopes.define(self.lox_class.name)
+            self.slot = scopes.define(self.lox_class.name)
+            super_name = None
             if self.super_class_var is not None:
-                self.super_class_var.resolve(scopes)
-            self.lox_class.resolve(scopes)
+                super_name = self.super_class_var.name.lexeme
+                yield self.super_class_var
+            yield from self.lox_class.resolve_steps(scopes, super_name)
 
     def evaluate(self) -> None:
-        self.lox_class.super_class = self.super_class
-        self.environment[self.lox_class.name] = self.lox_class
+        environment = self.environment
+        lox_class = self.lox_class.instantiate(self.super_class(), environment)
+        environment.define(lox_class.name, lox_class, self.slot)
 
     @classmethod
     def from_params(
@@ -237,7 +385,6 @@ class ClassStmt(ae.Stmt):
     def execs(self) -> tp.List[ae.Stmt]:
         return [func.body for func in self.lox_class.functions]
 
-    @functools.cached_property
     def super_class(self) -> tp.Optional[lc.LoxClass]:
         if self.super_class_var is None:
             return None
@@ -247,3 +394,7 @@ class ClassStmt(ae.Stmt):
                 self.super_class_var.name.line, "Superclass must be a class"
             )
         return value
+
+
+# The statements declaring a local in the block they are directly in
+DECLARATIONS = (VarStmt, FunctionStmt, ClassStmt)
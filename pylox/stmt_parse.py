@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import functools
+import types
 import typing as tp
 from collections import defaultdict
 
 import pylox.error_dec as ed
 import pylox.expr_parse as ep
 import pylox.lox_class as lc
+import pylox.lox_errors as le
 import pylox.lox_types as lt
 import pylox.misc_utils as mu
 import pylox.split_tokens as sp
@@ -19,24 +21,51 @@ if tp.TYPE_CHECKING:
     import pylox.abstract_execs as ae
     import pylox.functions as fn
 
-    ProgramFunc = tp.Callable[[tp.Sequence[tc.Token]], ae.Stmt]
+    # A statement containing statements yields their tokens and is sent each
+    # one parsed, so nesting doesn't recurse (see to_meta_dec)
+    NestedParse = tp.Generator[tp.Sequence[tc.Token], ae.Stmt, ae.Stmt]
+    FunctionParse = tp.Generator[
+        tp.Sequence[tc.Token], ae.Stmt, tp.Union[stmt.FunctionStmt, stmt.ErrorStmt]
+    ]
+    ProgramFunc = tp.Callable[[tp.Sequence[tc.Token]], tp.Union[ae.Stmt, NestedParse]]
     MethodDefaultDict = tp.DefaultDict[lc.MethodType, tp.List[fn.LoxFunction]]
 
 error = ep.error
 stmt_print = functools.partial(ed.error_print, error_exec=stmt.ErrorStmt)
 
+# If lazy is True, function and method bodies are only parsed when they are
+# first called. full_check still parses them up front to report syntax errors,
+# and LazyBody.resolve_step resolves them to report resolver errors.
+lazy = False
+full_check = False
+
+
+def terminated(tokens: tp.Sequence[tc.Token]) -> bool:
+    """
+    Whether the statement is followed by the semicolon the splitter left out
+    of it. The clauses of a for loop aren't spans and need none.
+    """
+    return not isinstance(tokens, tu.TokenSpan) or tokens.next_type() is tt.SEMICOLON
+
 
 @stmt_print('Expect ";" after value')
-def to_print(tokens: tp.Sequence[tc.Token]) -> stmt.PrintStmt:
+def to_print(tokens: tp.Sequence[tc.Token]) -> ae.Stmt:
+    if not terminated(tokens):
+        return stmt.ErrorStmt()
     return stmt.PrintStmt(ep.expression(tokens[1:]))
 
 
 @stmt_print('Expect ";" after expression')
-def to_expr(tokens: tp.Sequence[tc.Token]) -> stmt.ExprStmt:
+def to_expr(tokens: tp.Sequence[tc.Token]) -> ae.Stmt:
+    if not terminated(tokens):
+        return stmt.ErrorStmt()
     return stmt.ExprStmt(ep.expression(tokens))
 
 
 def to_var(tokens: tp.Sequence[tc.Token]) -> tp.Union[stmt.ErrorStmt, stmt.VarStmt]:
+    if not terminated(tokens):
+        error(tokens[-1].line, 'Expect ";" after variable declaration.')
+        return stmt.ErrorStmt()
     relevant_tokens = tu.token_find_index(tokens, {tt.IDENTIFIER, tt.EQUAL})
     index = next(relevant_tokens, None)
     name = tokens[index] if index is not None else tc.sentinel_token
@@ -55,27 +84,38 @@ def to_var(tokens: tp.Sequence[tc.Token]) -> tp.Union[stmt.ErrorStmt, stmt.VarSt
     return stmt.VarStmt(name, initializer)
 
 
-def to_brace(tokens: tc.TokenSeq,) -> stmt.BraceStmt:
-    return stmt.BraceStmt(tuple(from_tokens(tokens[1:-1])))
+def to_brace(tokens: tc.TokenSeq) -> NestedParse:
+    if tokens[-1].type is not tt.RIGHT_BRACE or len(tokens) < 2:
+        error(tokens[0].line, 'Expect "}" after block.')
+        return stmt.ErrorStmt()
+    stmts = []
+    for span in sp.split_tokens(tokens[1:-1]):
+        result = yield span
+        # As in from_tokens, parsing carries on with the next statement
+        stmts.append(stmt.ErrorStmt() if result.has_error() else result)
+    return stmt.BraceStmt(tuple(stmts))
 
 
-def to_if(tokens: tc.TokenSeq) -> tp.Union[stmt.IfStmt, stmt.ErrorStmt]:
-    paren = next(tu.token_find_index(tokens, {tt.RIGHT_PAREN}), len(tokens))
+def to_if(tokens: tc.TokenSeq) -> NestedParse:
+    tokens = tu.TokenSpan.of(tokens)
+    paren = tu.closing_paren(tokens)
     condition = ep.conditional(tokens[: paren + 1])
     if condition.has_error():
         return stmt.ErrorStmt()
-    else_index = next(tu.token_find_index(tokens, {tt.ELSE}), len(tokens))
-    then_stmt = to_meta_dec(tokens[paren + 1 : else_index])
-    else_stmt = to_meta_dec(tokens[else_index:]) if tokens[else_index:] else None
+    then_bounds = sp.statement_bounds(tokens, paren + 1)
+    then_stmt = yield tokens[then_bounds.start : then_bounds.stop]
+    else_stmt = None
+    if then_bounds.next < len(tokens) and tokens.type(then_bounds.next) is tt.ELSE:
+        else_stmt = yield tokens[then_bounds.next + 1 :]
     return stmt.IfStmt(condition, then_stmt, else_stmt)
 
 
-def to_while(tokens: tc.TokenSeq) -> tp.Union[stmt.WhileStmt, stmt.ErrorStmt]:
-    right_paren = next(tu.token_find_index(tokens, {tt.RIGHT_PAREN}), len(tokens))
+def to_while(tokens: tc.TokenSeq) -> NestedParse:
+    right_paren = tu.closing_paren(tokens)
     condition = ep.conditional(tokens[: right_paren + 1])
     if condition.has_error():
         return stmt.ErrorStmt()
-    body = to_meta_dec(tokens[right_paren + 1 :])
+    body = yield tokens[right_paren + 1 :]
     return stmt.WhileStmt(condition, body)
 
 
@@ -142,38 +182,52 @@ def for_clauses(clauses: tc.TokenSeq) -> ForClausesNT:
     return ForClausesNT(first_clause, second_clause, third_clause)
 
 
-def to_for(tokens: tp.Iterable[tc.Token]) -> ae.Stmt:
-    iter_tokens = iter(tokens)
-    clauses = for_clauses(tuple(sp.parens(iter_tokens)))
+def to_for(tokens: tc.TokenSeq) -> NestedParse:
+    right_paren = tu.closing_paren(tokens)
+    clauses = for_clauses(tokens[: right_paren + 1])
     if clauses.has_error():
         return stmt.ErrorStmt()
-    body = to_meta_dec(tuple(iter_tokens))
-    if clauses.increment is not None:
-        # Not a function, but function_scope is true to prevent the
-        # creation of unnecessary scopes.
-        body = stmt.BraceStmt(
-            (body, stmt.ExprStmt(clauses.increment)), function_scope=True
-        )
-    body = stmt.WhileStmt(clauses.condition or expr.Literal(True), body)
-    body = stmt.BraceStmt((clauses.initializer, body))
-    return body
+    body = yield tokens[right_paren + 1 :]
+    loop = stmt.WhileStmt(
+        clauses.condition or expr.Literal(True), body, clauses.increment
+    )
+    if isinstance(clauses.initializer, stmt.NullStmt):
+        return loop
+    # Not a function, but function_scope is true to prevent the creation of
+    # a scope if no variable is declared in it.
+    return stmt.BraceStmt(
+        (clauses.initializer, loop),
+        function_scope=not isinstance(clauses.initializer, stmt.VarStmt),
+    )
 
 
-def to_fun(
-    tokens: tc.TokenSeq, kind: str,
-) -> tp.Union[stmt.ErrorStmt, stmt.FunctionStmt]:
-    name = tokens[1]
+def to_fun(tokens: tc.TokenSeq, kind: str) -> NestedParse:
+    return function(tokens[1:], kind)
+
+
+def function(tokens: tc.TokenSeq, kind: str, getter: bool = False) -> FunctionParse:
+    """
+    Parses a function starting at its name. Getters have no parameter list.
+    """
+    name = mu.get(tokens, 0, tc.sentinel_token)
     if name.type is not tt.IDENTIFIER:
         error(name.line, f"Expect {kind} name")
         return stmt.ErrorStmt()
-    i_tokens = iter(tokens[1:])
-    parens = tuple(sp.parens(i_tokens))
-    if not tu.paren_check(parens):
-        return stmt.ErrorStmt()
-    arguments = tuple(ep.function_def_args(parens[2:-1]))
-    if any(arg is None for arg in arguments):
-        return stmt.ErrorStmt()
-    body = to_meta_dec(tuple(i_tokens))
+    if getter:
+        arguments: tp.Tuple[tp.Optional[tc.Token], ...] = ()
+        right_paren = 0
+    else:
+        right_paren = tu.closing_paren(tokens)
+        if not tu.paren_check(tokens[: right_paren + 1]):
+            return stmt.ErrorStmt()
+        arguments = tuple(ep.function_def_args(tokens[2:right_paren]))
+        if any(arg is None for arg in arguments):
+            return stmt.ErrorStmt()
+    body_tokens = tu.TokenSpan.of(tokens)[right_paren + 1 :]
+    if lazy and is_braced(body_tokens):
+        lazy_body = stmt.LazyBody(body_tokens)
+        return stmt.FunctionStmt.from_params(arguments, lazy_body, name)  # type: ignore
+    body = yield body_tokens
     if not isinstance(body, stmt.BraceStmt):
         error(name.line, "Expect braced statement after function")
         return stmt.ErrorStmt()
@@ -181,34 +235,66 @@ def to_fun(
     return stmt.FunctionStmt.from_params(arguments, body, name)  # type: ignore
 
 
-def to_return(tokens: tc.TokenSeq) -> stmt.ReturnStmt:
+def is_braced(tokens: tu.TokenSpan) -> bool:
+    """ Whether tokens is a single braced block """
+    return (
+        len(tokens) > 1
+        and tokens.type(0) is tt.LEFT_BRACE
+        and tokens.match(0) == len(tokens) - 1
+    )
+
+
+def check_lazy(statements: tp.Iterable[ae.AbstractExec]) -> bool:
+    """
+    Parses every lazy function body in statements, including nested ones,
+    so their syntax errors are reported. Returns False if there were any.
+    """
+    ok = True
+    nodes = list(statements)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, stmt.LazyBody):
+            ok = not node.parse().has_error() and ok
+        nodes.extend(node.execs)
+    return ok
+
+
+def to_return(tokens: tc.TokenSeq) -> tp.Union[stmt.ReturnStmt, stmt.ErrorStmt]:
+    if not terminated(tokens):
+        error(tokens[-1].line, 'Expect ";" after return value.')
+        return stmt.ErrorStmt()
     nil_expr = [tc.Token(tt.NIL, "nil", lt.nil, tokens[0].line)]
     value = ep.expression(tokens[1:] or nil_expr)
     return stmt.ReturnStmt(tokens[0], value)
 
 
-def to_methods(tokens: tc.TokenSeq) -> tp.Iterator[lc.MethodNT]:
+def to_break(tokens: tc.TokenSeq) -> tp.Union[stmt.BreakStmt, stmt.ErrorStmt]:
+    if len(tokens) > 1 or not terminated(tokens):
+        error(tokens[0].line, 'Expect ";" after "break".')
+        return stmt.ErrorStmt()
+    return stmt.BreakStmt(tokens[0])
+
+
+def to_methods(
+    tokens: tc.TokenSeq,
+) -> tp.Generator[tp.Sequence[tc.Token], ae.Stmt, tp.List[lc.MethodNT]]:
     """ Pseudo statement parsing function to parse class methods. """
-    for method in sp.a_match_braces(tokens):
-        if method.peek().type is tt.CLASS:
-            yield lc.MethodNT(
-                to_fun(tuple(method), "static method"), lc.MethodType.STATIC
-            )
-        elif method[1].type is not tt.LEFT_PAREN:
-            getter_tokens = (
-                tc.sentinel_token,
-                next(method),
-                tc.Token(tt.LEFT_PAREN, "(", None, method[-1].line),
-                tc.Token(tt.RIGHT_PAREN, ")", None, method[-1].line),
-                *method,
-            )
-            yield lc.MethodNT(
-                to_fun(getter_tokens, "getter method",), lc.MethodType.PROPERTY,
-            )
+    tokens = tu.TokenSpan.of(tokens)
+    position = 0
+    methods = []
+    while position < len(tokens):
+        start, stop, position = sp.brace_bounds(tokens, position)
+        method = tokens[start:stop]
+        if method.type(0) is tt.CLASS:
+            parsed = yield from function(method[1:], "static method")
+            methods.append(lc.MethodNT(parsed, lc.MethodType.STATIC))
+        elif len(method) < 2 or method.type(1) is not tt.LEFT_PAREN:
+            parsed = yield from function(method, "getter method", getter=True)
+            methods.append(lc.MethodNT(parsed, lc.MethodType.PROPERTY))
         else:
-            yield lc.MethodNT(
-                to_fun((tc.sentinel_token, *method), "method"), lc.MethodType.BOUND
-            )
+            parsed = yield from function(method, "method")
+            methods.append(lc.MethodNT(parsed, lc.MethodType.BOUND))
+    return methods
 
 
 def filter_methods(tokens: tp.Iterable[lc.MethodNT]) -> tp.Optional[MethodDefaultDict]:
@@ -222,7 +308,7 @@ def filter_methods(tokens: tp.Iterable[lc.MethodNT]) -> tp.Optional[MethodDefaul
     return methods
 
 
-def to_class(tokens: tc.TokenSeq) -> tp.Union[stmt.ClassStmt, stmt.ErrorStmt]:
+def to_class(tokens: tc.TokenSeq) -> NestedParse:
     if mu.get(tokens, 1, tc.sentinel_token).type is not tt.IDENTIFIER:
         error(tokens[0].line, "Expect class name")
         return stmt.ErrorStmt()
@@ -240,13 +326,10 @@ def to_class(tokens: tc.TokenSeq) -> tp.Union[stmt.ClassStmt, stmt.ErrorStmt]:
         error(tokens[2].line, 'Expect "{" before class body')
     # This should be the right brace of the last method declaration or
     # the left_brace starting the class if the class is empty.
-    elif (
-        tokens[-1].type is not tt.RIGHT_BRACE
-        and mu.get(tokens, first_brace, tc.sentinel_token) is not tokens[-1]
-    ):
+    elif tokens[-1].type is not tt.RIGHT_BRACE or first_brace == len(tokens) - 1:
         error(tokens[-1].line, 'Expect "}" after class body')
     else:
-        methods = filter_methods(to_methods(tokens[first_brace + 1 : -1]))
+        methods = filter_methods((yield from to_methods(tokens[first_brace + 1 : -1])))
         if methods is not None:
             return stmt.ClassStmt.from_params(
                 tokens[1],
@@ -267,7 +350,7 @@ PROGRAM_FUNCS: tp.DefaultDict[tc.TokenType, ProgramFunc] = defaultdict(
         tt.PRINT: to_print,
         tt.WHILE: to_while,
         tt.FOR: to_for,
-        tt.BREAK: lambda x: stmt.BreakStmt(x[0]),
+        tt.BREAK: to_break,
         tt.FUN: functools.partial(to_fun, kind="function"),
         tt.RETURN: to_return,
         tt.CLASS: to_class,
@@ -275,24 +358,84 @@ PROGRAM_FUNCS: tp.DefaultDict[tc.TokenType, ProgramFunc] = defaultdict(
 )
 
 
-# TODO: Rename
-def to_meta_dec(tokens: tp.Sequence[tc.Token]) -> ae.Stmt:
+def parse_step(tokens: tp.Sequence[tc.Token]) -> tp.Union[ae.Stmt, NestedParse]:
     if tokens:
-        return PROGRAM_FUNCS[tokens[0].type](tokens)
+        try:
+            return PROGRAM_FUNCS[tokens[0].type](tokens)
+        except RecursionError:
+            return too_deep(tokens)
     return stmt.NullStmt()
 
 
+def too_deep(tokens: tp.Sequence[tc.Token]) -> ae.Stmt:
+    """
+    The expression parser recurses for each level of nesting, so an
+    expression can be nested deeper than Python's stack allows
+    """
+    error(tokens[0].line, "Expression nested too deeply.")
+    return stmt.ErrorStmt()
+
+
+def explain(result: ae.Stmt, tokens: tp.Sequence[tc.Token], reported: int) -> None:
+    """
+    Reports a statement which failed to parse without reporting why, as
+    some of the expression parser's failures don't
+    """
+    if result.has_error() and le.reported == reported and tokens:
+        error(tokens[0].line, f'Invalid syntax in statement starting at "{tokens[0]}".')
+
+
+# TODO: Rename
+def to_meta_dec(tokens: tp.Sequence[tc.Token]) -> ae.Stmt:
+    """
+    Parses a statement. The statements nested in it are parsed with an
+    explicit stack of the generators parsing the statements containing
+    them, so the nesting depth is only bounded by memory. Each is kept with
+    its tokens and the number of errors reported before it was parsed, so
+    every statement which fails is reported.
+    """
+    stack: tp.List[tp.Tuple[NestedParse, tp.Sequence[tc.Token], int]] = []
+    reported = le.reported
+    result = parse_step(tokens)
+    sent: tp.Optional[ae.Stmt]
+    while True:
+        if isinstance(result, types.GeneratorType):
+            stack.append((result, tokens, reported))
+            sent = None
+        else:
+            sent = tp.cast("ae.Stmt", result)
+            explain(sent, tokens, reported)
+            if not stack:
+                return sent
+        parent, tokens, reported = stack[-1]
+        try:
+            # None starts a generator which was just pushed
+            tokens = parent.send(sent)  # type: ignore
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+        except RecursionError:
+            stack.pop()
+            result = too_deep(tokens)
+        else:
+            reported = le.reported
+            result = parse_step(tokens)
+
+
 # TODO: Rename?
 def from_tokens(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[ae.Stmt]:
-    """ Returns an iterator of declarations from a list of tokens."""
-    # if not tu.check_matching(tokens):
-    #     yield stmt.ErrorStmt()
-    #     yield from from_tokens(tuple(tu.synchronize(tokens)))
-    #     return
-    for stmt_tokens in sp.split_tokens(tokens):
-        result = to_meta_dec(tuple(stmt_tokens))
-        if result.has_error():
-            yield stmt.ErrorStmt()
-            yield from from_tokens(tu.synchronize(stmt_tokens))
-        else:
-            yield result
+    """
+    Returns an iterator of declarations from a list of tokens. A statement
+    with a syntax error is replaced by an ErrorStmt and parsing goes on with
+    the next one, which the splitter has already found (see
+    split_tokens.expr_bounds), so every error is reported in one pass.
+    """
+    return map(statement, sp.split_tokens(tokens))
+
+
+def statement(tokens: tp.Sequence[tc.Token]) -> ae.Stmt:
+    """ Parses a single top-level statement as split by split_tokens """
+    result = to_meta_dec(tokens)
+    # The statement was already delimited by the splitter, so parsing
+    # carries on with the next one
+    return stmt.ErrorStmt() if result.has_error() else result
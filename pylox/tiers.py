@@ -0,0 +1,105 @@
+"""
+Tiered execution for the tree engine. Functions and loops are evaluated
+node by node until they have been called or gone round enough times, then
+compiled to closures (see closure_compiler), which later calls and the rest
+of the loop run instead. The closures behave exactly like the nodes, so the
+switch can't be seen except in the time taken and in the stats.
+"""
+from __future__ import annotations
+
+import dataclasses
+import typing as tp
+
+import pylox.token_classes as tc
+
+if tp.TYPE_CHECKING:
+    import pylox.abstract_execs as ae
+    import pylox.functions as fn
+    from pylox import stmt
+
+    Code = tp.Callable[[], tp.Any]
+
+# Set by the command line options (see lox.main). The number of calls of a
+# function and of iterations of a loop after which it is compiled, 0 to
+# never compile it.
+call_threshold = 100
+loop_threshold = 1000
+
+
+class TransitionNT(tp.NamedTuple):
+    kind: str
+    name: str
+    line: tp.Union[int, str]
+    # The calls or iterations run before it was compiled
+    runs: int
+
+
+# The functions and loops compiled, in the order they were
+transitions: tp.List[TransitionNT] = []
+
+
+@dataclasses.dataclass
+class Tier:
+    """
+    How many times a function was called or a loop went round, and the
+    code it was compiled to once that passed the threshold. The copies of
+    a function made for its closures share the tier of its declaration.
+    """
+
+    count: int = 0
+    code: tp.Optional[Code] = None
+
+    def __reduce__(self) -> tp.Tuple[type, tp.Tuple[()]]:
+        # Compiled code can't be pickled, and isn't valid in another process
+        return Tier, ()
+
+
+def first_line(node: ae.AbstractExec) -> tp.Union[int, str]:
+    """ The line of the first token in the node, for the stats """
+    # The nodes use functions, which uses this module as it's imported
+    import pylox.abstract_execs as ae
+
+    for value in vars(node).values():
+        if isinstance(value, tc.Token):
+            return value.line
+        if isinstance(value, ae.AbstractExec):
+            line = first_line(value)
+            if line != "unknown":
+                return line
+    return "unknown"
+
+
+def tier_up_function(function: fn.LoxFunction) -> Code:
+    """ Compiles the function's body, which its closures then run """
+    # The closure compiler uses functions.LoxFunction as it's imported
+    import pylox.closure_compiler as cc
+
+    compiler = cc.Compiler(function.body.environment)
+    with compiler.frame(function.cells):
+        code = function.tier.code = compiler.compile(function.body)
+    line = function.params[0].line if function.params else first_line(function.body)
+    transitions.append(
+        TransitionNT("function", function.name, line, function.tier.count)
+    )
+    return code
+
+
+def tier_up_loop(loop: stmt.WhileStmt) -> Code:
+    """ Compiles the loop, which runs the rest of its iterations """
+    import pylox.closure_compiler as cc
+
+    # Locals are only declared in the blocks of the loop, which compile
+    # their own frames
+    code = loop.tier.code = cc.Compiler(loop.environment).compile(loop)
+    name, line = f"while {loop.condition}", first_line(loop)
+    transitions.append(TransitionNT("loop", name, line, loop.tier.count))
+    return code
+
+
+def report() -> str:
+    """ The tier transitions made, one per line """
+    return "".join(
+        f"[line: {line}] {kind} {name} compiled after {count} "
+        f"{'calls' if kind == 'function' else 'iterations'}\n"
+        for kind, name, line, count in transitions
+    )
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import array
+import sys
+import typing as tp
+
+import pylox.token_classes as tc
+from pylox import const
+from pylox.token_classes import TokenType as tt
+
+if tp.TYPE_CHECKING:
+    import pylox.lox_types as lt
+
+TOKEN_TYPES: tp.Tuple[tc.TokenType, ...] = tuple(tc.TokenType)
+TYPE_CODES: tp.Dict[tc.TokenType, int] = {
+    token_type: code for code, token_type in enumerate(TOKEN_TYPES)
+}
+
+
+def make_token(token_type: tc.TokenType, lexeme: str, line: int) -> tc.Token:
+    """ The token with its literal, and identifiers interned """
+    if token_type is tt.IDENTIFIER:
+        return tc.Token(token_type, sys.intern(lexeme), None, line)
+    literal: tp.Optional[lt.LoxLiteral]
+    if token_type is tt.NUMBER:
+        literal = float(lexeme)
+    elif token_type is tt.STRING:
+        literal = lexeme[1:-1]
+    else:
+        literal = const.VALUE_WORDS.get(lexeme)
+    return tc.Token(token_type, lexeme, literal, line)
+
+
+class TokenBuffer(tp.Sequence[tc.Token]):
+    """
+    Struct of arrays alternative to a list of tokens. Each token is stored
+    as a type code, the start and end offsets of its lexeme in the source and
+    its line. Token objects are only created when they are accessed, with the
+    lexeme sliced out of the source and identifiers interned.
+    """
+
+    __slots__ = ("source", "types", "starts", "ends", "lines")
+    source: str
+    types: array.array[int]
+    starts: array.array[int]
+    ends: array.array[int]
+    lines: array.array[int]
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.types = array.array("B")
+        self.starts = array.array("I")
+        self.ends = array.array("I")
+        self.lines = array.array("I")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} tokens)"
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    @tp.overload
+    def __getitem__(self, index: int) -> tc.Token:
+        ...
+
+    @tp.overload
+    def __getitem__(self, index: slice) -> tp.Tuple[tc.Token, ...]:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(map(self.token, range(*index.indices(len(self)))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TokenBuffer index out of range")
+        return self.token(index)
+
+    def __iter__(self) -> tp.Iterator[tc.Token]:
+        source, token_types = self.source, TOKEN_TYPES
+        columns = zip(self.types, self.starts, self.ends, self.lines)
+        for code, start, end, line in columns:
+            yield make_token(token_types[code], source[start:end], line)
+
+    def type(self, index: int) -> tc.TokenType:
+        return TOKEN_TYPES[self.types[index]]
+
+    def lexeme(self, index: int) -> str:
+        return self.source[self.starts[index] : self.ends[index]]
+
+    def token(self, index: int) -> tc.Token:
+        lexeme = self.source[self.starts[index] : self.ends[index]]
+        return make_token(TOKEN_TYPES[self.types[index]], lexeme, self.lines[index])
+
+    def nbytes(self) -> int:
+        """ The size of the columns in bytes, excluding the source """
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.types, self.starts, self.ends, self.lines)
+        )
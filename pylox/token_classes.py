@@ -51,9 +51,10 @@ class TokenType(str, enum.Enum):
     BREAK = "BREAK"
 
 
-# TODO: Get around dataclass, __slots__ issue?
 @dataclass(frozen=True)
 class Token:
+    # The fields have no defaults, so __slots__ can be declared directly.
+    __slots__ = ("type", "lexeme", "literal", "line")
     type: TokenType
     lexeme: str
     literal: tp.Optional[lt.LoxLiteral]
@@ -62,6 +63,11 @@ class Token:
     def __str__(self) -> str:
         return self.lexeme
 
+    def __reduce__(self) -> tp.Tuple[tp.Type[Token], tp.Tuple[object, ...]]:
+        # The default pickling of slotted classes sets the attributes
+        # directly, which the frozen dataclass forbids.
+        return (type(self), (self.type, self.lexeme, self.literal, self.line))
+
 
 TokenSeq = tp.Sequence[Token]
 sentinel_token = Token(TokenType.EMPTY, "", None, 0)
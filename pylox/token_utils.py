@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import array
 import functools
 import itertools
 import typing as tp
@@ -7,19 +8,248 @@ import typing as tp
 from more_itertools import peekable
 
 import pylox.lox_errors as le
+import pylox.token_buffer as tb
 import pylox.token_classes as tc
-from pylox import const
 from pylox.token_classes import TokenType as tt
 import pylox.misc_utils as mu
 
 error = functools.partial(le.error, error_type=le.ErrorReturns.PARSE_ERROR)
 
 
+class BracketTable:
+    """
+    Bracket information for a whole token sequence, computed in one pass:
+    the index of the matching bracket of every parenthesis and brace (-1 if
+    it is unmatched) and prefix sums of the parenthesis and brace depths.
+    statements caches statement bounds by start index (see split_tokens).
+    """
+
+    __slots__ = ("types", "match", "depths", "statements")
+    types: tp.List[tc.TokenType]
+    match: tp.List[int]
+    depths: tp.Dict[tp.Tuple[tc.TokenType, tc.TokenType], array.array[int]]
+    statements: tp.Dict[int, tp.Tuple[int, int, int, int]]
+
+    def __init__(self, tokens: tc.TokenSeq) -> None:
+        if isinstance(tokens, tb.TokenBuffer):
+            self.types = [tb.TOKEN_TYPES[code] for code in tokens.types]
+        else:
+            self.types = [token.type for token in tokens]
+        self.match = [-1] * len(self.types)
+        self.statements = {}
+        self.depths = {}
+        pairs = ((tt.LEFT_PAREN, tt.RIGHT_PAREN), (tt.LEFT_BRACE, tt.RIGHT_BRACE))
+        for left, right in pairs:
+            depths = array.array("l", [0])
+            depth = 0
+            opened: tp.List[int] = []
+            for i, token_type in enumerate(self.types):
+                if token_type is left:
+                    opened.append(i)
+                    depth += 1
+                elif token_type is right:
+                    if opened:
+                        j = opened.pop()
+                        self.match[i] = j
+                        self.match[j] = i
+                    depth -= 1
+                depths.append(depth)
+            self.depths[left, right] = depths
+
+
+class TokenSpan(tp.Sequence[tc.Token]):
+    """
+    A slice of a token sequence sharing its BracketTable, so bracket
+    matching and statement bounds are answered in constant time for any
+    nested statement. Slicing a span returns another span.
+    """
+
+    __slots__ = ("source", "tokens", "table", "start", "stop")
+    source: tc.TokenSeq
+    # Tokens are only built from the source (e.g a TokenBuffer) when they are
+    # first used and are shared with every other span of the source.
+    tokens: tp.List[tp.Optional[tc.Token]]
+    table: BracketTable
+    start: int
+    stop: int
+
+    def __init__(
+        self,
+        source: tc.TokenSeq,
+        tokens: tp.List[tp.Optional[tc.Token]],
+        table: BracketTable,
+        start: int,
+        stop: int,
+    ) -> None:
+        self.source = source
+        self.tokens = tokens
+        self.table = table
+        self.start = start
+        self.stop = stop
+
+    @classmethod
+    def of(cls, tokens: tp.Iterable[tc.Token]) -> TokenSpan:
+        if isinstance(tokens, TokenSpan):
+            return tokens
+        if not isinstance(tokens, tp.Sequence):
+            tokens = tuple(tokens)
+        if isinstance(tokens, tb.TokenBuffer):
+            views: tp.List[tp.Optional[tc.Token]] = [None] * len(tokens)
+        else:
+            views = list(tokens)
+        return cls(tokens, views, BracketTable(tokens), 0, len(tokens))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({token_str(self)!r})"
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @tp.overload
+    def __getitem__(self, index: int) -> tc.Token:
+        ...
+
+    @tp.overload
+    def __getitem__(self, index: slice) -> TokenSpan:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("TokenSpan slices cannot have a step")
+            stop = max(start, stop)
+            return TokenSpan(
+                self.source,
+                self.tokens,
+                self.table,
+                self.start + start,
+                self.start + stop,
+            )
+        length = self.stop - self.start
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("TokenSpan index out of range")
+        index += self.start
+        token = self.tokens[index]
+        if token is None:
+            token = self.tokens[index] = self.source[index]
+        return token
+
+    def __iter__(self) -> tp.Iterator[tc.Token]:
+        return iter(self.tuple())
+
+    def tuple(self) -> tp.Tuple[tc.Token, ...]:
+        tokens = self.tokens[self.start : self.stop]
+        if None in tokens:
+            for i in range(self.start, self.stop):
+                if self.tokens[i] is None:
+                    self.tokens[i] = self.source[i]
+            tokens = self.tokens[self.start : self.stop]
+        return tuple(tokens)  # type: ignore
+
+    def type(self, index: int) -> tc.TokenType:
+        return self.table.types[self.start + index]
+
+    def match(self, index: int) -> int:
+        """ The index of the bracket matching the one at index, or -1 """
+        match = self.table.match[self.start + index]
+        return match - self.start if self.start <= match < self.stop else -1
+
+    def find(self, token_type: tc.TokenType, index: int = 0) -> int:
+        """ The index of the first token_type from index, or len(self) """
+        try:
+            return (
+                self.table.types.index(token_type, self.start + index, self.stop)
+                - self.start
+            )
+        except ValueError:
+            return len(self)
+
+    def find_any(
+        self,
+        token_types: tp.AbstractSet[tc.TokenType],
+        index: int = 0,
+        stop: tp.Optional[int] = None,
+    ) -> int:
+        """ The index of the first of token_types in [index, stop), or stop """
+        stop = len(self) if stop is None else stop
+        types = self.table.types
+        if token_types.isdisjoint(types[self.start + index : self.start + stop]):
+            return stop
+        return next(
+            i for i in range(index, stop) if types[self.start + i] in token_types
+        )
+
+    def next_type(self) -> tp.Optional[tc.TokenType]:
+        """ The type of the token following the span, None at the end """
+        if self.stop < len(self.table.types):
+            return self.table.types[self.stop]
+        return None
+
+    def with_next(self) -> TokenSpan:
+        """ The span extended by the token following it, if there is one """
+        stop = min(self.stop + 1, len(self.table.types))
+        return TokenSpan(self.source, self.tokens, self.table, self.start, stop)
+
+    def balance(self, left: tc.TokenType, right: tc.TokenType) -> tp.Optional[int]:
+        """
+        The number of left tokens minus the number of right tokens or None if
+        the pair is not tracked.
+        """
+        depths = self.table.depths.get((left, right))
+        if depths is not None:
+            return depths[self.stop] - depths[self.start]
+        depths = self.table.depths.get((right, left))
+        if depths is not None:
+            return depths[self.start] - depths[self.stop]
+        return None
+
+
+def closing_paren(tokens: tc.TokenSeq, index: int = 1) -> int:
+    """
+    Returns the index of the parenthesis closing the one at index or, if
+    there is no matching one, of the first right parenthesis after it or
+    len(tokens) if there is none. Other sequences than spans are scanned
+    from index instead of building a BracketTable of them for one lookup.
+    """
+    if not isinstance(tokens, TokenSpan):
+        return scan_closing_paren(tokens, index)
+    if index < len(tokens) and tokens.type(index) is tt.LEFT_PAREN:
+        match = tokens.match(index)
+        if match >= 0:
+            return match
+    return tokens.find(tt.RIGHT_PAREN, index)
+
+
+def scan_closing_paren(tokens: tc.TokenSeq, index: int) -> int:
+    types = [token.type for token in tokens[index:]]
+    if types and types[0] is tt.LEFT_PAREN:
+        depth = 0
+        for i, token_type in enumerate(types):
+            if token_type is tt.LEFT_PAREN:
+                depth += 1
+            elif token_type is tt.RIGHT_PAREN:
+                depth -= 1
+                if depth == 0:
+                    return index + i
+    if tt.RIGHT_PAREN in types:
+        return index + types.index(tt.RIGHT_PAREN)
+    return len(tokens)
+
+
 def token_find_gen_ignore_first(
     tokens: tp.Iterable[tc.Token], token_types: tp.Container[tc.TokenType]
 ) -> tp.Iterator[int]:
     found_token = False
+    expected = 0
     for i, token in non_parens(tokens):
+        # The indexes non_parens skipped were a parenthesised group, which is
+        # an operand like any other token
+        if i != expected:
+            found_token = True
+        expected = i + 1
         if found_token and token.type in token_types:
             found_token = False
             yield i
@@ -41,7 +271,11 @@ def matched_paren(
     left: tc.TokenType = tt.LEFT_PAREN,
     right: tc.TokenType = tt.RIGHT_PAREN,
 ) -> Matched:
-    paren_level = sum({left: 1, right: -1}.get(token.type, 0) for token in tokens)
+    paren_level = None
+    if isinstance(tokens, TokenSpan):
+        paren_level = tokens.balance(left, right)
+    if paren_level is None:
+        paren_level = sum({left: 1, right: -1}.get(token.type, 0) for token in tokens)
     if paren_level > 0:
         return "left"
     if paren_level < 0:
@@ -59,8 +293,26 @@ class EnumeratedTokensNT(tp.NamedTuple):
 
 
 def non_parens(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[EnumeratedTokensNT]:
+    start = 0
+    if isinstance(tokens, TokenSpan):
+        # Jump over matched parentheses, falling back to counting the levels
+        # from the first unmatched one.
+        length = len(tokens)
+        while start < length:
+            token_type = tokens.type(start)
+            if token_type is tt.LEFT_PAREN:
+                match = tokens.match(start)
+                if match < 0:
+                    break
+                start = match + 1
+            elif token_type is tt.RIGHT_PAREN:
+                break
+            else:
+                yield EnumeratedTokensNT(start, tokens[start])
+                start += 1
+        tokens = tokens[start:]
     paren_level = 0
-    for i, token in enumerate(tokens):
+    for i, token in enumerate(tokens, start):
         if token.type is tt.RIGHT_PAREN:
             paren_level += 1
         elif token.type is tt.LEFT_PAREN:
@@ -69,14 +321,6 @@ def non_parens(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[EnumeratedTokensNT]
             yield EnumeratedTokensNT(i, token)
 
 
-def synchronize(tokens: tp.Iterable[tc.Token]) -> tp.Iterator[tc.Token]:
-    iter_tokens = iter(tokens)
-    for token in iter_tokens:
-        if token.type in const.SYNC_TOKENS:
-            return iter_tokens
-    return iter_tokens
-
-
 MATCH_PARENS: tp.Tuple[tp.Tuple[tc.TokenType, tc.TokenType], ...] = (
     (tt.LEFT_PAREN, tt.RIGHT_PAREN),
     (tt.RIGHT_BRACE, tt.LEFT_BRACE),
@@ -0,0 +1,5 @@
+"""
+An engine translating Lox to Python source (see interpreter.ENGINES). The
+generator writes each resolved function as a Python function, compiled
+with compile() and run with the Lox semantics of the helpers in runtime.
+"""
@@ -0,0 +1,627 @@
+"""
+Translates resolved trees to Python source, which is compiled with compile()
+and run by CPython itself. Each function is written as a factory taking the
+cells of its upvalues and returning a Python function, whose locals are the
+function's Lox locals: a local is named after its variable and its slot in
+the function's frame, so blocks reusing a slot reuse the name.
+
+Expressions are written as a statement per operation, storing the result in
+a temporary, so each operation can try Python's own operator and fall back
+to the Lox one (see runtime) on a line of its own, and so every generated
+line comes from a single Lox line, which runtime errors are reported at.
+"""
+from __future__ import annotations
+
+import hashlib
+import linecache
+import math
+import types
+import typing as tp
+
+import pylox.abstract_execs as ae
+import pylox.enviroment as env
+import pylox.lox_errors as le
+import pylox.lox_types as lt
+from pylox import expr, results, stmt
+from pylox.token_classes import TokenType as tt
+from pylox.transpiler import runtime
+
+if tp.TYPE_CHECKING:
+    import pylox.functions as fn
+
+# The Python operator of each Lox operator, only == and != can't fail
+BINARY_OPERATORS: tp.Final = {
+    tt.EQUAL_EQUAL: "==",
+    tt.BANG_EQUAL: "!=",
+    tt.GREATER: ">",
+    tt.GREATER_EQUAL: ">=",
+    tt.LESS: "<",
+    tt.LESS_EQUAL: "<=",
+    tt.PLUS: "+",
+    tt.MINUS: "-",
+    tt.STAR: "*",
+    tt.SLASH: "/",
+}
+INDENT: tp.Final = "    "
+
+# The compiled code of each generated module by the hash of its source and
+# line numbers, as running a program again generates the same source, and
+# the Lox line of each line of the code and the Lox function it is by its
+# file name. The code is only cached for the life of the process, so it is
+# reused when a program is run again (in the REPL, by a benchmark, ...) but
+# not across runs of pylox, which the AST cache (see ast_cache) is for.
+code_cache: tp.Dict[str, types.CodeType] = {}
+lox_lines: tp.Dict[str, tp.Sequence[int]] = {}
+lox_names: tp.Dict[str, str] = {}
+
+
+def compile_tree(tree: tp.Iterable[ae.AbstractExec]) -> tp.Iterator[Script]:
+    """ Translates the top-level statements, each one just before it is run """
+    for node in tree:
+        function = runtime.Function("script", (), None)
+        generator = Generator(function)
+        try:
+            generator.compile(node)
+            code = generator.build()
+        except RecursionError:
+            raise le.LoxRuntimeError(message=le.TOO_DEEP) from None
+        yield Script(code())
+
+
+class Script:
+    """ A translated top-level statement, run like AbstractExec.interpret """
+
+    __slots__ = ("code",)
+
+    def __init__(self, code: tp.Callable[[], None]) -> None:
+        self.code = code
+
+    def interpret(self) -> results.ResultNT:
+        try:
+            self.code()
+            return results.ResultNT(None)
+        except le.LoxRuntimeError as lre:
+            unwind(lre, lre.__traceback__)
+            lre.error()
+        except RecursionError as exc:
+            overflow = le.LoxRuntimeError(message="Stack overflow.")
+            unwind(overflow, exc.__traceback__)
+            overflow.error()
+        return results.ResultNT(None, le.ErrorReturns.RUNTIME_ERROR)
+
+
+def unwind(
+    lre: le.LoxRuntimeError, traceback: tp.Optional[types.TracebackType]
+) -> None:
+    """
+    Adds the generated functions in the traceback to the error's trace, and
+    if its line is unknown puts it at the Lox line of the innermost one
+    """
+    frames = []
+    while traceback is not None:
+        filename = traceback.tb_frame.f_code.co_filename
+        lines = lox_lines.get(filename)
+        if lines is not None:
+            line = lines[traceback.tb_lineno - 1]
+            frames.append(le.TraceNT(lox_names[filename], line))
+        traceback = traceback.tb_next
+    if frames and lre.line == "unknown":
+        lre.line = frames[-1].line
+    for name, frame_line in reversed(frames):
+        lre.unwind(name, frame_line)
+
+
+def compile_source(source: str, lines: tp.Sequence[int], name: str) -> types.CodeType:
+    """
+    Compiles the generated source, or returns the code it was compiled to
+    earlier in this process
+    """
+    digest = hashlib.sha1(f"{source}{lines}".encode()).hexdigest()
+    code = code_cache.get(digest)
+    if code is None:
+        filename = f"<lox {digest[:16]}>"
+        try:
+            code = code_cache[digest] = compile(source, filename, "exec")
+        except (SyntaxError, MemoryError) as exc:
+            # CPython limits how deeply blocks can be indented and nested
+            raise RecursionError from exc
+        lox_lines[filename] = lines
+        lox_names[filename] = name
+        # Shows the generated source in Python tracebacks
+        linecache.cache[filename] = (
+            len(source),
+            None,
+            source.splitlines(True),
+            filename,
+        )
+    return code
+
+
+def compile_function(function: runtime.Function) -> None:
+    """ Translates the function's body, parsing and resolving it if it's lazy """
+    declaration = function.declaration
+    assert declaration is not None, "Top-level statements are compiled by script"
+    body, size, cells = declaration.body, declaration.frame_size, declaration.cells
+    if isinstance(body, stmt.LazyBody):
+        # Forcing the body can print syntax errors and fail, like calling it does
+        lazy, body = body, body.force()
+        size, cells = lazy.frame_size, tuple(sorted({*cells, *lazy.cells}))
+    generator = Generator(function, len(declaration.upvalues), size)
+    if isinstance(body, stmt.BraceStmt):
+        generator.declare(body.stmts)
+    generator.make_cells(cells)
+    try:
+        generator.compile(body)
+        function.factory = generator.build()
+    except RecursionError:
+        raise le.LoxRuntimeError(message=le.TOO_DEEP) from None
+
+
+def declarations(stmts: tp.Iterable[ae.Stmt]) -> tp.Iterator[tp.Tuple[int, str]]:
+    """ The slot and name of each local declared directly in a block """
+    for node in stmts:
+        if isinstance(node, stmt.VarStmt) and node.slot is not None:
+            yield node.slot, node.name.lexeme
+        elif isinstance(node, stmt.FunctionStmt) and node.slot is not None:
+            yield node.slot, node.function.name
+        elif isinstance(node, stmt.ClassStmt) and node.slot is not None:
+            yield node.slot, node.lox_class.name
+
+
+def pure(node: ae.Expr) -> bool:
+    """
+    Whether evaluating the expression can't fail or have side effects, so
+    the values of the operands before it can't change while it's evaluated
+    """
+    while isinstance(node, expr.Grouping):
+        node = node.expression
+    if isinstance(node, expr.Literal):
+        return True
+    return isinstance(node, expr.Variable) and node.distance != -1
+
+
+class Generator:
+    """
+    Writes the Python source of one function. offsets are the first slot of
+    the frame of each block being written, names the Python name of each
+    slot of the function's frame and cells the slots holding cells.
+    """
+
+    def __init__(
+        self, function: runtime.Function, upvalues: int = 0, size: int = 0
+    ) -> None:
+        self.function = function
+        self.source: tp.List[str] = []
+        self.lines: tp.List[int] = []
+        self.constants: tp.List[tp.Any] = []
+        self.offsets = [0]
+        self.top = size
+        self.names: tp.Dict[int, str] = {}
+        self.cells: tp.Set[int] = set()
+        self.temporaries = 0
+        # The values which can't change until they're used: literals and
+        # temporaries
+        self.stable: tp.Set[str] = set()
+        self.literals: tp.Set[str] = set()
+        self.depth = 0
+        self.line = function.params[0].line if function.params else 0
+        self.globals = ae.AbstractExec.environment.globals
+        # The values bound to the function come first, so they can be bound
+        # with functools.partial
+        bound = enumerate(function.bound, len(function.params))
+        params = ", ".join(
+            [self.declare_slot(slot, name) for slot, name in bound]
+            + [self.declare_slot(i, x.lexeme) for i, x in enumerate(function.params)]
+        )
+        self.emit(f"def factory({', '.join(f'u{i}' for i in range(upvalues))}):")
+        self.depth += 1
+        self.emit(f"def {self.python_name(function.name)}_fn({params}):")
+        self.depth += 1
+
+    def emit(self, text: str, line: tp.Optional[int] = None) -> None:
+        if line is not None:
+            self.line = line
+        self.source.append(f"{INDENT * self.depth}{text}")
+        self.lines.append(self.line)
+
+    def constant(self, value: tp.Any) -> str:
+        self.constants.append(value)
+        return f"K{len(self.constants) - 1}"
+
+    def temporary(self, value: tp.Optional[str] = None) -> str:
+        """ A new temporary, set to the value if one is given """
+        name = f"t{self.temporaries}"
+        self.temporaries += 1
+        self.stable.add(name)
+        if value is not None:
+            self.emit(f"{name} = {value}")
+        return name
+
+    def truth(self, value: str) -> str:
+        """ lox_true of the value, without calling it for booleans """
+        if value in self.literals:
+            # Python warns about literals compared with "is"
+            value = self.temporary(value)
+        return f"{value} is True or {value} is not False and lox_true({value})"
+
+    def keep(self, value: str) -> str:
+        """ The value, copied to a temporary if it could change before it's used """
+        return value if value in self.stable else self.temporary(value)
+
+    def build(self) -> tp.Callable[..., tp.Any]:
+        """ Returns from the function, then compiles the module and runs it """
+        declaration = self.function.declaration
+        if declaration is not None and declaration.is_initializer:
+            self.return_this()
+        elif declaration is not None:
+            self.emit("return nil")
+        self.depth -= 1
+        self.emit(f"return {self.python_name(self.function.name)}_fn")
+        source = "\n".join(self.source) + "\n"
+        code = compile_source(source, self.lines, self.function.name)
+        namespace = dict(runtime.NAMESPACE, G=self.globals)
+        namespace.update((f"K{i}", value) for i, value in enumerate(self.constants))
+        exec(code, namespace)
+        return namespace["factory"]
+
+    def return_this(self) -> None:
+        """ Initializers return "this", which comes after the parameters """
+        this = self.local(0, len(self.function.params))
+        self.emit(f"return {this}")
+
+    def compile(self, node: ae.AbstractExec) -> tp.Any:
+        return getattr(self, f"compile_{node.kind}")(node)
+
+    def suite(self, node: ae.AbstractExec) -> None:
+        """ Writes the node as the indented block of a compound statement """
+        self.depth += 1
+        length = len(self.source)
+        self.compile(node)
+        if len(self.source) == length:
+            self.emit("pass")
+        self.depth -= 1
+
+    @staticmethod
+    def python_name(name: str) -> str:
+        return name if name.isidentifier() else "lox"
+
+    def declare_slot(self, slot: int, name: str) -> str:
+        """ Names the slot of the function's frame after the local in it """
+        self.names[slot] = f"{self.python_name(name)}_{slot}"
+        return self.names[slot]
+
+    def declare(self, stmts: tp.Iterable[ae.Stmt]) -> None:
+        """ Names the slots of the locals declared directly in the block """
+        for slot, name in declarations(stmts):
+            self.declare_slot(self.offsets[-1] + slot, name)
+
+    def make_cells(self, slots: tp.Iterable[int]) -> None:
+        """ Puts the slots of the function's frame used by nested ones in cells """
+        bound = len(self.function.params) + len(self.function.bound)
+        for slot in slots:
+            self.cells.add(slot)
+            name = self.local(0, slot)
+            self.emit(f"{name} = Cell({name if slot < bound else 'nil'})")
+
+    def local(self, distance: int, slot: int) -> str:
+        """ The Python name of the local in a block's slot """
+        slot += self.offsets[-1 - distance]
+        name = self.names.get(slot)
+        if name is None:
+            name = self.declare_slot(slot, "local")
+        return name
+
+    def global_slot(self, name: str) -> int:
+        """ The slot of a global, made in advance so it can be indexed directly """
+        slot = env.global_slot(name)
+        if slot >= len(self.globals):
+            self.globals.extend([env.UNDEFINED] * (slot + 1 - len(self.globals)))
+        return slot
+
+    def defined(self, slot: int) -> bool:
+        """ Whether the global is defined, which it will stay once it is """
+        return self.globals[slot] is not env.UNDEFINED
+
+    def define(self, name: str, slot: tp.Optional[int], value: str) -> None:
+        if slot is None:
+            self.emit(f"G[{self.global_slot(name)}] = {value}")
+            return
+        local = self.local(0, slot)
+        if slot + self.offsets[-1] in self.cells:
+            self.emit(f"{local}.value = {value}")
+        else:
+            self.emit(f"{local} = {value}")
+
+    def operands(self, nodes: tp.Sequence[ae.Expr]) -> tp.List[str]:
+        """ The values of the expressions, evaluated in order """
+        values = []
+        for index, node in enumerate(nodes):
+            value = self.compile(node)
+            if not all(pure(later) for later in nodes[index + 1 :]):
+                value = self.keep(value)
+            values.append(value)
+        return values
+
+    def function_template(
+        self, declaration: fn.LoxFunction, bound: tp.Tuple[str, ...] = ()
+    ) -> str:
+        """ A closure of the function, capturing its upvalues from this one """
+        cells = "".join(
+            f"{self.local(depth, index)}, " if is_local else f"u{index}, "
+            for is_local, depth, index in declaration.upvalues
+        )
+        function = runtime.Function(
+            declaration.name, declaration.params, declaration, bound
+        )
+        return f"Closure({self.constant(function)}, ({cells}))"
+
+    # Expressions
+
+    def compile_Literal(self, node: expr.Literal) -> str:
+        value = node.value
+        if value is lt.nil:
+            return "nil"
+        if isinstance(value, float) and not math.isfinite(value):
+            return self.constant(value)
+        literal = repr(value)
+        self.stable.add(literal)
+        self.literals.add(literal)
+        return literal
+
+    def compile_Grouping(self, node: expr.Grouping) -> str:
+        return self.compile(node.expression)
+
+    def compile_Variable(self, node: ae.VarExpr) -> str:
+        distance, name = node.distance, node.name
+        self.line = name.line
+        if distance == -1:
+            slot = self.global_slot(name.lexeme)
+            if self.defined(slot):
+                return f"G[{slot}]"
+            value = self.temporary(f"G[{slot}]")
+            self.emit(f"if {value} is UNDEFINED: undefined({name.lexeme!r})")
+            return value
+        if distance == env.UPVALUE:
+            return f"u{node.slot}.value"
+        local = self.local(distance, node.slot)
+        return f"{local}.value" if node.cell else local
+
+    def compile_Assign(self, node: expr.Assign) -> str:
+        value = self.compile(node.value)
+        distance, name = node.distance, node.name
+        self.line = name.line
+        if distance == -1:
+            slot = self.global_slot(name.lexeme)
+            if not self.defined(slot):
+                self.emit(f"if G[{slot}] is UNDEFINED: undefined({name.lexeme!r})")
+            self.emit(f"G[{slot}] = {value}")
+        elif distance == env.UPVALUE:
+            self.emit(f"u{node.slot}.value = {value}")
+        else:
+            local = self.local(distance, node.slot)
+            self.emit(f"{local}.value = {value}" if node.cell else f"{local} = {value}")
+        return value
+
+    def compile_Binary(self, node: expr.Binary) -> str:
+        left, right = self.operands((node.left, node.right))
+        operator = node.operator
+        python = f"{left} {BINARY_OPERATORS[operator.type]} {right}"
+        result = self.temporary()
+        if operator.type is tt.EQUAL_EQUAL or operator.type is tt.BANG_EQUAL:
+            self.emit(f"{result} = {python}", operator.line)
+            return result
+        self.emit(f"try: {result} = {python}", operator.line)
+        self.emit(
+            f"except OperatorError: "
+            f"{result} = binary({operator.lexeme!r}, {left}, {right})"
+        )
+        return result
+
+    def compile_Unary(self, node: expr.Unary) -> str:
+        right = self.compile(node.right)
+        operator = node.operator
+        result = self.temporary()
+        if operator.type is tt.BANG:
+            python = f"not ({self.truth(right)})"
+        else:
+            python = f"-{right}"
+        self.emit(f"try: {result} = {python}", operator.line)
+        self.emit(f"except TypeError: {result} = unary({operator.lexeme!r}, {right})")
+        return result
+
+    def compile_Logical(self, node: expr.Logical) -> str:
+        result = self.temporary(self.compile(node.left))
+        if node.operator.type is tt.OR:
+            self.emit(f"if not ({self.truth(result)}):", node.operator.line)
+        else:
+            self.emit(f"if {self.truth(result)}:", node.operator.line)
+        self.depth += 1
+        self.emit(f"{result} = {self.compile(node.right)}")
+        self.depth -= 1
+        return result
+
+    def compile_Call(self, node: expr.Call) -> str:
+        callee, arguments = node.callee, node.arguments
+        arguments_pure = all(pure(argument) for argument in arguments)
+        if isinstance(callee, expr.Get) and arguments_pure:
+            # Looks the method up after evaluating the arguments, which only
+            # changes what happens if they can fail or have side effects
+            values = [self.compile(callee.object)]
+            values += [repr(callee.name.lexeme)]
+            values += (self.compile(argument) for argument in arguments)
+            result = self.temporary()
+            self.emit(f"{result} = invoke({', '.join(values)})", node.paren.line)
+            return result
+        function = self.compile(callee)
+        if not function.isidentifier() or not arguments_pure:
+            function = self.keep(function)
+        if not arguments_pure:
+            self.emit(f"check_callable({function})", node.paren.line)
+        operands = ", ".join(self.operands(arguments))
+        result = self.temporary()
+        self.emit(
+            f"if {function}.__class__ is Closure and {function}.arity == "
+            f"{len(arguments)}: {result} = ({function}.code or {function}.make())"
+            f"({operands})",
+            node.paren.line,
+        )
+        separator = ", " if operands else ""
+        self.emit(f"else: {result} = call({function}{separator}{operands})")
+        # The closure may end in a tail call, which is made here
+        self.emit(f"if {result}.__class__ is TailCall: {result} = tail_calls({result})")
+        return result
+
+    def tail_call(self, node: expr.Call) -> None:
+        """
+        Returns the call of a closure for the caller to make instead of
+        making it, so tail calls don't grow Python's stack (see runtime.TailCall)
+        """
+        function = self.compile(node.callee)
+        arguments = node.arguments
+        if not function.isidentifier() or not all(map(pure, arguments)):
+            function = self.keep(function)
+        if not all(map(pure, arguments)):
+            self.emit(f"check_callable({function})", node.paren.line)
+        values = ", ".join(self.operands(arguments))
+        self.emit(
+            f"if {function}.__class__ is Closure and {function}.arity == "
+            f"{len(arguments)}: return TailCall({function}.code or "
+            f"{function}.make(), ({values}{',' if values else ''}))",
+            node.paren.line,
+        )
+        self.emit(f"return call({function}{', ' if values else ''}{values})")
+
+    def compile_Get(self, node: expr.Get) -> str:
+        instance = self.compile(node.object)
+        if instance in self.literals:
+            instance = self.temporary(instance)
+        name = repr(node.name.lexeme)
+        result = self.temporary()
+        self.emit(f"try: {result} = {instance}.fields[{name}]", node.name.line)
+        self.emit(
+            f"except (AttributeError, KeyError): {result} = get({instance}, {name})"
+        )
+        return result
+
+    def compile_Set(self, node: expr.Set) -> str:
+        name = node.assignee.name
+        instance = self.compile(node.assignee.object)
+        if not pure(node.value):
+            instance = self.keep(instance)
+            self.emit(f"check_fields({instance})", name.line)
+        value = self.compile(node.value)
+        self.emit(
+            f"if {instance}.__class__ is not LoxInstance: check_fields({instance})",
+            name.line,
+        )
+        self.emit(f"{instance}.fields[{name.lexeme!r}] = {value}")
+        return value
+
+    def compile_Super(self, node: expr.Super) -> str:
+        if node.this is None:
+            return self.compile_error(node)
+        this = self.compile(node.this)
+        super_class = self.compile_Variable(node)
+        method = node.method
+        result = self.temporary()
+        self.emit(
+            f"{result} = get_super({super_class}, {this}, {method.lexeme!r})",
+            method.line,
+        )
+        return result
+
+    def compile_error(self, node: ae.AbstractExec) -> str:
+        self.emit("error()")
+        return "nil"
+
+    compile_ErrorExpr = compile_ErrorStmt = compile_error
+
+    # Statements
+
+    def compile_ExprStmt(self, node: stmt.ExprStmt) -> None:
+        self.compile(node.expression)
+
+    def compile_PrintStmt(self, node: stmt.PrintStmt) -> None:
+        self.emit(f"print(lox_str({self.compile(node.expression)}))")
+
+    def compile_VarStmt(self, node: stmt.VarStmt) -> None:
+        self.line = node.name.line
+        value = "nil" if node.initializer is None else self.compile(node.initializer)
+        self.define(node.name.lexeme, node.slot, value)
+
+    def compile_BraceStmt(self, node: stmt.BraceStmt) -> None:
+        if not node.new_frame:
+            for statement in node.stmts:
+                self.compile(statement)
+            return
+        top, cells = self.top, set(self.cells)
+        self.offsets.append(top)
+        self.top += node.frame_size
+        self.declare(node.stmts)
+        for slot in node.cells:
+            self.cells.add(top + slot)
+            # A new cell each time the block runs, e.g. for each iteration
+            self.emit(f"{self.local(0, slot)} = Cell(nil)")
+        for statement in node.stmts:
+            self.compile(statement)
+        self.offsets.pop()
+        self.top, self.cells = top, cells
+
+    def compile_IfStmt(self, node: stmt.IfStmt) -> None:
+        self.emit(f"if {self.truth(self.compile(node.condition))}:")
+        self.suite(node.then_branch)
+        if node.else_branch is not None:
+            self.emit("else:")
+            self.suite(node.else_branch)
+
+    def compile_WhileStmt(self, node: stmt.WhileStmt) -> None:
+        self.emit("while True:")
+        self.depth += 1
+        self.emit(f"if not ({self.truth(self.compile(node.condition))}): break")
+        self.compile(node.body)
+        if node.increment is not None:
+            self.compile(node.increment)
+        self.depth -= 1
+
+    def compile_NullStmt(self, node: stmt.NullStmt) -> None:
+        pass
+
+    def compile_BreakStmt(self, node: stmt.BreakStmt) -> None:
+        # The resolver only allows breaks in a loop of the same function
+        self.emit("break", node.token.line)
+
+    def compile_ReturnStmt(self, node: stmt.ReturnStmt) -> None:
+        self.line = node.keyword.line
+        declaration = self.function.declaration
+        if declaration is not None and declaration.is_initializer:
+            self.return_this()
+            return
+        if isinstance(node.value, expr.Call) and node.value.tail:
+            self.tail_call(node.value)
+            return
+        self.emit(f"return {self.compile(node.value)}")
+
+    def compile_FunctionStmt(self, node: stmt.FunctionStmt) -> None:
+        closure = self.function_template(node.function)
+        self.define(node.function.name, node.slot, closure)
+
+    def compile_ClassStmt(self, node: stmt.ClassStmt) -> None:
+        declared = node.lox_class
+        super_class = "None"
+        bound: tp.Tuple[str, ...] = ("this",)
+        if node.super_class_var is not None:
+            super_class = self.compile(node.super_class_var)
+            bound = ("this", "super")
+        tables = (declared.methods, declared.static_methods, declared.getters)
+        closures = (
+            "{%s}"
+            % ", ".join(
+                f"{name!r}: {self.function_template(method, bound)}"
+                for name, method in table.items()
+            )
+            for table in tables
+        )
+        lox_class = self.temporary(
+            f"make_class({declared.name!r}, {super_class}, {', '.join(closures)})"
+        )
+        self.define(declared.name, node.slot, lox_class)
@@ -0,0 +1,291 @@
+"""
+The values and helpers the generated Python code runs with. The generated
+code inlines the common case of each operation and calls a helper for the
+rest, and the helpers raise their errors at the line "unknown": the Lox
+line is found from the generated line they were called from instead (see
+generator.unwind).
+"""
+from __future__ import annotations
+
+import dataclasses
+import functools
+import typing as tp
+
+import pylox.enviroment as env
+import pylox.lox_class as lc
+import pylox.lox_errors as le
+import pylox.lox_eval as lev
+import pylox.lox_types as lt
+import pylox.lox_utils as lu
+import pylox.token_classes as tc
+from pylox.token_classes import TokenType as tt
+
+if tp.TYPE_CHECKING:
+    import pylox.functions as fn
+
+# The token type of each operator, by its lexeme
+BINARY_TYPES: tp.Final = {
+    "==": tt.EQUAL_EQUAL,
+    "!=": tt.BANG_EQUAL,
+    ">": tt.GREATER,
+    ">=": tt.GREATER_EQUAL,
+    "<": tt.LESS,
+    "<=": tt.LESS_EQUAL,
+    "+": tt.PLUS,
+    "-": tt.MINUS,
+    "*": tt.STAR,
+    "/": tt.SLASH,
+}
+UNARY_TYPES: tp.Final = {"!": tt.BANG, "-": tt.MINUS}
+
+
+@dataclasses.dataclass(eq=False)
+class Function:
+    """
+    A function as declared, compiled to Python the first time it's called.
+    factory takes the cells of its upvalues and returns the Python function,
+    whose parameters are the values bound to it, e.g. "this", then its own.
+    """
+
+    name: str
+    params: tp.Sequence[tc.Token]
+    # The function to compile, None for a top-level statement
+    declaration: tp.Optional[fn.LoxFunction]
+    # The names of the values bound to it, "this" and "super" for methods
+    bound: tp.Tuple[str, ...] = ()
+    factory: tp.Optional[tp.Callable[..., tp.Callable]] = dataclasses.field(
+        default=None, repr=False
+    )
+
+    def __str__(self) -> str:
+        params = ", ".join(x.lexeme for x in self.params)
+        return f"<fn {self.name}({params})>"
+
+
+class Closure(lt.LoxCallable):
+    """
+    A function with the cells of its upvalues and the values bound to it.
+    code is its Python function, made when it's first called.
+    """
+
+    __slots__ = ("function", "cells", "bound", "arity", "code")
+    function: Function
+    cells: tp.Tuple[env.Cell, ...]
+    bound: tp.Tuple[lt.LoxLiteral, ...]
+    arity: int  # type: ignore
+    code: tp.Optional[tp.Callable[..., lt.LoxLiteral]]
+
+    def __init__(
+        self,
+        function: Function,
+        cells: tp.Tuple[env.Cell, ...],
+        bound: tp.Tuple[lt.LoxLiteral, ...] = (),
+    ) -> None:
+        self.function = function
+        self.cells = cells
+        self.bound = bound
+        self.arity = len(function.params)
+        self.code = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.function!r})"
+
+    def __str__(self) -> str:
+        return str(self.function)
+
+    @property
+    def name(self) -> str:  # type: ignore
+        return self.function.name
+
+    def bind(self, *bound: lt.LoxLiteral) -> Closure:
+        return Closure(self.function, self.cells, bound)
+
+    def make(self) -> tp.Callable[..., lt.LoxLiteral]:
+        """ The Python function, compiling the declared function if needed """
+        function = self.function
+        if function.factory is None:
+            # The generator module uses these classes as it's imported
+            from pylox.transpiler import generator
+
+            generator.compile_function(function)
+        code = function.factory(*self.cells)  # type: ignore
+        if self.bound:
+            code = functools.partial(code, *self.bound)
+        self.code = code
+        return code
+
+    def lox_call(self, arguments: tp.Sequence[lt.LoxLiteral]) -> lt.LoxLiteral:
+        return tail_calls((self.code or self.make())(*arguments))
+
+
+class TailCall(tp.NamedTuple):
+    """
+    A call in tail position, returned by the function making it for its
+    caller to make once the function's frame is gone
+    """
+
+    code: tp.Callable[..., lt.LoxLiteral]
+    arguments: tp.Tuple[lt.LoxLiteral, ...]
+
+
+def tail_calls(result: lt.LoxLiteral) -> lt.LoxLiteral:
+    """ Makes the tail call returned, and those it returns, in a loop """
+    while result.__class__ is TailCall:
+        result = result.code(*result.arguments)  # type: ignore
+    return result
+
+
+def find(
+    lox_class: tp.Optional[lc.LoxClass], name: str
+) -> tp.Tuple[tp.Optional[lc.LoxClass], tp.Optional[Closure]]:
+    """ The first class in the chain with the method, and the method """
+    while lox_class is not None:
+        method = lox_class.methods.get(name)
+        if method is not None:
+            return lox_class, method  # type: ignore
+        lox_class = lox_class.super_class
+    return None, None
+
+
+def arity_error(callee: lt.LoxCallable, count: int) -> tp.NoReturn:
+    message = f"Expected {callee.arity} arguments but got {count}."
+    raise le.LoxRuntimeError(message=message)
+
+
+def undefined(name: str) -> tp.NoReturn:
+    raise le.KeyLoxRuntimeError(message=f'Undefined variable "{name}"')
+
+
+def error() -> tp.NoReturn:
+    """ Raised by nodes with syntax errors, which were already reported """
+    raise le.LoxRuntimeError(ignore=True)
+
+
+def binary(lexeme: str, left: lt.LoxLiteral, right: lt.LoxLiteral) -> lt.LoxLiteral:
+    """ The slow path of a binary operator, retrying or reporting the error """
+    operator = tc.Token(BINARY_TYPES[lexeme], lexeme, None, 0)
+    return lev.operate_binary(operator, left, right)
+
+
+def unary(lexeme: str, right: lt.LoxLiteral) -> lt.LoxLiteral:
+    return lev.operate_unary(tc.Token(UNARY_TYPES[lexeme], lexeme, None, 0), right)
+
+
+def check_callable(callee: lt.LoxLiteral) -> None:
+    """ Fails like a call would, before its arguments are evaluated """
+    if type(callee) is not Closure and not isinstance(callee, lt.LoxCallable):
+        raise le.LoxRuntimeError(
+            message=f"{lu.lox_str(callee, repl=True)} is not callable."
+        )
+
+
+def check_fields(instance: lt.LoxLiteral) -> None:
+    if not isinstance(instance, lc.LoxInstance):
+        raise le.LoxRuntimeError(message="Only instances have fields.")
+
+
+def call(callee: lt.LoxLiteral, *arguments: lt.LoxLiteral) -> lt.LoxLiteral:
+    """ Calls anything, closures with the wrong arity included """
+    kind = type(callee)
+    if kind is Closure:
+        if callee.arity != len(arguments):  # type: ignore
+            arity_error(callee, len(arguments))  # type: ignore
+        return tail_calls((callee.code or callee.make())(*arguments))  # type: ignore
+    if kind is lc.LoxClass:
+        if callee.arity != len(arguments):  # type: ignore
+            arity_error(callee, len(arguments))  # type: ignore
+        # An instance without running LoxInstance's init, which is run here
+        instance = object.__new__(lc.LoxInstance)
+        instance.lox_class, instance.fields = callee, {}  # type: ignore
+        owner, init = find(callee, "init")  # type: ignore
+        if init is not None:
+            receiver = owner.receiver(instance)  # type: ignore
+            (init.code or init.make())(*receiver, *arguments)
+        return instance
+    check_callable(callee)
+    if callee.arity != len(arguments):  # type: ignore
+        arity_error(callee, len(arguments))  # type: ignore
+    return callee.lox_call(list(arguments))  # type: ignore
+
+
+def get(instance: lt.LoxLiteral, name: str) -> lt.LoxLiteral:
+    """ The field, bound method or getter's value called name """
+    if not isinstance(instance, lc.LoxInstance):
+        raise le.LoxRuntimeError(message="Only instances have properties")
+    value = instance.fields.get(name)
+    if value is not None:
+        return value
+    return instance.lox_class.method_get(name, instance)
+
+
+def invoke(
+    instance: lt.LoxLiteral, name: str, *arguments: lt.LoxLiteral
+) -> lt.LoxLiteral:
+    """ Calls the property name, without binding it if it's a method """
+    if not isinstance(instance, lc.LoxInstance):
+        raise le.LoxRuntimeError(message="Only instances have properties")
+    value = instance.fields.get(name)
+    if value is None:
+        owner, method = find(instance.lox_class, name)
+        if method is not None:
+            if method.arity != len(arguments):
+                arity_error(method, len(arguments))
+            receiver = owner.receiver(instance)  # type: ignore
+            return tail_calls((method.code or method.make())(*receiver, *arguments))
+        value = instance.lox_class.method_get(name, instance)
+    return call(value, *arguments)
+
+
+def get_super(
+    super_class: lc.LoxClass, instance: lc.LoxInstance, name: str
+) -> lt.LoxLiteral:
+    return super_class.method_get(name, instance)
+
+
+def make_class(
+    name: str,
+    super_class: tp.Optional[lt.LoxLiteral],
+    methods: tp.Dict[str, Closure],
+    static_methods: tp.Dict[str, Closure],
+    getters: tp.Dict[str, Closure],
+) -> lc.LoxClass:
+    if super_class is not None and not isinstance(super_class, lc.LoxClass):
+        raise le.LoxRuntimeError(message="Superclass must be a class")
+    lox_class = lc.LoxClass(name, super_class, methods, {}, getters)  # type: ignore
+    # Static methods are bound to the class
+    receiver = lox_class.receiver(lox_class)
+    for method_name, method in static_methods.items():
+        lox_class.fields[method_name] = method.bind(*receiver)
+    return lox_class
+
+
+# The names the generated code uses besides its own locals, G (the globals)
+# and K0, K1... (its constants)
+NAMESPACE: tp.Final[tp.Dict[str, tp.Any]] = {
+    "nil": lt.nil,
+    "UNDEFINED": env.UNDEFINED,
+    "Cell": env.Cell,
+    "Closure": Closure,
+    "TailCall": TailCall,
+    "LoxInstance": lc.LoxInstance,
+    "OperatorError": (TypeError, ZeroDivisionError),
+    "lox_true": lu.lox_true,
+    "lox_str": lu.lox_str,
+    **{
+        helper.__name__: helper
+        for helper in (
+            undefined,
+            error,
+            binary,
+            unary,
+            check_callable,
+            check_fields,
+            call,
+            tail_calls,
+            get,
+            invoke,
+            get_super,
+            make_class,
+        )
+    },
+}
@@ -0,0 +1,6 @@
+"""
+A bytecode virtual machine running Lox (see interpreter.ENGINES). The
+compiler turns each resolved function into a chunk of bytecode, which the
+machine runs on a value stack with a stack of call frames of its own, so
+Lox calls don't recurse in Python.
+"""
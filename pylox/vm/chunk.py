@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import array
+import dataclasses
+import typing as tp
+
+import pylox.lox_errors as le
+from pylox.vm.opcodes import OPERANDS, OpCode
+
+# The largest two byte operand, which limits the constants of a chunk and
+# the offsets jumped to
+MAX_OPERAND: tp.Final = 0xFFFF
+
+
+@dataclasses.dataclass
+class Chunk:
+    """
+    The bytecode of a function: the instructions, the constants they refer
+    to and the line of each byte of code, for reporting runtime errors.
+    """
+
+    code: array.array = dataclasses.field(default_factory=lambda: array.array("B"))
+    constants: tp.List[tp.Any] = dataclasses.field(default_factory=list)
+    lines: array.array = dataclasses.field(default_factory=lambda: array.array("l"))
+    # The index of each constant which is a Lox value, to only store it once
+    indexes: tp.Dict[tp.Tuple[type, tp.Any], int] = dataclasses.field(
+        default_factory=dict, repr=False
+    )
+
+    def emit(self, line: int, op: OpCode, *operands: int) -> int:
+        """ Appends the instruction, returning its offset """
+        offset = len(self.code)
+        self.code.append(op)
+        for size, operand in zip(OPERANDS.get(op, ()), operands):
+            if not 0 <= operand < 1 << 8 * size:
+                raise le.LoxRuntimeError(line, f"Too many operands for {op.name}.")
+            self.code.extend(operand.to_bytes(size, "little"))
+        self.lines.extend([line] * (len(self.code) - offset))
+        return offset
+
+    def constant(self, value: tp.Any) -> int:
+        """ The index of the constant, adding it if it's new """
+        try:
+            # The type is part of the key as 1 == true in Python
+            key = (type(value), value)
+            index = self.indexes.get(key)
+        except TypeError:
+            key, index = None, None
+        if index is None:
+            index = len(self.constants)
+            if index > MAX_OPERAND:
+                raise le.LoxRuntimeError(
+                    self.lines[-1] if self.lines else "unknown",
+                    "Too many constants in one function.",
+                )
+            self.constants.append(value)
+            if key is not None:
+                self.indexes[key] = index
+        return index
+
+    def patch(self, offset: int, target: tp.Optional[int] = None) -> None:
+        """ Points the jump at offset to target, by default the end of the code """
+        if target is None:
+            target = len(self.code)
+        if target > MAX_OPERAND:
+            raise le.LoxRuntimeError(self.lines[offset], "Too much code to jump over.")
+        operand = array.array("B", target.to_bytes(2, "little"))
+        self.code[offset + 1 : offset + 3] = operand
+
+    def __len__(self) -> int:
+        return len(self.code)
@@ -0,0 +1,386 @@
+"""
+Compiles resolved trees to bytecode. A function's locals are kept in one
+frame on the VM's stack: each block's locals get slots after those of the
+blocks it's in, so the resolver's (distance, slot) of a local is turned
+into a single slot when it's compiled.
+"""
+from __future__ import annotations
+
+import sys
+import typing as tp
+
+import pylox.abstract_execs as ae
+import pylox.enviroment as env
+import pylox.lox_errors as le
+import pylox.lox_types as lt
+from pylox import expr, results, stmt
+from pylox.token_classes import TokenType as tt
+from pylox.vm import disassembler, machine, objects
+from pylox.vm.chunk import Chunk
+from pylox.vm.opcodes import OpCode as op
+
+if tp.TYPE_CHECKING:
+    import pylox.functions as fn
+
+# The most slots a function's frame can have, as slots are one byte
+MAX_SLOTS: tp.Final = 256
+
+BINARY_OPS: tp.Final = {
+    tt.EQUAL_EQUAL: op.EQUAL,
+    tt.BANG_EQUAL: op.NOT_EQUAL,
+    tt.GREATER: op.GREATER,
+    tt.GREATER_EQUAL: op.GREATER_EQUAL,
+    tt.LESS: op.LESS,
+    tt.LESS_EQUAL: op.LESS_EQUAL,
+    tt.PLUS: op.ADD,
+    tt.MINUS: op.SUBTRACT,
+    tt.STAR: op.MULTIPLY,
+    tt.SLASH: op.DIVIDE,
+}
+UNARY_OPS: tp.Final = {tt.BANG: op.NOT, tt.MINUS: op.NEGATE}
+
+# Set by the command line options (see lox.main)
+disassemble = False
+
+
+def compile_tree(tree: tp.Iterable[ae.AbstractExec]) -> tp.Iterator[Script]:
+    """ Compiles the top-level statements, each one just before it is run """
+    for node in tree:
+        yield Script(objects.Closure(script(node), ()))
+
+
+class Script:
+    """ A compiled top-level statement, run like AbstractExec.interpret """
+
+    __slots__ = ("closure",)
+
+    def __init__(self, closure: objects.Closure) -> None:
+        self.closure = closure
+
+    def interpret(self) -> results.ResultNT:
+        try:
+            machine.run(self.closure, (), ())
+            return results.ResultNT(None)
+        except le.LoxRuntimeError as lre:
+            lre.error()
+        return results.ResultNT(None, le.ErrorReturns.RUNTIME_ERROR)
+
+
+def script(node: ae.AbstractExec) -> objects.Function:
+    """ A top-level statement compiled as a function without parameters """
+    function = objects.Function("script", (), None)
+    compiler = Compiler(function)
+    try:
+        compiler.compile(node)
+    except RecursionError:
+        raise le.LoxRuntimeError(message=le.TOO_DEEP) from None
+    compiler.finish()
+    return function
+
+
+def compile_function(function: objects.Function) -> None:
+    """ Compiles the function's body, parsing and resolving it if it's lazy """
+    declaration = function.declaration
+    assert declaration is not None, "Top-level statements are compiled by script"
+    body, size, cells = declaration.body, declaration.frame_size, declaration.cells
+    if isinstance(body, stmt.LazyBody):
+        # Forcing the body can print syntax errors and fail, like calling it does
+        lazy, body = body, body.force()
+        size, cells = lazy.frame_size, tuple(sorted({*cells, *lazy.cells}))
+    compiler = Compiler(function, size, cells)
+    try:
+        compiler.compile(body)
+    except RecursionError:
+        raise le.LoxRuntimeError(message=le.TOO_DEEP) from None
+    compiler.finish()
+
+
+def pure(node: ae.Expr) -> bool:
+    """
+    Whether evaluating the expression can't fail or have side effects, so
+    it can be evaluated earlier than in the tree without changing anything
+    """
+    while isinstance(node, expr.Grouping):
+        node = node.expression
+    if isinstance(node, expr.Literal):
+        return True
+    return isinstance(node, expr.Variable) and node.distance != -1
+
+
+class Compiler:
+    """
+    Compiles the body of one function. offsets are the first slot of the
+    frame of each block being compiled, cells the slots holding cells and
+    loops the jumps of the break statements of each loop being compiled.
+    """
+
+    def __init__(
+        self, function: objects.Function, size: int = 0, cells: tp.Sequence[int] = ()
+    ) -> None:
+        self.function = function
+        self.chunk = Chunk()
+        self.offsets = [0]
+        self.top = self.size = size
+        self.cells = set(cells)
+        self.loops: tp.List[tp.List[int]] = []
+        self.line = function.params[0].line if function.params else 0
+        self.globals = ae.AbstractExec.environment.globals
+        for slot in cells:
+            self.emit(op.MAKE_CELL, slot)
+
+    def emit(self, opcode: op, *operands: int, line: tp.Optional[int] = None) -> int:
+        if line is not None:
+            self.line = line
+        return self.chunk.emit(self.line, opcode, *operands)
+
+    def constant(self, value: tp.Any) -> int:
+        return self.chunk.constant(value)
+
+    def finish(self) -> None:
+        """ Returns from the end of the function, then fills the function in """
+        declaration = self.function.declaration
+        if declaration is not None and declaration.is_initializer:
+            self.return_this()
+        else:
+            self.emit(op.CONSTANT, self.constant(lt.nil))
+            self.emit(op.RETURN)
+        self.function.chunk, self.function.size = self.chunk, self.size
+        if disassemble:
+            print(disassembler.disassemble(self.function, False), file=sys.stderr)
+
+    def return_this(self) -> None:
+        """ Initializers return "this", which comes after the parameters """
+        slot = len(self.function.params)
+        self.emit(op.GET_CELL if slot in self.cells else op.GET_LOCAL, slot)
+        self.emit(op.RETURN)
+
+    def compile(self, node: ae.AbstractExec) -> None:
+        getattr(self, f"compile_{node.kind}")(node)
+
+    def local(self, distance: int, slot: int, line: int) -> int:
+        """ The slot in the function's frame of the local in a block's slot """
+        slot += self.offsets[-1 - distance]
+        if slot >= MAX_SLOTS:
+            raise le.LoxRuntimeError(line, "Too many local variables in function.")
+        return slot
+
+    def global_slot(self, name: str) -> int:
+        """ The slot of a global, made in advance so it can be indexed directly """
+        slot = env.global_slot(name)
+        if slot >= len(self.globals):
+            self.globals.extend([env.UNDEFINED] * (slot + 1 - len(self.globals)))
+        return slot
+
+    def define(self, name: str, slot: tp.Optional[int]) -> None:
+        """ Pops the value on the stack into the variable declared """
+        if slot is None:
+            self.emit(op.DEFINE_GLOBAL, self.global_slot(name))
+            return
+        slot = self.local(0, slot, self.line)
+        self.emit(op.DEFINE_CELL if slot in self.cells else op.DEFINE_LOCAL, slot)
+
+    def function_template(self, declaration: fn.LoxFunction) -> objects.Function:
+        """ The function, capturing its upvalues from the frame being compiled """
+        captures = tuple(
+            (True, self.local(depth, index, self.line)) if is_local else (False, index)
+            for is_local, depth, index in declaration.upvalues
+        )
+        return objects.Function(
+            declaration.name, declaration.params, declaration, captures
+        )
+
+    # Expressions
+
+    def compile_Literal(self, node: expr.Literal) -> None:
+        self.emit(op.CONSTANT, self.constant(node.value))
+
+    def compile_Grouping(self, node: expr.Grouping) -> None:
+        self.compile(node.expression)
+
+    def compile_Variable(self, node: ae.VarExpr) -> None:
+        distance, line = node.distance, node.name.line
+        if distance == -1:
+            self.emit(op.GET_GLOBAL, self.global_slot(node.name.lexeme), line=line)
+        elif distance == env.UPVALUE:
+            self.emit(op.GET_UPVALUE, node.slot, line=line)
+        else:
+            slot = self.local(distance, node.slot, line)
+            self.emit(op.GET_CELL if node.cell else op.GET_LOCAL, slot, line=line)
+
+    def compile_Assign(self, node: expr.Assign) -> None:
+        self.compile(node.value)
+        distance, line = node.distance, node.name.line
+        if distance == -1:
+            self.emit(op.SET_GLOBAL, self.global_slot(node.name.lexeme), line=line)
+        elif distance == env.UPVALUE:
+            self.emit(op.SET_UPVALUE, node.slot, line=line)
+        else:
+            slot = self.local(distance, node.slot, line)
+            self.emit(op.SET_CELL if node.cell else op.SET_LOCAL, slot, line=line)
+
+    def compile_Binary(self, node: expr.Binary) -> None:
+        self.compile(node.left)
+        self.compile(node.right)
+        self.emit(BINARY_OPS[node.operator.type], line=node.operator.line)
+
+    def compile_Unary(self, node: expr.Unary) -> None:
+        self.compile(node.right)
+        self.emit(UNARY_OPS[node.operator.type], line=node.operator.line)
+
+    def compile_Logical(self, node: expr.Logical) -> None:
+        self.compile(node.left)
+        jump = op.OR if node.operator.type is tt.OR else op.AND
+        offset = self.emit(jump, 0, line=node.operator.line)
+        self.compile(node.right)
+        self.chunk.patch(offset)
+
+    def compile_Call(self, node: expr.Call) -> None:
+        count, line = len(node.arguments), node.paren.line
+        callee = node.callee
+        arguments_pure = all(pure(argument) for argument in node.arguments)
+        # Calls in tail position look the method up first, as TAIL_CALL
+        # calls the value under the arguments
+        if isinstance(callee, expr.Get) and arguments_pure and not node.tail:
+            # Looks the method up after evaluating the arguments, which only
+            # changes what happens if they can fail or have side effects
+            self.compile(callee.object)
+            for argument in node.arguments:
+                self.compile(argument)
+            name = self.constant(callee.name.lexeme)
+            self.emit(op.INVOKE, name, count, line=callee.name.line)
+            # Errors calling the method are reported at the parenthesis
+            self.chunk.lines[-1] = line
+            return
+        self.compile(callee)
+        if not arguments_pure:
+            self.emit(op.CHECK_CALLABLE, line=line)
+        for argument in node.arguments:
+            self.compile(argument)
+        self.emit(op.TAIL_CALL if node.tail else op.CALL, count, line=line)
+
+    def compile_Get(self, node: expr.Get) -> None:
+        self.compile(node.object)
+        self.emit(op.GET_PROPERTY, self.constant(node.name.lexeme), line=node.name.line)
+
+    def compile_Set(self, node: expr.Set) -> None:
+        name = node.assignee.name
+        self.compile(node.assignee.object)
+        if not pure(node.value):
+            self.emit(op.CHECK_FIELDS, self.constant(name.lexeme), line=name.line)
+        self.compile(node.value)
+        self.emit(op.SET_PROPERTY, self.constant(name.lexeme), line=name.line)
+
+    def compile_Super(self, node: expr.Super) -> None:
+        if node.this is None:
+            self.emit(op.ERROR, line=node.name.line)
+            return
+        self.compile(node.this)
+        self.compile_Variable(node)
+        method = node.method
+        self.emit(op.GET_SUPER, self.constant(method.lexeme), line=method.line)
+
+    def compile_error(self, node: ae.AbstractExec) -> None:
+        self.emit(op.ERROR)
+
+    compile_ErrorExpr = compile_ErrorStmt = compile_error
+
+    # Statements
+
+    def compile_ExprStmt(self, node: stmt.ExprStmt) -> None:
+        self.compile(node.expression)
+        self.emit(op.POP)
+
+    def compile_PrintStmt(self, node: stmt.PrintStmt) -> None:
+        self.compile(node.expression)
+        self.emit(op.PRINT)
+
+    def compile_VarStmt(self, node: stmt.VarStmt) -> None:
+        self.line = node.name.line
+        if node.initializer is None:
+            self.emit(op.CONSTANT, self.constant(lt.nil))
+        else:
+            self.compile(node.initializer)
+        self.define(node.name.lexeme, node.slot)
+
+    def compile_BraceStmt(self, node: stmt.BraceStmt) -> None:
+        if not node.new_frame:
+            for statement in node.stmts:
+                self.compile(statement)
+            return
+        top, cells = self.top, set(self.cells)
+        self.offsets.append(top)
+        self.top += node.frame_size
+        self.size = max(self.size, self.top)
+        for slot in node.cells:
+            slot = self.local(0, slot, self.line)
+            self.cells.add(slot)
+            # A new cell each time the block runs, e.g. for each iteration
+            self.emit(op.NEW_CELL, slot)
+        for statement in node.stmts:
+            self.compile(statement)
+        self.offsets.pop()
+        self.top, self.cells = top, cells
+
+    def compile_IfStmt(self, node: stmt.IfStmt) -> None:
+        self.compile(node.condition)
+        else_jump = self.emit(op.JUMP_IF_FALSE, 0)
+        self.compile(node.then_branch)
+        if node.else_branch is None:
+            self.chunk.patch(else_jump)
+            return
+        end_jump = self.emit(op.JUMP, 0)
+        self.chunk.patch(else_jump)
+        self.compile(node.else_branch)
+        self.chunk.patch(end_jump)
+
+    def compile_WhileStmt(self, node: stmt.WhileStmt) -> None:
+        start = len(self.chunk)
+        self.compile(node.condition)
+        exit_jump = self.emit(op.JUMP_IF_FALSE, 0)
+        self.loops.append([])
+        self.compile(node.body)
+        if node.increment is not None:
+            self.compile(node.increment)
+            self.emit(op.POP)
+        self.emit(op.JUMP, start)
+        self.chunk.patch(exit_jump)
+        for break_jump in self.loops.pop():
+            self.chunk.patch(break_jump)
+
+    def compile_NullStmt(self, node: stmt.NullStmt) -> None:
+        pass
+
+    def compile_BreakStmt(self, node: stmt.BreakStmt) -> None:
+        # The resolver only allows breaks in a loop of the same function
+        self.loops[-1].append(self.emit(op.JUMP, 0, line=node.token.line))
+
+    def compile_ReturnStmt(self, node: stmt.ReturnStmt) -> None:
+        self.line = node.keyword.line
+        declaration = self.function.declaration
+        if declaration is not None and declaration.is_initializer:
+            self.return_this()
+            return
+        self.compile(node.value)
+        self.emit(op.RETURN)
+
+    def compile_FunctionStmt(self, node: stmt.FunctionStmt) -> None:
+        template = self.function_template(node.function)
+        self.emit(op.CLOSURE, self.constant(template))
+        self.define(node.function.name, node.slot)
+
+    def compile_ClassStmt(self, node: stmt.ClassStmt) -> None:
+        declared = node.lox_class
+        template = objects.ClassTemplate(
+            declared.name,
+            {name: self.function_template(m) for name, m in declared.methods.items()},
+            {
+                name: self.function_template(value)
+                for name, value in declared.static_methods.items()
+            },
+            {name: self.function_template(g) for name, g in declared.getters.items()},
+            node.super_class_var is not None,
+        )
+        if node.super_class_var is not None:
+            self.compile(node.super_class_var)
+        self.emit(op.CLASS, self.constant(template))
+        self.define(declared.name, node.slot)
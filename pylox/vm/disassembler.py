@@ -0,0 +1,99 @@
+"""
+Lists the instructions of compiled functions, one per line with its offset,
+source line, name and operands, for --disassemble and debugging the compiler.
+"""
+from __future__ import annotations
+
+import typing as tp
+
+import pylox.enviroment as env
+import pylox.lox_utils as lu
+from pylox.vm import objects
+from pylox.vm.chunk import Chunk
+from pylox.vm.opcodes import OPERANDS, OpCode
+
+# The instructions whose first operand is an index in the constants
+CONSTANT_OPERANDS: tp.Final = frozenset(
+    (
+        OpCode.CONSTANT,
+        OpCode.GET_PROPERTY,
+        OpCode.SET_PROPERTY,
+        OpCode.CHECK_FIELDS,
+        OpCode.GET_SUPER,
+        OpCode.INVOKE,
+        OpCode.CLOSURE,
+        OpCode.CLASS,
+    )
+)
+GLOBAL_OPERANDS: tp.Final = frozenset(
+    (OpCode.GET_GLOBAL, OpCode.SET_GLOBAL, OpCode.DEFINE_GLOBAL)
+)
+
+
+def global_name(slot: int) -> str:
+    return next(
+        (name for name, index in env.global_slots.items() if index == slot), "?"
+    )
+
+
+def describe(value: tp.Any) -> str:
+    if isinstance(value, (objects.Function, objects.ClassTemplate)):
+        return str(value)
+    return lu.lox_str(value, repl=True)
+
+
+def instruction(chunk: Chunk, offset: int) -> tp.Tuple[str, int]:
+    """ The text of the instruction at offset and the offset of the next one """
+    opcode = OpCode(chunk.code[offset])
+    operands = []
+    index = offset + 1
+    for size in OPERANDS.get(opcode, ()):
+        operands.append(int.from_bytes(chunk.code[index : index + size], "little"))
+        index += size
+    text = f"{opcode.name:<16} {' '.join(map(str, operands))}".rstrip()
+    if opcode in CONSTANT_OPERANDS:
+        text += f" ({describe(chunk.constants[operands[0]])})"
+    elif opcode in GLOBAL_OPERANDS:
+        text += f" ({global_name(operands[0])})"
+    if opcode is OpCode.CLOSURE:
+        captures = chunk.constants[operands[0]].captures
+        text += "".join(
+            f" {'local' if is_local else 'upvalue'} {index}"
+            for is_local, index in captures
+        )
+    return text, index
+
+
+def functions(chunk: Chunk) -> tp.Iterator[objects.Function]:
+    """ The compiled functions the chunk makes closures of, methods included """
+    for constant in chunk.constants:
+        if isinstance(constant, objects.Function):
+            yield constant
+        elif isinstance(constant, objects.ClassTemplate):
+            for table in (constant.methods, constant.static_methods, constant.getters):
+                yield from table.values()
+
+
+def disassemble(function: objects.Function, nested: bool = True) -> str:
+    """
+    The instructions of the function and, if nested, of the compiled
+    functions it declares. Functions are compiled when first called, so
+    those not called yet aren't listed.
+    """
+    chunk = function.chunk
+    if chunk is None:
+        return f"== {function} ==\n(not compiled)\n"
+    lines = [f"== {function} =="]
+    offset = 0
+    while offset < len(chunk):
+        line = chunk.lines[offset]
+        same = offset > 0 and chunk.lines[offset - 1] == line
+        text, next_offset = instruction(chunk, offset)
+        lines.append(f"{offset:04} {'|' if same else line:>4} {text}")
+        offset = next_offset
+    listing = "\n".join(lines) + "\n"
+    if nested:
+        for declared in functions(chunk):
+            if declared.chunk is not None:
+                listing += "\n" + disassemble(declared)
+    return listing
@@ -0,0 +1,573 @@
+"""
+The loop running bytecode. The locals of each call are in a window of the
+value stack starting at its base, after the callee, and the temporaries of
+its expressions are pushed above them. Calls to closures push a frame on
+the VM's own call stack instead of recursing in Python.
+"""
+from __future__ import annotations
+
+import functools
+import typing as tp
+
+import pylox.abstract_execs as ae
+import pylox.enviroment as env
+import pylox.lox_class as lc
+import pylox.lox_errors as le
+import pylox.lox_eval as lev
+import pylox.lox_types as lt
+import pylox.lox_utils as lu
+import pylox.token_classes as tc
+from pylox.token_classes import TokenType as tt
+from pylox.vm import compiler, objects
+from pylox.vm.opcodes import OpCode
+
+# Set by the command line options (see lox.main). The deepest the calls of
+# a program can nest before a stack overflow. The frames are on the VM's
+# own stack, so this doesn't depend on Python's recursion limit. The default
+# is also given in the help of --max-depth, which doesn't import the VM.
+max_depth = 65536
+
+# The opcodes as plain ints, which are quicker to compare
+(
+    CONSTANT,
+    POP,
+    GET_LOCAL,
+    SET_LOCAL,
+    DEFINE_LOCAL,
+    GET_CELL,
+    SET_CELL,
+    DEFINE_CELL,
+    NEW_CELL,
+    MAKE_CELL,
+    GET_UPVALUE,
+    SET_UPVALUE,
+    GET_GLOBAL,
+    SET_GLOBAL,
+    DEFINE_GLOBAL,
+    GET_PROPERTY,
+    SET_PROPERTY,
+    CHECK_FIELDS,
+    GET_SUPER,
+    EQUAL,
+    NOT_EQUAL,
+    GREATER,
+    GREATER_EQUAL,
+    LESS,
+    LESS_EQUAL,
+    ADD,
+    SUBTRACT,
+    MULTIPLY,
+    DIVIDE,
+    NOT,
+    NEGATE,
+    PRINT,
+    JUMP,
+    JUMP_IF_FALSE,
+    AND,
+    OR,
+    CHECK_CALLABLE,
+    CALL,
+    TAIL_CALL,
+    INVOKE,
+    CLOSURE,
+    CLASS,
+    RETURN,
+    ERROR,
+) = map(int, OpCode)
+
+# The operator token of each operator instruction, for its error messages
+OPERATORS: tp.Final = {
+    int(opcode): (token_type, lexeme)
+    for token_type, opcode, lexeme in (
+        (tt.EQUAL_EQUAL, OpCode.EQUAL, "=="),
+        (tt.BANG_EQUAL, OpCode.NOT_EQUAL, "!="),
+        (tt.GREATER, OpCode.GREATER, ">"),
+        (tt.GREATER_EQUAL, OpCode.GREATER_EQUAL, ">="),
+        (tt.LESS, OpCode.LESS, "<"),
+        (tt.LESS_EQUAL, OpCode.LESS_EQUAL, "<="),
+        (tt.PLUS, OpCode.ADD, "+"),
+        (tt.MINUS, OpCode.SUBTRACT, "-"),
+        (tt.STAR, OpCode.MULTIPLY, "*"),
+        (tt.SLASH, OpCode.DIVIDE, "/"),
+        (tt.BANG, OpCode.NOT, "!"),
+        (tt.MINUS, OpCode.NEGATE, "-"),
+    )
+}
+
+Closure, BoundMethod = objects.Closure, objects.BoundMethod
+
+if tp.TYPE_CHECKING:
+    Call = tp.Optional[tp.Tuple[objects.Closure, tp.Tuple[lt.LoxLiteral, ...]]]
+
+
+def operator(opcode: int, line: int) -> tc.Token:
+    token_type, lexeme = OPERATORS[opcode]
+    return tc.Token(token_type, lexeme, None, line)
+
+
+def binary(opcode: int, left: tp.Any, right: tp.Any, line: int) -> lt.LoxLiteral:
+    """ The slow path of a binary operator, retrying or reporting the error """
+    return lev.operate_binary(operator(opcode, line), left, right)
+
+
+def undefined(slot: int, line: int) -> tp.NoReturn:
+    name = next(name for name, index in env.global_slots.items() if index == slot)
+    raise le.KeyLoxRuntimeError(line, f'Undefined variable "{name}"')
+
+
+def capture(
+    stack: tp.List[tp.Any],
+    base: int,
+    cells: tp.Tuple[env.Cell, ...],
+    function: objects.Function,
+) -> objects.Closure:
+    """ A closure of the function made in the frame at base """
+    return Closure(
+        function,
+        tuple(
+            stack[base + index] if is_local else cells[index]
+            for is_local, index in function.captures
+        ),
+    )
+
+
+def find(
+    lox_class: tp.Optional[lc.LoxClass], name: str, table: str
+) -> tp.Tuple[tp.Optional[lc.LoxClass], tp.Any]:
+    """ The first class in the chain with name in its methods or getters """
+    while lox_class is not None:
+        function = getattr(lox_class, table).get(name)
+        if function is not None:
+            return lox_class, function
+        lox_class = lox_class.super_class
+    return None, None
+
+
+def arity_error(callee: lt.LoxCallable, count: int, line: int) -> tp.NoReturn:
+    message = f"Expected {callee.arity} arguments but got {count}."
+    raise le.LoxRuntimeError(line, message)
+
+
+def prepare_call(callee: tp.Any, count: int, stack: tp.List[tp.Any], line: int) -> Call:
+    """
+    Calls anything which isn't a closure run on the VM's stack, replacing
+    the callee and arguments on the stack with the result. Returns the
+    closure to run and the values bound to it instead if there is one.
+    """
+    kind = type(callee)
+    if kind is Closure or kind is BoundMethod:
+        if callee.arity != count:
+            arity_error(callee, count, line)
+        if kind is Closure:
+            return callee, ()
+        return callee.closure, callee.bound
+    if kind is lc.LoxClass:
+        if callee.arity != count:
+            arity_error(callee, count, line)
+        instance = objects.new_instance(callee)
+        stack[-count - 1] = instance
+        lox_class, init = find(callee, "init", "methods")
+        if init is None:
+            return None
+        # init returns the instance, which replaces it on the stack
+        return init, lox_class.receiver(instance)  # type: ignore
+    if not isinstance(callee, lt.LoxCallable):
+        message = f"{lu.lox_str(callee, repl=True)} is not callable."
+        raise le.LoxRuntimeError(line, message)
+    if callee.arity != count:
+        arity_error(callee, count, line)
+    arguments = stack[len(stack) - count :]
+    del stack[len(stack) - count - 1 :]
+    try:
+        stack.append(callee.lox_call(arguments))
+    except le.LoxRuntimeError as lre:
+        if lre.line == "unknown":
+            lre.line = line
+        raise lre
+    return None
+
+
+def get_property(
+    instance: lc.LoxInstance, lox_class: lc.LoxClass, name: str, line: int
+) -> tp.Tuple[tp.Any, Call]:
+    """
+    The bound method called name, or the getter to call on the instance.
+    lox_class is the first class whose methods and getters are searched.
+    """
+    owner, method = find(lox_class, name, "methods")
+    if method is not None:
+        return BoundMethod(method, owner.receiver(instance)), None  # type: ignore
+    owner, getter = find(lox_class, name, "getters")
+    if getter is not None:
+        return getter, (getter, owner.receiver(instance))  # type: ignore
+    raise le.KeyLoxRuntimeError(line, f'Undefined property, "{name}".')
+
+
+def run(
+    closure: objects.Closure,
+    bound: tp.Sequence[lt.LoxLiteral],
+    arguments: tp.Sequence[lt.LoxLiteral],
+) -> lt.LoxLiteral:
+    """ Calls the closure with the values bound after its arguments """
+    environment = ae.AbstractExec.environment
+    lox_globals = environment.globals
+    lox_true, lox_str, nil = lu.lox_true, lu.lox_str, lt.nil
+    LoxInstance = lc.LoxInstance
+    frames: tp.List[tp.Tuple[objects.Closure, int, int]] = []
+    stack: tp.List[tp.Any] = [closure, *arguments]
+    push, pop = stack.append, stack.pop
+    # The closure called by the last instruction, the values bound to it
+    # and the number of arguments it was passed
+    target: tp.Optional[objects.Closure] = closure
+    count = len(arguments)
+    current = closure
+    chunk: tp.Any = None
+    base = 0
+    ip = 0
+    try:
+        while True:
+            function = target.function  # type: ignore
+            if function.chunk is None:
+                compiler.compile_function(function)
+            if chunk is not None:
+                # Not the closure run was called with
+                if len(frames) >= max_depth:
+                    raise le.LoxRuntimeError(chunk.lines[ip - 1], "Stack overflow.")
+                frames.append((current, ip, base))
+            base = len(stack) - count
+            if bound:
+                stack.extend(bound)
+            missing = function.size - count - len(bound)
+            if missing > 0:
+                stack.extend([nil] * missing)
+            current, cells = target, target.cells  # type: ignore
+            chunk = function.chunk
+            code, constants = chunk.code, chunk.constants
+            ip = 0
+
+            # Each instruction continues the loop unless it calls a closure
+            while True:
+                op = code[ip]
+                if op == GET_LOCAL:
+                    push(stack[base + code[ip + 1]])
+                    ip += 2
+                    continue
+                if op == CONSTANT:
+                    push(constants[code[ip + 1] | code[ip + 2] << 8])
+                    ip += 3
+                    continue
+                if op == GET_GLOBAL:
+                    slot = code[ip + 1] | code[ip + 2] << 8
+                    value = lox_globals[slot]
+                    if value is env.UNDEFINED:
+                        undefined(slot, chunk.lines[ip])
+                    push(value)
+                    ip += 3
+                    continue
+                if op == JUMP_IF_FALSE:
+                    value = pop()
+                    if value is True or value is not False and lox_true(value):
+                        ip += 3
+                    else:
+                        ip = code[ip + 1] | code[ip + 2] << 8
+                    continue
+                if op == POP:
+                    pop()
+                    ip += 1
+                    continue
+                if op == EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] == right
+                    ip += 1
+                    continue
+                if op == SET_GLOBAL:
+                    slot = code[ip + 1] | code[ip + 2] << 8
+                    if lox_globals[slot] is env.UNDEFINED:
+                        undefined(slot, chunk.lines[ip])
+                    lox_globals[slot] = stack[-1]
+                    ip += 3
+                    continue
+                if op == SET_LOCAL:
+                    stack[base + code[ip + 1]] = stack[-1]
+                    ip += 2
+                    continue
+                if op == GET_CELL:
+                    push(stack[base + code[ip + 1]].value)
+                    ip += 2
+                    continue
+                if op == GET_UPVALUE:
+                    push(cells[code[ip + 1]].value)
+                    ip += 2
+                    continue
+                if op == JUMP:
+                    ip = code[ip + 1] | code[ip + 2] << 8
+                    continue
+                if op == ADD:
+                    right = pop()
+                    try:
+                        stack[-1] = stack[-1] + right
+                    except (TypeError, ZeroDivisionError):
+                        stack[-1] = binary(op, stack[-1], right, chunk.lines[ip])
+                    ip += 1
+                    continue
+                if op == LESS:
+                    right = pop()
+                    try:
+                        stack[-1] = stack[-1] < right
+                    except TypeError:
+                        stack[-1] = binary(op, stack[-1], right, chunk.lines[ip])
+                    ip += 1
+                    continue
+                if op == SUBTRACT:
+                    right = pop()
+                    try:
+                        stack[-1] = stack[-1] - right
+                    except TypeError:
+                        stack[-1] = binary(op, stack[-1], right, chunk.lines[ip])
+                    ip += 1
+                    continue
+                if op == NOT_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] != right
+                    ip += 1
+                    continue
+                if op == RETURN:
+                    result = pop()
+                    del stack[base - 1 :]
+                    push(result)
+                    if not frames:
+                        return result
+                    current, ip, base = frames.pop()
+                    cells = current.cells
+                    chunk = current.function.chunk
+                    code, constants = chunk.code, chunk.constants
+                    continue
+                if op == CALL:
+                    count = code[ip + 1]
+                    callee = stack[-count - 1]
+                    if type(callee) is Closure:
+                        if callee.function.arity != count:
+                            arity_error(callee, count, chunk.lines[ip])
+                        target, bound = callee, ()
+                    else:
+                        call = prepare_call(callee, count, stack, chunk.lines[ip])
+                        if call is None:
+                            ip += 2
+                            continue
+                        target, bound = call
+                    ip += 2
+                    break
+                if op == TAIL_CALL:
+                    count = code[ip + 1]
+                    callee = stack[-count - 1]
+                    call = prepare_call(callee, count, stack, chunk.lines[ip])
+                    ip += 2
+                    if call is None:
+                        continue
+                    target, bound = call
+                    kind = type(callee)
+                    if kind is Closure or kind is BoundMethod:
+                        # Moves the callee and arguments down over the frame of
+                        # the function returning, which isn't pushed
+                        del stack[base - 1 : len(stack) - count - 1]
+                        chunk = None
+                    break
+                if op == INVOKE:
+                    name = constants[code[ip + 1] | code[ip + 2] << 8]
+                    count = code[ip + 3]
+                    receiver = stack[-count - 1]
+                    if not isinstance(receiver, LoxInstance):
+                        raise le.LoxRuntimeError(
+                            chunk.lines[ip], "Only instances have properties"
+                        )
+                    value = receiver.fields.get(name)
+                    if value is None:
+                        owner, method = find(receiver.lox_class, name, "methods")
+                        if method is not None:
+                            if method.function.arity != count:
+                                arity_error(method, count, chunk.lines[ip + 3])
+                            target = method
+                            bound = owner.receiver(receiver)  # type: ignore
+                            ip += 4
+                            break
+                        # A getter, run in a VM of its own as its value is called
+                        token = tc.Token(tt.IDENTIFIER, name, None, chunk.lines[ip])
+                        value = receiver.lox_class.method_get(token, receiver)
+                    stack[-count - 1] = value
+                    call = prepare_call(value, count, stack, chunk.lines[ip + 3])
+                    ip += 4
+                    if call is None:
+                        continue
+                    target, bound = call
+                    break
+                if op == DEFINE_LOCAL:
+                    stack[base + code[ip + 1]] = pop()
+                    ip += 2
+                    continue
+                if op == GET_PROPERTY:
+                    name = constants[code[ip + 1] | code[ip + 2] << 8]
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        raise le.LoxRuntimeError(
+                            chunk.lines[ip], "Only instances have properties"
+                        )
+                    value = instance.fields.get(name)
+                    if value is None:
+                        value, call = get_property(
+                            instance, instance.lox_class, name, chunk.lines[ip]
+                        )
+                        if call is not None:
+                            stack[-1] = value
+                            target, bound = call
+                            count = 0
+                            ip += 3
+                            break
+                    stack[-1] = value
+                    ip += 3
+                    continue
+                if op == SET_PROPERTY:
+                    value = pop()
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        message = "Only instances have fields."
+                        raise le.LoxRuntimeError(chunk.lines[ip], message)
+                    instance.fields[constants[code[ip + 1] | code[ip + 2] << 8]] = value
+                    stack[-1] = value
+                    ip += 3
+                    continue
+                if op == SET_CELL:
+                    stack[base + code[ip + 1]].value = stack[-1]
+                    ip += 2
+                    continue
+                if op == SET_UPVALUE:
+                    cells[code[ip + 1]].value = stack[-1]
+                    ip += 2
+                    continue
+                if op == DEFINE_CELL:
+                    stack[base + code[ip + 1]].value = pop()
+                    ip += 2
+                    continue
+                if op == DEFINE_GLOBAL:
+                    lox_globals[code[ip + 1] | code[ip + 2] << 8] = pop()
+                    ip += 3
+                    continue
+                if op == NEW_CELL:
+                    stack[base + code[ip + 1]] = env.Cell(nil)
+                    ip += 2
+                    continue
+                if op == MAKE_CELL:
+                    slot = base + code[ip + 1]
+                    stack[slot] = env.Cell(stack[slot])
+                    ip += 2
+                    continue
+                if op == AND:
+                    if lox_true(stack[-1]):
+                        pop()
+                        ip += 3
+                    else:
+                        ip = code[ip + 1] | code[ip + 2] << 8
+                    continue
+                if op == OR:
+                    if lox_true(stack[-1]):
+                        ip = code[ip + 1] | code[ip + 2] << 8
+                    else:
+                        pop()
+                        ip += 3
+                    continue
+                if op == GREATER or op == GREATER_EQUAL or op == LESS_EQUAL:
+                    right = pop()
+                    try:
+                        if op == GREATER:
+                            stack[-1] = stack[-1] > right
+                        elif op == GREATER_EQUAL:
+                            stack[-1] = stack[-1] >= right
+                        else:
+                            stack[-1] = stack[-1] <= right
+                    except TypeError:
+                        stack[-1] = binary(op, stack[-1], right, chunk.lines[ip])
+                    ip += 1
+                    continue
+                if op == MULTIPLY or op == DIVIDE:
+                    right = pop()
+                    try:
+                        if op == MULTIPLY:
+                            stack[-1] = stack[-1] * right
+                        else:
+                            stack[-1] = stack[-1] / right
+                    except (TypeError, ZeroDivisionError):
+                        stack[-1] = binary(op, stack[-1], right, chunk.lines[ip])
+                    ip += 1
+                    continue
+                if op == NOT or op == NEGATE:
+                    try:
+                        if op == NOT:
+                            stack[-1] = not lox_true(stack[-1])
+                        else:
+                            stack[-1] = -stack[-1]
+                    except TypeError:
+                        token = operator(op, chunk.lines[ip])
+                        stack[-1] = lev.operate_unary(token, stack[-1])
+                    ip += 1
+                    continue
+                if op == PRINT:
+                    print(lox_str(pop()))
+                    ip += 1
+                    continue
+                if op == CHECK_CALLABLE:
+                    callee = stack[-1]
+                    if type(callee) is not Closure and not isinstance(
+                        callee, lt.LoxCallable
+                    ):
+                        message = f"{lox_str(callee, repl=True)} is not callable."
+                        raise le.LoxRuntimeError(chunk.lines[ip], message)
+                    ip += 1
+                    continue
+                if op == CHECK_FIELDS:
+                    if not isinstance(stack[-1], LoxInstance):
+                        message = "Only instances have fields."
+                        raise le.LoxRuntimeError(chunk.lines[ip], message)
+                    ip += 3
+                    continue
+                if op == GET_SUPER:
+                    name = constants[code[ip + 1] | code[ip + 2] << 8]
+                    super_class = pop()
+                    instance = stack[-1]
+                    value, call = get_property(
+                        instance, super_class, name, chunk.lines[ip]
+                    )
+                    stack[-1] = value
+                    ip += 3
+                    if call is None:
+                        continue
+                    target, bound = call
+                    count = 0
+                    break
+                if op == CLOSURE:
+                    function = constants[code[ip + 1] | code[ip + 2] << 8]
+                    push(capture(stack, base, cells, function))
+                    ip += 3
+                    continue
+                if op == CLASS:
+                    template = constants[code[ip + 1] | code[ip + 2] << 8]
+                    super_class = None
+                    if template.has_super:
+                        super_class = pop()
+                        if not isinstance(super_class, lc.LoxClass):
+                            message = "Superclass must be a class"
+                            raise le.LoxRuntimeError(chunk.lines[ip], message)
+                    made = functools.partial(capture, stack, base, cells)
+                    push(template.instantiate(super_class, made))
+                    ip += 3
+                    continue
+                if op == ERROR:
+                    raise le.LoxRuntimeError(ignore=True)
+                raise AssertionError(f"Unknown opcode {op} at {ip}")
+    except le.LoxRuntimeError as lre:
+        # The calls running on this machine, the innermost at the instruction
+        # running or the call it was raised through
+        lre.unwind(current.function.name, chunk.lines[ip] if lre.trace else None)
+        for closure, return_ip, _ in reversed(frames):
+            # Each function on the machine's stack was compiled to run it
+            chunk = closure.function.chunk
+            lre.unwind(closure.function.name, chunk.lines[return_ip - 1])
+        raise
@@ -0,0 +1,150 @@
+"""
+The values the virtual machine makes at runtime. Classes and instances are
+lox_class.LoxClass and LoxInstance, with closures in the method tables.
+"""
+from __future__ import annotations
+
+import dataclasses
+import typing as tp
+
+import pylox.enviroment as env
+import pylox.lox_class as lc
+import pylox.lox_types as lt
+
+if tp.TYPE_CHECKING:
+    import pylox.functions as fn
+    import pylox.token_classes as tc
+    from pylox.vm.chunk import Chunk
+
+
+@dataclasses.dataclass(eq=False)
+class Function:
+    """
+    A function as declared, compiled to a chunk the first time it's called.
+    captures are where the cells of its upvalues are when a closure of it
+    is made: a slot of the running function if is_local, otherwise one of
+    its upvalues.
+    """
+
+    name: str
+    params: tp.Sequence[tc.Token]
+    # The function to compile, None for a top-level statement
+    declaration: tp.Optional[fn.LoxFunction]
+    captures: tp.Tuple[tp.Tuple[bool, int], ...] = ()
+    chunk: tp.Optional[Chunk] = dataclasses.field(default=None, repr=False)
+    # The number of slots of its frame, filled in when it is compiled
+    size: int = 0
+
+    def __str__(self) -> str:
+        params = ", ".join(x.lexeme for x in self.params)
+        return f"<fn {self.name}({params})>"
+
+    @property
+    def arity(self) -> int:
+        return len(self.params)
+
+
+class Closure(lt.LoxCallable):
+    """ A function with the cells of its upvalues """
+
+    __slots__ = ("function", "cells")
+    function: Function
+    cells: tp.Tuple[env.Cell, ...]
+
+    def __init__(self, function: Function, cells: tp.Tuple[env.Cell, ...]) -> None:
+        self.function = function
+        self.cells = cells
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.function!r})"
+
+    def __str__(self) -> str:
+        return str(self.function)
+
+    @property
+    def name(self) -> str:  # type: ignore
+        return self.function.name
+
+    @property
+    def arity(self) -> int:
+        return self.function.arity
+
+    def bind(self, *bound: lt.LoxLiteral) -> BoundMethod:
+        return BoundMethod(self, bound)
+
+    def lox_call(self, arguments: tp.Sequence[lt.LoxLiteral]) -> lt.LoxLiteral:
+        # The machine module uses these classes as it's imported
+        from pylox.vm import machine
+
+        return machine.run(self, (), arguments)
+
+
+class BoundMethod(lt.LoxCallable):
+    """ A closure with the values bound after its parameters, e.g. "this" """
+
+    __slots__ = ("closure", "bound")
+    closure: Closure
+    bound: tp.Tuple[lt.LoxLiteral, ...]
+
+    def __init__(self, closure: Closure, bound: tp.Tuple[lt.LoxLiteral, ...]) -> None:
+        self.closure = closure
+        self.bound = bound
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.closure!r})"
+
+    def __str__(self) -> str:
+        return str(self.closure)
+
+    @property
+    def name(self) -> str:  # type: ignore
+        return self.closure.name
+
+    @property
+    def arity(self) -> int:
+        return self.closure.arity
+
+    def lox_call(self, arguments: tp.Sequence[lt.LoxLiteral]) -> lt.LoxLiteral:
+        from pylox.vm import machine
+
+        return machine.run(self.closure, self.bound, arguments)
+
+
+@dataclasses.dataclass(eq=False)
+class ClassTemplate:
+    """ A class as declared, made into a LoxClass each time its statement runs """
+
+    name: str
+    methods: tp.Dict[str, Function]
+    static_methods: tp.Dict[str, Function]
+    getters: tp.Dict[str, Function]
+    has_super: bool
+
+    def __str__(self) -> str:
+        return f"<class {self.name}>"
+
+    def instantiate(
+        self,
+        super_class: tp.Optional[lc.LoxClass],
+        capture: tp.Callable[[Function], Closure],
+    ) -> lc.LoxClass:
+        """ The class, with closures of the methods made by capture """
+        methods = {name: capture(method) for name, method in self.methods.items()}
+        getters = {name: capture(getter) for name, getter in self.getters.items()}
+        # The closures bind like LoxFunctions
+        lox_class = lc.LoxClass(
+            self.name, super_class, methods, {}, getters  # type: ignore
+        )
+        # Static methods are bound to the class
+        receiver = lox_class.receiver(lox_class)
+        for name, method in self.static_methods.items():
+            lox_class.fields[name] = capture(method).bind(*receiver)
+        return lox_class
+
+
+def new_instance(lox_class: lc.LoxClass) -> lc.LoxInstance:
+    """ An instance of the class without calling init, which the VM calls itself """
+    instance = object.__new__(lc.LoxInstance)
+    instance.lox_class = lox_class
+    instance.fields = {}
+    return instance
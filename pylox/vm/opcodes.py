@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import enum
+import typing as tp
+
+
+class OpCode(enum.IntEnum):
+    """
+    The instructions, each a byte followed by its operands. Slots are the
+    index of a local in the frame of the running function.
+    """
+
+    CONSTANT = enum.auto()  # constant: push the constant
+    POP = enum.auto()
+    GET_LOCAL = enum.auto()  # slot
+    SET_LOCAL = enum.auto()  # slot: store the top of the stack, leaving it
+    DEFINE_LOCAL = enum.auto()  # slot: pop into the slot
+    GET_CELL = enum.auto()  # slot: push the value of the cell in slot
+    SET_CELL = enum.auto()  # slot
+    DEFINE_CELL = enum.auto()  # slot
+    NEW_CELL = enum.auto()  # slot: put an empty cell in the slot
+    MAKE_CELL = enum.auto()  # slot: move the value in the slot into a cell
+    GET_UPVALUE = enum.auto()  # index in the closure's cells
+    SET_UPVALUE = enum.auto()  # index
+    GET_GLOBAL = enum.auto()  # global slot (see enviroment.global_slot)
+    SET_GLOBAL = enum.auto()  # global slot
+    DEFINE_GLOBAL = enum.auto()  # global slot
+    GET_PROPERTY = enum.auto()  # constant name
+    SET_PROPERTY = enum.auto()  # constant name: instance, value -> value
+    CHECK_FIELDS = enum.auto()  # constant name: fail unless an instance is on top
+    GET_SUPER = enum.auto()  # constant name: this, superclass -> method
+    EQUAL = enum.auto()
+    NOT_EQUAL = enum.auto()
+    GREATER = enum.auto()
+    GREATER_EQUAL = enum.auto()
+    LESS = enum.auto()
+    LESS_EQUAL = enum.auto()
+    ADD = enum.auto()
+    SUBTRACT = enum.auto()
+    MULTIPLY = enum.auto()
+    DIVIDE = enum.auto()
+    NOT = enum.auto()
+    NEGATE = enum.auto()
+    PRINT = enum.auto()
+    JUMP = enum.auto()  # offset: jump to the offset in the chunk
+    JUMP_IF_FALSE = enum.auto()  # offset: pop, jumping if it's false
+    AND = enum.auto()  # offset: jump if the top is false, else pop it
+    OR = enum.auto()  # offset: jump if the top is true, else pop it
+    CHECK_CALLABLE = enum.auto()  # fail unless a callable is on top
+    CALL = enum.auto()  # argument count: callee, arguments -> result
+    # argument count: a call followed by RETURN, which runs a closure in the
+    # frame of the function returning
+    TAIL_CALL = enum.auto()
+    INVOKE = enum.auto()  # constant name, count: instance, arguments -> result
+    CLOSURE = enum.auto()  # constant function: push a closure of it
+    CLASS = enum.auto()  # constant class: [superclass] -> class
+    RETURN = enum.auto()
+    ERROR = enum.auto()  # fail without a message, for nodes with syntax errors
+
+
+# The size in bytes of each operand of the instructions with operands.
+# Locals, upvalues and argument counts take one byte and the others two.
+OPERANDS: tp.Final[tp.Dict[OpCode, tp.Tuple[int, ...]]] = {
+    OpCode.CONSTANT: (2,),
+    OpCode.GET_LOCAL: (1,),
+    OpCode.SET_LOCAL: (1,),
+    OpCode.DEFINE_LOCAL: (1,),
+    OpCode.GET_CELL: (1,),
+    OpCode.SET_CELL: (1,),
+    OpCode.DEFINE_CELL: (1,),
+    OpCode.NEW_CELL: (1,),
+    OpCode.MAKE_CELL: (1,),
+    OpCode.GET_UPVALUE: (1,),
+    OpCode.SET_UPVALUE: (1,),
+    OpCode.GET_GLOBAL: (2,),
+    OpCode.SET_GLOBAL: (2,),
+    OpCode.DEFINE_GLOBAL: (2,),
+    OpCode.GET_PROPERTY: (2,),
+    OpCode.SET_PROPERTY: (2,),
+    OpCode.CHECK_FIELDS: (2,),
+    OpCode.GET_SUPER: (2,),
+    OpCode.JUMP: (2,),
+    OpCode.JUMP_IF_FALSE: (2,),
+    OpCode.AND: (2,),
+    OpCode.OR: (2,),
+    OpCode.CALL: (1,),
+    OpCode.TAIL_CALL: (1,),
+    OpCode.INVOKE: (2, 1),
+    OpCode.CLOSURE: (2,),
+    OpCode.CLASS: (2,),
+}
@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+import pylox.analysis as an
+import pylox.lsp_server as ls
+
+SOURCE = """fun a() { return b(); }
+var x = 1;
+fun b() {
+    return x + y;
+}
+print a();
+"""
+
+
+def edited(source, old, new):
+    start = source.index(old)
+    return start, start + len(old), new
+
+
+@pytest.mark.parametrize(
+    "old,new",
+    [
+        ("x + y", "x + x"),
+        ("var x", "var y"),
+        ("fun b", "fun c"),
+        ("b() {", "b( {"),
+        ("1;", '"unterminated'),
+        ("}\nprint", "\n\n}\nprint"),
+        ("var x = 1;", "while (x"),
+        ("print a();", "print a() @;"),
+    ],
+)
+def test_edit_matches_full_analysis(old, new):
+    document = an.Document(SOURCE)
+    document.edit(*edited(SOURCE, old, new))
+    full = an.Document(document.text)
+    assert document.text == SOURCE.replace(old, new, 1)
+    assert document.diagnostics() == full.diagnostics()
+    starts = [declaration.start for declaration in document.declarations]
+    assert starts == [declaration.start for declaration in full.declarations]
+
+
+def test_undefined_global_warning():
+    document = an.Document(SOURCE)
+    assert document.diagnostics() == [
+        an.DiagnosticNT(4, 'Undefined global variable "y"', an.WARNING)
+    ]
+    document.edit(0, 0, "var y = 2;\n")
+    assert document.diagnostics() == []
+
+
+def test_server_session():
+    uri = "file:///test.lox"
+    messages = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+        {
+            "jsonrpc": "2.0",
+            "method": "textDocument/didOpen",
+            "params": {"textDocument": {"uri": uri, "text": "print 1;\n"}},
+        },
+        {
+            "jsonrpc": "2.0",
+            "method": "textDocument/didChange",
+            "params": {
+                "textDocument": {"uri": uri},
+                "contentChanges": [
+                    {
+                        "range": {
+                            "start": {"line": 0, "character": 7},
+                            "end": {"line": 0, "character": 7},
+                        },
+                        "text": " +",
+                    }
+                ],
+            },
+        },
+        {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+        {"jsonrpc": "2.0", "method": "exit"},
+    ]
+    requests = io.BytesIO()
+    for message in messages:
+        ls.write_message(requests, message)
+    requests.seek(0)
+    output = io.BytesIO()
+    assert ls.serve(requests, output) == 0
+    output.seek(0)
+    replies = iter(lambda: ls.read_message(output), None)
+    initialized, opened, changed, shut_down = replies
+    assert initialized["result"]["capabilities"]["textDocumentSync"]["change"] == 2
+    assert opened["params"]["diagnostics"] == []
+    assert changed["params"]["diagnostics"][0]["range"]["start"]["line"] == 0
+    assert shut_down == {"jsonrpc": "2.0", "id": 2, "result": None}
+    assert json.dumps(changed)
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import pylox.ast_cache as ac
+import pylox.enviroment as env
+import pylox.expr_parse as ep
+import pylox.lox as lox
+
+SOURCE = """
+class A { get() { return 1; } }
+fun f(n) { if (n < 2) return n; return f(n - 1) + f(n - 2); }
+var a = A();
+print a.get() + f(10);
+"""
+
+
+@pytest.fixture
+def source_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(ac, "prefix", None)
+    monkeypatch.setattr(ac, "enabled", True)
+    path = tmp_path / "program.lox"
+    path.write_text(SOURCE)
+    return path
+
+
+def test_cache_is_written_and_reused(source_file, capsys):
+    assert lox.runfile(str(source_file)).status.value.code == 0
+    cache = ac.cache_path(str(source_file))
+    assert cache.parent.name == ac.CACHE_DIR_NAME and cache.exists()
+    tree = ac.load(str(source_file), ac.source_hash(SOURCE))
+    assert tree is not None and len(tree) == 4
+    assert lox.runfile(str(source_file)).status.value.code == 0
+    assert capsys.readouterr().out == "56\n56\n"
+
+
+def test_stale_and_corrupt_caches_are_ignored(source_file):
+    lox.runfile(str(source_file))
+    assert ac.load(str(source_file), ac.source_hash(SOURCE + " ")) is None
+    ac.cache_path(str(source_file)).write_bytes(ac.MAGIC + b"garbage")
+    assert ac.load(str(source_file), ac.source_hash(SOURCE)) is None
+
+
+def test_cache_flags(source_file, tmp_path):
+    prefix = tmp_path / "prefix"
+    lox.main(["pylox", "--cache-dir", str(prefix), str(source_file)])
+    assert any(prefix.rglob(f"*{ac.SUFFIX}"))
+    lox.main(["pylox", "--cache-dir", str(prefix), "--clear-cache"])
+    assert not prefix.exists()
+    lox.main(["pylox", "--no-cache", str(source_file)])
+    assert not ac.cache_dir(str(source_file)).exists()
+
+
+def test_global_slots_are_renumbered(source_file, monkeypatch, capsys):
+    lox.runfile(str(source_file))
+    # As if the cache was loaded by a process which numbered other globals
+    monkeypatch.setattr(env, "global_slots", {"unrelated": 0})
+    tree = ac.load(str(source_file), ac.source_hash(SOURCE))
+    assert tree[3].expression.left.callee.object.slot == env.global_slot("a")
+
+
+def test_each_parser_has_its_own_cache(source_file, monkeypatch):
+    monkeypatch.setattr(ep, "parser", ep.parser)
+    lox.main(["pylox", "--expr-parser", "pratt", str(source_file)])
+    pratt_cache = ac.cache_path(str(source_file))
+    assert pratt_cache.exists()
+    assert ac.load(str(source_file), ac.source_hash(SOURCE)) is not None
+    # The recursive parser doesn't reuse the pratt parser's tree
+    lox.main(["pylox", "--expr-parser", "recursive", str(source_file)])
+    assert ac.cache_path(str(source_file)) != pratt_cache
+    assert pratt_cache.exists() and ac.cache_path(str(source_file)).exists()
+
+
+def test_errors_are_not_cached(source_file):
+    source_file.write_text("print 1 +;")
+    assert lox.runfile(str(source_file)).status.value.code == 65
+    assert not ac.cache_path(str(source_file)).exists()
+
+
+def test_clearing_a_prefix_keeps_other_files(source_file, tmp_path):
+    prefix = tmp_path / "prefix"
+    (prefix / "mine").mkdir(parents=True)
+    (prefix / "notes.txt").write_text("keep")
+    lox.main(["pylox", "--cache-dir", str(prefix), str(source_file)])
+    assert any(prefix.rglob(f"*{ac.SUFFIX}"))
+    lox.main(["pylox", "--cache-dir", str(prefix), "--clear-cache"])
+    assert not any(prefix.rglob(f"*{ac.SUFFIX}"))
+    assert sorted(x.name for x in prefix.iterdir()) == ["mine", "notes.txt"]
+
+
+def test_only_regular_files_are_cached(source_file):
+    fifo = source_file.with_suffix(".fifo")
+    os.mkfifo(fifo)
+    assert ac.cacheable(str(source_file)) and not ac.cacheable(str(fifo))
@@ -0,0 +1,41 @@
+import pytest
+
+import pylox.ast_cache as ac
+import pylox.lox as lox
+import pylox.parallel_parse as pp
+
+
+@pytest.fixture
+def lox_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ac, "enabled", True)
+    monkeypatch.setattr(ac, "prefix", None)
+    monkeypatch.setattr(pp, "jobs", pp.jobs)
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "good.lox").write_text('print "ran";\n')
+    (tmp_path / "nested" / "bad.lox").write_text("var a = 1;\nprint a +;\n")
+    (tmp_path / "notes.txt").write_text("print 1 +;")
+    return tmp_path
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_check(lox_dir, capsys, jobs):
+    assert lox.main(["pylox", "--check", "-j", jobs, str(lox_dir)]) == 65
+    out, err = capsys.readouterr()
+    assert "ran" not in out and "Checked 2 files" in out
+    assert err.startswith(f"{lox_dir / 'nested' / 'bad.lox'}: [line: 2]")
+    assert not ac.cache_dir(str(lox_dir / "good.lox")).exists()
+
+
+def test_check_only_caches_elsewhere(lox_dir, tmp_path_factory, monkeypatch):
+    monkeypatch.setattr(ac, "prefix", ac.prefix)
+    good = str(lox_dir / "good.lox")
+    prefix = tmp_path_factory.mktemp("prefix")
+    assert lox.main(["pylox", "--check", "--cache-dir", str(prefix), good]) == 0
+    assert ac.cache_path(good).exists() and ac.cache_path(good).is_relative_to(prefix)
+
+
+def test_check_missing_file(lox_dir, capsys):
+    good = str(lox_dir / "good.lox")
+    assert lox.main(["pylox", "--check", good]) == 0
+    assert lox.main(["pylox", "--check", good, str(lox_dir / "missing.lox")]) == 66
+    assert "missing.lox: No such file or directory" in capsys.readouterr().err
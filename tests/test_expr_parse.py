@@ -1,6 +1,39 @@
-# import pytest
+import pytest
 
+import pylox.expr_parse as ep
+import pylox.pratt_parse as pp
+import pylox.scanner as s
+from pylox import expr
 
-# @pytest.mark.parametrize("tokens, result", (()))
-# def test_expression(tokens, result):
-#     pass
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        "1 + 2 * 3 - 4 / 5",
+        "-x < !y == z or w and v",
+        "a.b(c, d).e = 3",
+        "f(1)(2)",
+        "super.method(1)",
+        "((1))",
+        "a = b",
+    ),
+)
+def test_pratt_matches_recursive(source):
+    tokens = tuple(s.scan(source))
+    assert pp.expression(tokens) == ep.assignment(tokens)
+
+
+@pytest.mark.parametrize("source", ("1 +", "(1", "1 2", "a + b = 3"))
+def test_pratt_errors(source):
+    assert isinstance(pp.expression(tuple(s.scan(source))), expr.ErrorExpr)
+
+
+def test_pratt_chained_assignment():
+    result = pp.expression(tuple(s.scan("a = b = 1")))
+    assert isinstance(result, expr.Assign) and isinstance(result.value, expr.Assign)
+
+
+def test_error_flags_propagate():
+    error = expr.Grouping(expr.Unary(s.scan("-")[0], expr.ErrorExpr()))
+    assert error.has_error()
+    assert not expr.Grouping(expr.Literal(1.0)).has_error()
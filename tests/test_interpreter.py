@@ -0,0 +1,365 @@
+import pytest
+
+import pylox.abstract_execs as ae
+import pylox.enviroment as env
+import pylox.lox as lox
+import pylox.lox_builtins as lb
+import pylox.stmt_parse as sp
+import pylox.tiers as ti
+import pylox.transpiler.generator as tg
+import pylox.vm.compiler as vc
+import pylox.vm.machine as vm
+from pylox import expr, interpreter, lparser, resolver, scanner
+
+# Programs and what they print, shared by every way of running them
+PROGRAMS = {
+    "fib": (
+        """
+        fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+        print fib(15);
+        """,
+        "610\n",
+    ),
+    "closures": (
+        """
+        fun counter() {
+          var i = 0;
+          fun inc() { i = i + 1; return i; }
+          return inc;
+        }
+        var a = counter();
+        var b = counter();
+        a();
+        a();
+        print a();
+        print b();
+        fun adder() {
+          var f;
+          { var n = 1; fun add(x) { return x + n; } f = add; }
+          return f;
+        }
+        print adder()(41);
+        """,
+        "3\n1\n42\n",
+    ),
+    "nested functions": (
+        """
+        fun outer(x) { fun inner(y) { return x + y; } return inner(2); }
+        print outer(40);
+        {
+          fun count(n) { if (n == 0) return 0; return count(n - 1) + 1; }
+          print count(10);
+        }
+        """,
+        "42\n10\n",
+    ),
+    "classes": (
+        """
+        class A { init(x) { this.x = x; } get() { return this.x; } }
+        fun f(n) { return n * 2; }
+        print A(f(10)).get();
+        class B < A {
+          init(x) { super.init(x + 1); }
+          get() { return super.get() * 10; }
+        }
+        print B(1).get();
+        class C { area { return 3; } class make() { return "made"; } }
+        print C().area;
+        print C.make();
+        class D { init() { return; } }
+        print D();
+        """,
+        "20\n20\n3\nmade\nD instance\n",
+    ),
+    "classes in functions": (
+        """
+        fun make(n) {
+          var total = n;
+          class Acc { add(x) { total = total + x; return this; } sum { return total; } }
+          return Acc();
+        }
+        print make(1).add(2).add(3).sum;
+        print make(10).sum;
+        class Base { init(n) { this.n = n; } double { return this.n * 2; } }
+        class Sub < Base {}
+        print Sub(4).double;
+        """,
+        "6\n10\n8\n",
+    ),
+    "blocks": (
+        """
+        var s = "global";
+        { var s = "outer"; { var s = "inner"; print s; } print s; }
+        print s;
+        """,
+        "inner\nouter\nglobal\n",
+    ),
+    "loops": (
+        """
+        for (var i = 0; i < 3; i = i + 1) {
+          for (var j = 0; j < 3; j = j + 1) { if (j == 1) break; print i * 10 + j; }
+        }
+        var k = 0;
+        while (true) { k = k + 1; if (k > 4) break; }
+        print k;
+        """,
+        "0\n10\n20\n5\n",
+    ),
+    "returns from loops": (
+        """
+        fun find(n) {
+          for (var i = 0; i < 10; i = i + 1) {
+            { var j = i; while (true) { if (j * j == n) return j; break; } }
+          }
+          return -1;
+        }
+        print find(49);
+        print find(50);
+        class A {
+          init() {
+            this.x = 0;
+            while (true) { this.x = this.x + 1; if (this.x > 2) return; }
+          }
+        }
+        print A().x;
+        """,
+        "7\n-1\n3\n",
+    ),
+}
+
+
+@pytest.fixture(autouse=True)
+def eager(monkeypatch):
+    monkeypatch.setattr(sp, "lazy", False)
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+@pytest.mark.parametrize("lazy", (False, True))
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_program(name, lazy, engine, monkeypatch, capsys):
+    monkeypatch.setattr(sp, "lazy", lazy)
+    monkeypatch.setattr(interpreter, "engine", engine)
+    source, output = PROGRAMS[name]
+    assert lox.run(source).status.value.code == 0
+    assert capsys.readouterr().out == output
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+def test_runtime_error(engine, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", engine)
+    assert lox.run("{ var a = 1; print missing; }").status.value.code == 70
+    assert 'Undefined variable "missing"' in capsys.readouterr().err
+
+
+def test_builtins_are_not_changed(monkeypatch, capsys):
+    monkeypatch.setattr(ae.AbstractExec, "environment", env.Environment(lb.BUILTINS))
+    assert lox.run("var clock = 1; print clock;").status.value.code == 0
+    assert capsys.readouterr().out == "1\n"
+    assert isinstance(lb.BUILTINS["clock"], lb.LoxNativeFunction)
+    assert lox.run("len = nil;").status.value.code == 0
+    assert isinstance(lb.BUILTINS["len"], lb.LoxNativeFunction)
+
+
+@pytest.mark.parametrize("lazy", (False, True))
+def test_closures_capture_only_used_locals(lazy, monkeypatch):
+    monkeypatch.setattr(sp, "lazy", lazy)
+    source = """
+    fun make() {
+      var unused = "big";
+      var used = 2;
+      fun get() { return used; }
+      return get;
+    }
+    var captured = make();
+    """
+    assert lox.run(source).status.value.code == 0
+    function = ae.AbstractExec.environment.globals[env.global_slot("captured")]
+    assert [cell.value for cell in function.closure] == [2]
+
+
+def test_vm_recursion_is_not_limited_by_python(monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", "vm")
+    source = "fun count(n) { if (n == 0) return 0; return 1 + count(n - 1); }"
+    assert lox.run(source + "print count(5000);").status.value.code == 0
+    assert capsys.readouterr().out == "5000\n"
+
+
+def test_vm_disassemble(monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", "vm")
+    monkeypatch.setattr(vc, "disassemble", True)
+    assert lox.run("fun f(a) { return a + 1; } print f(1);").status.value.code == 0
+    output = capsys.readouterr()
+    assert output.out == "2\n"
+    assert "== <fn f(a)> ==" in output.err
+    assert "GET_LOCAL        0" in output.err
+    assert "CALL             1" in output.err
+
+
+@pytest.mark.parametrize("lazy", (False, True))
+def test_python_errors_are_at_lox_lines(lazy, monkeypatch, capsys):
+    monkeypatch.setattr(sp, "lazy", lazy)
+    monkeypatch.setattr(interpreter, "engine", "python")
+    source = "fun f(x) {\n  var y = x;\n  return y +\n    nil;\n}\nprint f(1);"
+    assert lox.run(source).status.value.code == 70
+    assert capsys.readouterr().err.startswith("[line: 3] Runtime Error: Infix")
+
+
+def test_python_code_is_cached(monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", "python")
+    source = "fun f(n) { return n * 2; } print f(21);"
+    assert lox.run(source).status.value.code == 0
+    cached = len(tg.code_cache)
+    assert lox.run(source).status.value.code == 0
+    assert len(tg.code_cache) == cached
+    assert capsys.readouterr().out == "42\n42\n"
+
+
+@pytest.mark.parametrize("lazy", (False, True))
+def test_hot_code_is_compiled(lazy, monkeypatch, capsys):
+    monkeypatch.setattr(sp, "lazy", lazy)
+    monkeypatch.setattr(ti, "call_threshold", 3)
+    monkeypatch.setattr(ti, "loop_threshold", 4)
+    monkeypatch.setattr(ti, "transitions", [])
+    source = """
+        fun fib(n) { if (n < 2) return n; return fib(n - 2) + fib(n - 1); }
+        var i = 0;
+        var total = 0;
+        while (i < 10) { total = total + fib(i); i = i + 1; }
+        print total;
+        """
+    assert lox.run(source).status.value.code == 0
+    assert capsys.readouterr().out == "88\n"
+    kinds = [(transition.kind, transition.runs) for transition in ti.transitions]
+    assert kinds == [("function", 3), ("loop", 4)]
+    assert ti.report().startswith("[line: 2] function fib compiled after 3 calls")
+
+
+def binary_variants(node):
+    variants = [type(node).__name__] if node.kind == "Binary" else []
+    for child in node.execs:
+        variants += binary_variants(child)
+    return variants
+
+
+@pytest.mark.parametrize("quicken", (False, True))
+def test_operators_specialize_to_their_operands(quicken, monkeypatch, capsys):
+    monkeypatch.setattr(expr, "quicken", quicken)
+    monkeypatch.setattr(ti, "loop_threshold", 0)
+    source = """
+        var a = 1;
+        var i = 0;
+        while (i < 3) { print a + a; if (i == 1) a = "b"; i = i + 1; }
+        print i / 0;
+        """
+    tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+    assert interpreter.interpret(tree).status.value.code == 70
+    output = capsys.readouterr()
+    assert output.out == "2\n2\nbb\n"
+    assert "Division by zero" in output.err
+    variants = [variant for node in tree for variant in binary_variants(node)]
+    if quicken:
+        expected = ["NumberLess", "GenericBinary", "Equal", "NumberAdd", "NumberDivide"]
+    else:
+        expected = ["GenericBinary"] * 5
+    assert variants == expected
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+def test_tail_calls_do_not_grow_the_stack(engine, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", engine)
+    source = """
+        fun even(n) { if (n == 0) return true; return odd(n - 1); }
+        fun odd(n) { if (n == 0) return false; return even(n - 1); }
+        print even(20001);
+        class C { count(n) { if (n == 0) return "done"; return this.count(n - 1); } }
+        print C().count(20000);
+        """
+    assert lox.run(source).status.value.code == 0
+    assert capsys.readouterr().out == "false\ndone\n"
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+def test_runtime_errors_have_a_stack_trace(engine, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", engine)
+    source = """
+        fun inner() { return missing; }
+        fun outer() {
+            return inner() + 1;
+        }
+        outer();
+        """
+    assert lox.run(source).status.value.code == 70
+    assert capsys.readouterr().err == (
+        '[line: 2] Runtime Error: Undefined variable "missing"\n'
+        "    [line: 2] in inner\n"
+        "    [line: 4] in outer\n"
+        "    [line: 6] in script\n"
+    )
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+def test_stack_overflow_is_a_runtime_error(engine, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", engine)
+    monkeypatch.setattr(vm, "max_depth", 100)
+    source = "fun count(n) { return 1 + count(n - 1); }\ncount(0);"
+    assert lox.run(source).status.value.code == 70
+    error = capsys.readouterr().err
+    assert error.startswith("[line: 1] Runtime Error: Stack overflow.\n")
+    assert "in count (repeated" in error
+    assert error.endswith("    [line: 2] in script\n")
+
+
+NESTED = {
+    "blocks": "{" * 3000 + "print 1;" + "}" * 3000,
+    "ifs": "if (true) " * 3000 + "print 1;",
+    "loop": "var i = 0; while (i < 1) { i = i + 1; " + "{" * 3000 + "}" * 3001,
+    "function": "print 1;\nfun f() {" + "{" * 3000 + "}" * 3001 + "\nf();",
+    "sum": "print " + " + ".join(["1"] * 5000) + ";",
+}
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+@pytest.mark.parametrize("program", NESTED)
+def test_deep_nesting_is_a_runtime_error(engine, program, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", engine)
+    assert lox.run(NESTED[program]).status.value.code == 70
+    output = capsys.readouterr()
+    assert output.out == ("1\n" if program == "function" else "")
+    assert output.err.split("\n")[0].endswith(
+        "Runtime Error: Stack overflow."
+        if engine == "tree"
+        else "Runtime Error: Statement nested too deeply to compile."
+    )
+
+
+@pytest.mark.parametrize("engine", interpreter.ENGINES)
+def test_shallow_nesting_runs(engine, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", engine)
+    # CPython can only indent the translated blocks so deeply
+    source = "if (true) " * 40 + "{" * 40 + "print 1;" + "}" * 40
+    assert lox.run(source).status.value.code == 0
+    assert capsys.readouterr().out == "1\n"
+
+
+@pytest.mark.parametrize(
+    "source",
+    ["print " + "(" * 2000 + "1" + ")" * 2000 + ";", "print " + "-" * 3000 + "1;"],
+)
+@pytest.mark.parametrize("parser", sp.ep.EXPRESSION_PARSERS)
+def test_deep_expressions_are_a_syntax_error(source, parser, monkeypatch, capsys):
+    monkeypatch.setattr(sp.ep, "parser", parser)
+    assert lox.run(source + "\nprint 2;").status.value.code == 65
+    assert (
+        capsys.readouterr().err
+        == "[line: 1] Syntax Error: Expression nested too deeply.\n"
+    )
+
+
+@pytest.mark.parametrize("engine", ("tree", "closure", "python"))
+def test_max_depth_is_only_for_the_vm(engine, monkeypatch, capsys):
+    monkeypatch.setattr(interpreter, "engine", interpreter.engine)
+    monkeypatch.setattr(vm, "max_depth", vm.max_depth)
+    path = "missing.lox"
+    assert lox.main(["pylox", "--engine", engine, "--max-depth", "9", path]) == 64
+    assert "--max-depth only applies to --engine=vm" in capsys.readouterr().err
+    assert vm.max_depth != 9
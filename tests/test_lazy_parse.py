@@ -0,0 +1,63 @@
+import pytest
+
+import pylox.ast_cache as ac
+import pylox.lox as lox
+import pylox.stmt_parse as sp
+from pylox import lparser, scanner, stmt
+
+SOURCE = """
+fun outer() { fun inner() { return 1; } return inner(); }
+fun broken() { print 1 +; }
+fun double(x) { return x * 2; }
+class A { get() { return 2; } }
+print double(3);
+print outer() + A().get();
+"""
+
+
+@pytest.fixture(autouse=True)
+def lazy_options(monkeypatch):
+    monkeypatch.setattr(sp, "lazy", False)
+    monkeypatch.setattr(sp, "full_check", False)
+    monkeypatch.setattr(ac, "enabled", False)
+
+
+def test_bodies_are_not_parsed(monkeypatch):
+    monkeypatch.setattr(sp, "lazy", True)
+    tree = lparser.parse(scanner.scan_buffer(SOURCE))
+    assert isinstance(tree[0].function.body, stmt.LazyBody)
+    assert tree[0].function.body.body is None
+
+
+def test_lazy_run(tmp_path, capsys):
+    path = tmp_path / "program.lox"
+    path.write_text(SOURCE)
+    assert lox.main(["pylox", "--lazy", str(path)]) == 0
+    assert capsys.readouterr().out == "6\n3\n"
+    assert lox.main(["pylox", "--lazy", "--full-check", str(path)]) == 65
+    assert lox.main(["pylox", str(path)]) == 65
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "class A { init() { return 1; } }\n",
+        "fun f() { var a = 1; { var b = b; } break; }\n",
+        "fun f() { fun g() { return this; } }\nclass B < B {}\n",
+    ],
+)
+def test_full_check_reports_the_eager_errors(tmp_path, capsys, source):
+    path = tmp_path / "program.lox"
+    path.write_text(source)
+    assert lox.main(["pylox", str(path)]) == 65
+    eager = capsys.readouterr()
+    assert eager.err
+    assert lox.main(["pylox", "--lazy", "--full-check", str(path)]) == 65
+    assert capsys.readouterr() == eager
+
+
+def test_syntax_error_on_first_call(tmp_path, capsys):
+    path = tmp_path / "program.lox"
+    path.write_text(SOURCE + "broken();\nprint 5;\n")
+    assert lox.main(["pylox", "--lazy", str(path)]) == 70
+    assert capsys.readouterr().out == "6\n3\n"
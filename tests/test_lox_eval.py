@@ -2,7 +2,7 @@ import pytest
 
 import pylox.lox_eval as le
 import pylox.lox_types as lt
-import pylox.token_types as tt
+from pylox.token_classes import TokenType as tt
 
 
 @pytest.mark.parametrize(
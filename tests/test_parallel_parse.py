@@ -0,0 +1,27 @@
+import pylox.parallel_parse as pp
+import pylox.stmt_parse as sp
+from pylox import scanner
+
+SOURCE = """
+fun f(a) { print a; }
+print 1 +;
+class A { m() { return 1; } }
+var x = 2 * (3 + 4);
+print x +;
+f(x);
+"""
+
+
+def test_parallel_matches_serial(capsys):
+    tokens = scanner.scan_buffer(SOURCE)
+    serial = tuple(sp.from_tokens(tokens))
+    serial_errors = capsys.readouterr().err
+    parallel = tuple(pp.from_tokens(tokens, 2))
+    assert repr(parallel) == repr(serial)
+    assert capsys.readouterr().err == serial_errors != ""
+
+
+def test_batches_keep_every_statement():
+    tokens = scanner.scan_buffer(SOURCE)
+    batches = list(pp.batches(tokens, 3))
+    assert sum(map(len, batches)) == len(tuple(sp.sp.split_tokens(tokens)))
@@ -0,0 +1,54 @@
+import pytest
+
+from pylox import lparser, resolver, scanner, stmt
+
+DEPTH = 5_000
+
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        "{ var a = 1; " * DEPTH + "print a;" + " }" * DEPTH,
+        "if (true) while (false) " * DEPTH + "print 1;",
+        "if (false) print 0; else " * DEPTH + "print 1;",
+        "fun f() { " * DEPTH + "return 1;" + " }" * DEPTH,
+    ),
+)
+def test_deep_nesting(source):
+    tree = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+    assert isinstance(tree, tuple) and len(tree) == 1
+
+
+def test_for_loop_layers():
+    source = "for (var i = 0; i < 3; i = i + 1) print i; for (;;) print 1;"
+    scoped, bare = lparser.parse(scanner.scan_buffer(source))
+    assert isinstance(scoped, stmt.BraceStmt) and not scoped.function_scope
+    assert isinstance(scoped.stmts[1], stmt.WhileStmt)
+    assert scoped.stmts[1].increment is not None
+    assert isinstance(bare, stmt.WhileStmt) and bare.increment is None
+
+
+def test_resolve_errors(capsys):
+    source = "{ var a = a; } break; return 1;"
+    assert resolver.resolve(lparser.parse(scanner.scan_buffer(source))).error()
+    assert len(capsys.readouterr().err.splitlines()) == 3
+
+
+def test_blocks_declaring_nothing_share_a_frame():
+    source = "{ var a = 1; { print a; { a = 2; } } { fun f() {} } }"
+    (outer,) = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+    inner, declaring = outer.stmts[1], outer.stmts[2]
+    assert outer.new_frame and declaring.new_frame
+    assert not inner.new_frame and not inner.stmts[1].new_frame
+    # a is in the outer block's frame, with no frames pushed in between
+    assert inner.stmts[0].expression.distance == 0
+    assert inner.stmts[1].stmts[0].expression.distance == 0
+
+
+def test_returned_calls_are_tail_calls():
+    source = "fun f(g) { print g(); if (g) return g(); return g() + 1; }"
+    (function,) = resolver.resolve(lparser.parse(scanner.scan_buffer(source)))
+    printed, returned, added = function.function.body.stmts
+    assert not printed.expression.tail
+    assert returned.then_branch.value.tail
+    assert not added.value.left.tail
@@ -1,3 +1,6 @@
+import pytest
+
+import pylox.lox_errors as le
 import pylox.scanner as s
 from tests import data
 
@@ -5,3 +8,50 @@ from tests import data
 # Parameterize later?
 def test_scanner():
     assert tuple(s.scan(data.SOURCE[0])) == tuple(data.SOURCE[1])
+
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        data.SOURCE[0],
+        "a /* x\ny\n */ b\n c",
+        "/*/ a */ b",
+        "a\n//c\nb // trailing",
+        "!= = == <= < >= > ! _x1 var nil true false 1.5 x.y",
+        "/* unterminated\n x",
+        'x "abc',
+        "1 @ 2",
+    ),
+)
+def test_scan_matches_legacy_scan(source):
+    assert s.scan(source) == s.legacy_scan(source)
+
+
+@pytest.mark.parametrize("scan", (s.scan, s.scan_buffer))
+def test_tokens_after_a_multi_line_string(scan):
+    source = 'a "multi\nline\n" b\nc "one line" d'
+    tokens = scan(source)
+    assert [token.line for token in tokens] == [1, 1, 3, 4, 4, 4]
+    # The reference scanner doesn't count the lines strings span
+    assert [token.lexeme for token in tokens] == [
+        token.lexeme for token in s.legacy_scan(source)
+    ]
+
+
+def test_scan_invalid_number():
+    assert s.scan("1.2.3") is le.ErrorReturns.SCAN_ERROR
+
+
+@pytest.mark.parametrize("chunk_size", (1, 2, 3, 7, 64))
+def test_token_stream_chunk_boundaries(chunk_size):
+    source = data.SOURCE[0] + '\n"a\nlong string" /* a\n block */ x != y // end'
+    chunks = [source[i : i + chunk_size] for i in range(0, len(source), chunk_size)]
+    stream = s.TokenStream(chunks)
+    assert list(stream) == s.scan(source)
+    assert not stream.errored
+
+
+def test_token_stream_unterminated_string():
+    stream = s.TokenStream(['x "ab', "c"])
+    assert [token.lexeme for token in stream] == ["x"]
+    assert stream.errored
@@ -0,0 +1,48 @@
+import pytest
+
+import pylox.scanner as s
+import pylox.split_tokens as st
+import pylox.token_utils as tu
+
+SOURCE = """
+if (a) print "a"; else if ((b)) { print "b"; } else print "c";
+while ((a < b)) { a = a + 1; }
+for (var i = 0; i < 3; i = i + 1) print i;
+fun f(x) { if (x) { return x; } return nil; }
+class C < B { m() { print "m"; } }
+;
+print (1 + 2) * 3;
+"""
+
+STATEMENTS = [
+    'if(a)print"a";elseif((b)){print"b";}elseprint"c"',
+    "while((a<b)){a=a+1;}",
+    "for(vari=0;i<3;i=i+1)printi",
+    "funf(x){if(x){returnx;}returnnil;}",
+    'classC<B{m(){print"m";}}',
+    "",
+    "print(1+2)*3",
+]
+
+
+def test_split_tokens():
+    tokens = s.scan_buffer(SOURCE)
+    assert [tu.token_str(span) for span in st.split_tokens(tokens)] == STATEMENTS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 256])
+def test_split_stream(chunk_size):
+    tokens = iter(s.scan(SOURCE))
+    spans = st.split_stream(tokens, chunk_size)
+    assert [tu.token_str(span) for span in spans] == STATEMENTS
+
+
+def test_bracket_table():
+    span = tu.TokenSpan.of(s.scan("((a)) ) { ( }"))
+    assert [span.match(i) for i in range(len(span))] == [4, 3, -1, 1, 0, -1, 8, -1, 6]
+    assert tu.closing_paren(span, 0) == 4
+    assert tu.closing_paren(span[6:], 1) == 3
+    tokens = span.tuple()
+    for i in range(len(span) + 1):
+        assert tu.closing_paren(tokens, i) == tu.closing_paren(span, i)
+    assert span[:5].balance(tu.tt.LEFT_PAREN, tu.tt.RIGHT_PAREN) == 0
@@ -0,0 +1,65 @@
+import pytest
+
+import pylox.abstract_execs as ae
+import pylox.expr_parse as ep
+import pylox.stmt_parse as sp
+from pylox import scanner, stmt
+
+SOURCE = """
+print 1
+var a = 2;
+fun f() { return a }
+print (a) - 1;
+print );
+{ print a;
+print a +;
+"""
+
+
+@pytest.mark.parametrize("parser", ep.EXPRESSION_PARSERS)
+def test_every_error_reported(monkeypatch, capsys, parser):
+    monkeypatch.setattr(ep, "parser", parser)
+    statements = tuple(sp.from_tokens(scanner.scan_buffer(SOURCE)))
+    errors = capsys.readouterr().err.splitlines()
+    assert sorted({line.split("]")[0][7:] for line in errors}) == list("24678")
+    # The statements after a missing semicolon aren't swallowed by it
+    assert isinstance(statements[1], stmt.VarStmt)
+    assert isinstance(statements[3], stmt.PrintStmt)
+    assert isinstance(statements[6], stmt.PrintStmt)
+
+
+def test_unmatched_braces_are_flat(capsys):
+    tokens = scanner.scan_buffer("{ print 1;\n" * 5000)
+    statements = tuple(sp.from_tokens(tokens))
+    assert len(statements) == 10_000 and ae.has_error(statements)
+    assert capsys.readouterr().err.count('Expect "}"') == 5000
+
+
+@pytest.mark.parametrize("parser", ep.EXPRESSION_PARSERS)
+def test_recovery_after_a_failed_statement(monkeypatch, capsys, parser):
+    monkeypatch.setattr(ep, "parser", parser)
+    source = "print (1 +) * ) 2;\nprint 4;\nvar = 3 3;\nprint 5;\n"
+    statements = tuple(sp.from_tokens(scanner.scan_buffer(source)))
+    # The tail of a failed statement isn't parsed again as more statements
+    assert [type(x) for x in statements] == [stmt.ErrorStmt, stmt.PrintStmt] * 2
+    errors = capsys.readouterr().err.splitlines()
+    assert {line.split("]")[0] for line in errors} == {"[line: 1", "[line: 3"}
+
+
+@pytest.mark.parametrize("parser", ep.EXPRESSION_PARSERS)
+@pytest.mark.parametrize(
+    "source, lines",
+    (
+        ("var x = 2\nx = 1;", "12"),
+        ("if (x print 2; while x) print 3;", "1"),
+        ("{\nprint 1;\nvar x = 2\nx = 1;\n}", "34"),
+        ("while (true) {\nif (x print 2; while x) print 3;\n}", "2"),
+    ),
+)
+def test_every_failed_statement_is_reported(monkeypatch, capsys, parser, source, lines):
+    monkeypatch.setattr(ep, "parser", parser)
+    statements = tuple(sp.from_tokens(scanner.scan_buffer(source)))
+    assert ae.has_error(statements)
+    errors = capsys.readouterr().err.splitlines()
+    # Reported at a line of the failed statement, even when it's nested
+    assert errors and {line.split("]")[0][7:] for line in errors} <= set(lines)
@@ -0,0 +1,32 @@
+import pickle
+
+import pytest
+
+import pylox.scanner as s
+from tests import data
+
+
+@pytest.fixture
+def buffer():
+    return s.scan_buffer(data.SOURCE[0])
+
+
+def test_buffer_matches_scan(buffer):
+    assert tuple(buffer) == data.SOURCE[1]
+    assert len(buffer) == len(data.SOURCE[1])
+
+
+def test_buffer_indexing(buffer):
+    assert buffer[-1] == data.SOURCE[1][-1]
+    assert buffer[2:5] == data.SOURCE[1][2:5]
+    with pytest.raises(IndexError):
+        buffer[len(buffer)]
+
+
+def test_identifiers_are_interned():
+    buffer = s.scan_buffer("first_name + first_name")
+    assert buffer[0].lexeme is buffer[2].lexeme
+
+
+def test_tokens_pickle(buffer):
+    assert pickle.loads(pickle.dumps(tuple(buffer))) == data.SOURCE[1]